@@ -0,0 +1,191 @@
+"""
+Key/value stores for caching pipeline results, with a time-to-live and a
+bound on the number of entries (least recently used entries go first):
+
+  - "memory": an in-process LRU dict, private to each worker process
+  - "sqlite": a SQLite file shared by every worker (and kept across
+    restarts); recency is tracked per entry so eviction is still LRU
+
+Values are anything json.dumps accepts. Keys are grouped in namespaces so
+one store can hold several kinds of results.
+
+The stores are synchronous; code on the event loop goes through
+store_call(), which runs SQLite lookups on a thread so a lock held by
+another worker never stalls the loop.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from app.metrics import Counter
+
+CACHE_REQUESTS = Counter(
+    "voice_assistant_cache_requests_total",
+    "Cache lookups by cache, namespace and result",
+    ["cache", "namespace", "result"]
+)
+
+STORE_BACKENDS = ("memory", "sqlite")
+
+
+class MemoryStore:
+    """In-process LRU cache with a time-to-live per entry"""
+
+    # Lookups only take a dict lock, so they run on the event loop
+    blocking = False
+
+    def __init__(self, name: str, max_entries: int = 1000, ttl: float = 0):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (namespace, key) -> (expires_at, json value)
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str):
+        """The cached value, or None on a miss or an expired entry"""
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[0] and entry[0] <= time.time():
+                del self._entries[(namespace, key)]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end((namespace, key))
+        CACHE_REQUESTS.inc(cache=self.name, namespace=namespace, result="hit" if entry else "miss")
+        return json.loads(entry[1]) if entry else None
+
+    def set(self, namespace: str, key: str, value):
+        expires_at = time.time() + self.ttl if self.ttl > 0 else 0
+        with self._lock:
+            self._entries[(namespace, key)] = (expires_at, json.dumps(value))
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+class SQLiteStore:
+    """
+    LRU cache in a SQLite file that several processes can share. WAL mode
+    lets readers proceed while another process writes.
+    """
+
+    # Expired and surplus entries are removed every this many writes
+    EVICT_EVERY = 32
+
+    blocking = True
+
+    def __init__(self, name: str, path: str, max_entries: int = 1000, ttl: float = 0, timeout: float = 0.25):
+        self.name = name
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # A lookup waits at most timeout seconds for another process's write
+        # lock, then counts as a miss (or the write is dropped)
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, used_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at)")
+
+    def get(self, namespace: str, key: str):
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT value FROM entries WHERE namespace = ? AND key = ? AND (expires_at = 0 OR expires_at > ?)",
+                    (namespace, key, now)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE entries SET used_at = ? WHERE namespace = ? AND key = ?",
+                        (now, namespace, key)
+                    )
+            except sqlite3.OperationalError:
+                # Locked by another process for longer than the timeout
+                CACHE_REQUESTS.inc(cache=self.name, namespace=namespace, result="error")
+                return None
+        CACHE_REQUESTS.inc(cache=self.name, namespace=namespace, result="hit" if row else "miss")
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl > 0 else 0
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                    (namespace, key, json.dumps(value), expires_at, now)
+                )
+                self._writes += 1
+                if self._writes % self.EVICT_EVERY == 0:
+                    self._evict_locked(now)
+            except sqlite3.OperationalError:
+                # Skipping a cache write is harmless; waiting for the lock is not
+                pass
+
+    def _evict_locked(self, now: float):
+        self._db.execute("DELETE FROM entries WHERE expires_at != 0 AND expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "entries": entries, "max_entries": self.max_entries}
+
+
+async def store_call(store, method: str, *args):
+    """store.method(*args), on the default executor for stores that do I/O"""
+    fn = getattr(store, method)
+    if not store.blocking:
+        return fn(*args)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, fn, *args)
+
+
+def store_from_env(name: str, prefix: str, default_path: str):
+    """
+    The store configured by {prefix}_BACKEND, {prefix}_TTL_S,
+    {prefix}_MAX_ENTRIES and {prefix}_PATH
+    """
+    backend = os.getenv(f"{prefix}_BACKEND", "memory").strip().lower()
+    ttl = float(os.getenv(f"{prefix}_TTL_S", 3600))
+    max_entries = int(os.getenv(f"{prefix}_MAX_ENTRIES", 1000))
+    if backend not in STORE_BACKENDS:
+        print(f"Warning: {prefix}_BACKEND={backend} is not supported (choose from {', '.join(STORE_BACKENDS)}); using memory")
+        backend = "memory"
+
+    if backend == "sqlite":
+        path = os.getenv(f"{prefix}_PATH", default_path)
+        try:
+            return SQLiteStore(name, path, max_entries, ttl)
+        except sqlite3.Error as e:
+            print(f"Could not open the {name} cache at {path}, using memory: {e}")
+    return MemoryStore(name, max_entries, ttl)
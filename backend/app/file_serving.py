@@ -0,0 +1,220 @@
+"""
+Conditional and partial responses for files that never change once
+written: a strong ETag, a long-lived immutable Cache-Control, 304 Not
+Modified for If-None-Match and single byte ranges (206) so audio players
+can seek. Starlette's FileResponse only gained range support in later
+releases and its ETag is derived from mtime and size.
+
+The ETag is a hash of the bytes served, not of the name: generated audio
+is named after its synthesis input, and audio synthesized again after
+eviction may differ, so If-Range must not splice the two.
+
+Audio kept in memory (TTS_DELIVERY=memory) is served the same way once it
+is complete; while it is still being synthesized it is streamed with
+chunked transfer encoding as bytes arrive, without validators.
+
+File system calls (stat, partial reads) run on the default executor so a
+slow disk never stalls the event loop.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_range = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single-range Range header, None when the
+    whole file should be sent, or (-1, -1) when the range can't be served
+    """
+    match = _range.match(header.strip())
+    if not match:
+        # Several ranges or another unit: ignoring the header is allowed
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return (-1, -1)
+        return (max(0, size - length), size - 1)
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return (-1, -1)
+    return (start, end)
+
+
+class CachedFile:
+    """
+    A small file kept in memory with a content hash ETag. One stat per
+    get() notices edits, so the file is only reread when it changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._content = b""
+        self._etag = ""
+
+    def get(self) -> Tuple[bytes, str]:
+        """(content, quoted ETag); raises FileNotFoundError if it is gone"""
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if stamp != self._stamp:
+                with open(self.path, "rb") as f:
+                    self._content = f.read()
+                self._etag = f'"{content_etag(self._content)}"'
+                self._stamp = stamp
+            return self._content, self._etag
+
+
+def content_etag(content: bytes) -> str:
+    """Unquoted strong ETag of some bytes"""
+    return hashlib.sha256(content).hexdigest()[:32]
+
+
+# (path, mtime, size) -> ETag of the file's contents, so a file is hashed once
+_file_etags = OrderedDict()
+_file_etags_lock = threading.Lock()
+FILE_ETAGS_MAX = 4096
+
+
+def file_etag(path) -> Tuple[int, str]:
+    """(size, unquoted content ETag) of a file; raises FileNotFoundError if it is gone"""
+    stat = os.stat(path)
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    with _file_etags_lock:
+        etag = _file_etags.get(key)
+        if etag is not None:
+            _file_etags.move_to_end(key)
+            return stat.st_size, etag
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    etag = digest.hexdigest()[:32]
+    with _file_etags_lock:
+        _file_etags[key] = etag
+        while len(_file_etags) > FILE_ETAGS_MAX:
+            _file_etags.popitem(last=False)
+    return stat.st_size, etag
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison as If-None-Match requires
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+async def immutable_response(
+    request: Request,
+    etag: str,
+    media_type: str,
+    size: Optional[int],
+    read_range,
+    full_response,
+    cache_control: str = IMMUTABLE
+) -> Response:
+    """
+    The caching, 304, Range and If-Range handling shared by files and
+    in-memory audio. read_range(start, end) is awaited for those bytes
+    (inclusive) and full_response(headers) returns the 200 response.
+    """
+    etag = f'"{etag}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    # If-Range: only send part of the file if it is still the same file
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = parse_range(range_header, size)
+
+    if byte_range == (-1, -1):
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        return full_response(headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    content = await read_range(start, end)
+    return Response(content=content, status_code=206, media_type=media_type, headers=headers)
+
+
+async def file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    cache_control: str = IMMUTABLE
+) -> Response:
+    """
+    Serve a file with caching headers, 304 and Range support; raises
+    FileNotFoundError if it is gone
+    """
+    loop = asyncio.get_event_loop()
+
+    def read_sync(start: int, end: int) -> bytes:
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start + 1)
+
+    async def read_range(start: int, end: int) -> bytes:
+        return await loop.run_in_executor(None, read_sync, start, end)
+
+    size, etag = await loop.run_in_executor(None, file_etag, path)
+    return await immutable_response(
+        request, etag, media_type, size, read_range,
+        lambda headers: FileResponse(path, media_type=media_type, headers=headers),
+        cache_control
+    )
+
+
+async def buffer_response(
+    request: Request,
+    buffer,
+    media_type: str,
+    cache_control: str = IMMUTABLE
+) -> Response:
+    """
+    Serve an AudioBuffer with the headers of file_response. Until it is
+    finished its bytes are unknown, so it is streamed as it is written
+    with no ETag, no Range support and no caching.
+    """
+    if not buffer.done:
+        headers = {"Cache-Control": "no-store"}
+        if request.method == "HEAD":
+            return Response(media_type=media_type, headers=headers)
+        return StreamingResponse(buffer.chunks(), media_type=media_type, headers=headers)
+
+    content = buffer.getvalue()
+    etag = content_etag(content)
+
+    async def read_range(start: int, end: int) -> bytes:
+        return content[start:end + 1]
+
+    return await immutable_response(
+        request, etag, media_type, len(content), read_range,
+        lambda headers: Response(content=content, media_type=media_type, headers=headers),
+        cache_control
+    )
@@ -1,20 +1,32 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 import uvicorn
 import os
 from dotenv import load_dotenv
-import tempfile
+import base64
 import io
+import json
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 
+from app.file_serving import CachedFile, buffer_response, etag_matches, file_response
+from app.metrics import MetricsMiddleware, record_stage, render_metrics, stage_timer
+from app.model_registry import ModelRegistry
+from app.pipeline import Pipeline
+from app.scheduler import DeadlineMiddleware, Overloaded, configure_torch_threads
 from app.services.whisper_service import WhisperService
 from app.services.bert_service import BertService
 from app.services.gpt_service import GPTService
 from app.services.tts_service import TTSService
+from app.services.streaming_transcriber import StreamingTranscriber, StreamTooLong
+from app.services.vad import VoiceActivityDetector
+from app.services.response_cache import ResponseCache
 
 load_dotenv()
 
@@ -22,7 +34,76 @@ load_dotenv()
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 WEB_DIR = BASE_DIR / "web"
 
-app = FastAPI(title="Voice Assistant Web App", version="2.0.0")
+# Thread counts must be set before any model runs
+configure_torch_threads()
+
+# Initialize services; their models are loaded by the registry below
+whisper_service = WhisperService()
+bert_service = BertService()
+gpt_service = GPTService()
+tts_service = TTSService()
+vad = VoiceActivityDetector()
+response_cache = ResponseCache()
+
+models = ModelRegistry(
+    max_workers=int(os.getenv("MODEL_LOAD_WORKERS", 0)),
+    warmup=os.getenv("MODEL_WARMUP", "true").lower() == "true"
+)
+# Looked up when they run, so patched services (benchmarks/stub_models.py)
+# load and warm up their replacements
+models.register("whisper", lambda: whisper_service.load(), lambda: whisper_service.warmup())
+models.register("bert", lambda: bert_service.load(), lambda: bert_service.warmup())
+models.register("gpt", lambda: gpt_service.load(), lambda: gpt_service.warmup())
+
+
+def preload_names() -> list:
+    """Models to load at startup: "all", "none" (all lazy) or a comma list"""
+    setting = os.getenv("MODEL_PRELOAD", "all").strip().lower()
+    if setting == "all":
+        return models.names
+    if setting == "none":
+        return []
+    return [name.strip() for name in setting.split(",") if name.strip()]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load in the background; requests that need one wait for it
+    models.start(preload_names())
+    janitor = asyncio.create_task(audio_janitor())
+    yield
+    janitor.cancel()
+    await bert_service.batcher.close()
+    if gpt_service.local_engine is not None:
+        await gpt_service.local_engine.batcher.close()
+    models.shutdown()
+
+
+async def audio_janitor():
+    """Periodically remove old generated audio and keep it within its size bounds"""
+    interval = float(os.getenv("TTS_JANITOR_INTERVAL_S", 300))
+    if interval <= 0:
+        return
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await loop.run_in_executor(None, tts_service.cleanup)
+            if removed:
+                print(f"Audio janitor removed {removed} files")
+        except Exception as e:
+            print(f"Audio janitor error: {e}")
+
+
+app = FastAPI(title="Voice Assistant Web App", version="2.0.0", lifespan=lifespan)
+
+# Cancel requests whose client disconnected or whose deadline passed
+# Batch transcription runs as long as its uploads need
+app.add_middleware(
+    DeadlineMiddleware,
+    timeout=float(os.getenv("REQUEST_TIMEOUT_S", 60)),
+    path_timeouts={"/api/voice/transcribe/batch": float(os.getenv("BATCH_REQUEST_TIMEOUT_S", 0))}
+)
 
 # CORS middleware for web app
 app.add_middleware(
@@ -31,18 +112,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Per-stage latency histograms and the Server-Timing header
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc: Overloaded):
+    """A saturated inference stage sheds load instead of queueing it"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "stage": exc.stage},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Mount static files (CSS, JS, images)
 if WEB_DIR.exists():
     app.mount("/static", StaticFiles(directory=str(WEB_DIR / "static")), name="static")
 
-# Initialize services
-whisper_service = WhisperService()
-bert_service = BertService()
-gpt_service = GPTService()
-tts_service = TTSService()
-
 
 class TextRequest(BaseModel):
     text: str
@@ -53,118 +141,568 @@ class VoiceResponse(BaseModel):
     intent: str
     response: str
     audio_url: Optional[str] = None
+    audio_segments: Optional[List[str]] = None
+    # The response text came from the response cache
+    cached: bool = False
+    # The audio_url file itself, base64 encoded, when inline audio is requested
+    audio_base64: Optional[str] = None
+
+
+index_html = CachedFile(WEB_DIR / "templates" / "index.html")
 
 
 @app.get("/", response_class=HTMLResponse)
-async def root():
-    """Serve the web interface"""
-    html_file = WEB_DIR / "templates" / "index.html"
-    if html_file.exists():
-        with open(html_file, "r") as f:
-            return HTMLResponse(content=f.read())
-    return HTMLResponse(content="<h1>Web interface not found</h1>", status_code=404)
+async def root(request: Request):
+    """Serve the web interface from memory; browsers revalidate it with its ETag"""
+    try:
+        content, etag = index_html.get()
+    except FileNotFoundError:
+        return HTMLResponse(content="<h1>Web interface not found</h1>", status_code=404)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=content, headers=headers)
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "services": {
-        "whisper": whisper_service.is_loaded(),
-        "bert": bert_service.is_loaded(),
-        "gpt": gpt_service.is_ready()
-    }}
+    model_status = models.status()
+    if any(model["state"] == "failed" for model in model_status.values()):
+        status = "degraded"
+    elif any(model["state"] == "loading" for model in model_status.values()):
+        status = "loading"
+    else:
+        status = "healthy"
+    return {"status": status, "services": {
+        "whisper": models.is_ready("whisper") and whisper_service.is_loaded(),
+        "bert": models.is_ready("bert") and bert_service.is_loaded(),
+        "gpt": models.is_ready("gpt") and gpt_service.is_ready()
+    }, "models": model_status, "queues": {
+        "whisper": whisper_service.queue.stats(),
+        "bert": bert_service.queue.stats(),
+        "gpt": gpt_service.queue.stats(),
+        "tts": tts_service.queue.stats()
+    }, "tts_cache": tts_service.cache_stats(), "response_cache": response_cache.stats(),
+        "transcript_cache": {**whisper_service.transcript_cache.stats(), "mel": whisper_service.mel_cache.stats()}}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: stage, request, executor and model load latency"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+async def classify_intent(text: str) -> str:
+    """The intent from the response cache, the keyword rules, or BERT"""
+    intent = await response_cache.get_intent(text)
+    if intent is None:
+        # Texts the rules decide never wait for BERT to load
+        intent = bert_service.rule_intent(text)
+        if intent is None:
+            await models.require("bert")
+            intent = await bert_service.classify_intent(text)
+        await response_cache.set_intent(text, intent)
+    return intent
+
+
+async def response_fragments(text: str, intent: str, cached_reply: Optional[str]) -> AsyncIterator[str]:
+    """
+    The reply as one fragment when it was cached, otherwise as GPT streams
+    it; a complete generated reply is added to the cache
+    """
+    if cached_reply is not None:
+        yield cached_reply
+        return
+    fragments = []
+    async for fragment in gpt_service.stream_response(text, intent):
+        fragments.append(fragment)
+        yield fragment
+    reply = "".join(fragments).strip()
+    if not gpt_service.is_fallback_response(text, intent, reply):
+        await response_cache.set_reply(text, intent, gpt_service.model_id, reply)
+
+
+async def synthesize_reply(text: str, intent: str) -> VoiceResponse:
+    """Generate a response for the intent and synthesize it"""
+    cached_reply = await response_cache.get_reply(text, intent, gpt_service.model_id)
+    
+    # Generate the response with GPT while sentences that are already
+    # complete are synthesized concurrently
+    fragments = []
+    start = time.perf_counter()
+    generated = {"at": start}
+    
+    async def collect():
+        async for fragment in response_fragments(text, intent, cached_reply):
+            fragments.append(fragment)
+            yield fragment
+        generated["at"] = time.perf_counter()
+        if cached_reply is None:
+            record_stage("gpt", generated["at"] - start)
+    
+    segment_paths = [path async for path in tts_service.synthesize_stream(collect())]
+    response_text = "".join(fragments).strip()
+    
+    # One file for clients that play a single URL
+    audio_path = await tts_service.concatenate(segment_paths)
+    # TTS time not hidden behind generation (with TTS_DELIVERY=memory only
+    # until synthesis has started: the audio streams while it is produced)
+    record_stage("tts", time.perf_counter() - generated["at"])
+    
+    return VoiceResponse(
+        text=text,
+        intent=intent,
+        response=response_text,
+        audio_url=audio_url(audio_path),
+        audio_segments=[audio_url(path) for path in segment_paths],
+        cached=cached_reply is not None
+    )
+
+
+# Start GPT with the keyword intent while BERT classifies; on disagreement
+# the reply restarts with BERT's intent
+SPECULATIVE_REPLY = os.getenv("PIPELINE_SPECULATION", "true").lower() == "true"
+
+
+def add_reply_stages(pipeline: Pipeline, text_stage: str) -> Pipeline:
+    """Intent and reply stages for the text produced by text_stage"""
+    pipeline.stage("gpt_ready", lambda r: models.require("gpt"), record=False)
+    pipeline.stage("intent", lambda r: classify_intent(r[text_stage]), after=[text_stage])
+    pipeline.stage(
+        "reply",
+        lambda r: synthesize_reply(r[text_stage], r["intent"]),
+        after=[text_stage, "gpt_ready", "intent"],
+        speculate={"intent": lambda r: bert_service.provisional_intent(r[text_stage])} if SPECULATIVE_REPLY else None,
+        record=False
+    )
+    return pipeline
+
+
+async def detect_speech(audio) -> list:
+    """Trim silence; recordings without speech never reach the model"""
+    segments = vad.segments(audio)
+    if not segments:
+        raise HTTPException(status_code=400, detail="No speech detected in audio")
+    return segments
+
+
+async def transcribe_speech(segments: list) -> str:
+    transcribed_text = await whisper_service.transcribe_segments(segments)
+    if not transcribed_text or transcribed_text.strip() == "":
+        raise HTTPException(status_code=400, detail="No speech detected in audio")
+    return transcribed_text
+
+
+async def lookup_transcript(data: bytes) -> tuple:
+    """(transcript cache key, cached transcript or None) of uploaded audio"""
+    key = whisper_service.transcript_key(data)
+    return key, await whisper_service.transcript_cache.get(key)
+
+
+async def remember_transcript(lookup: tuple, transcribed_text: Optional[str]) -> str:
+    """The cached transcript, or the new one after adding it to the cache"""
+    key, cached_text = lookup
+    if cached_text is not None:
+        return cached_text
+    await whisper_service.transcript_cache.set(key, transcribed_text)
+    return transcribed_text
+
+
+def transcript_not_cached(r) -> bool:
+    return r["transcript_cache"][1] is None
+
+
+text_pipeline = add_reply_stages(Pipeline("text", inputs=["text"]), "text")
+
+# Uploads seen before skip decoding and Whisper. Otherwise decode the
+# upload in memory (no temp file or extra ffmpeg spawns), trim silence and
+# transcribe; models load concurrently if they are lazy
+voice_pipeline = Pipeline("voice", inputs=["audio_file"])
+voice_pipeline.stage("upload_read", lambda r: r["audio_file"].read(), after=["audio_file"])
+voice_pipeline.stage("transcript_cache", lambda r: lookup_transcript(r["upload_read"]), after=["upload_read"])
+voice_pipeline.stage(
+    "whisper_ready",
+    lambda r: models.require("whisper"),
+    after=["transcript_cache"],
+    when=transcript_not_cached,
+    record=False
+)
+voice_pipeline.stage("decode", lambda r: whisper_service.decode_audio(r["upload_read"]), after=["transcript_cache"], when=transcript_not_cached)
+voice_pipeline.stage("vad", lambda r: detect_speech(r["decode"]), after=["decode"], when=transcript_not_cached)
+voice_pipeline.stage(
+    "transcribe",
+    lambda r: transcribe_speech(r["vad"]),
+    after=["vad", "whisper_ready"],
+    when=transcript_not_cached
+)
+voice_pipeline.stage(
+    "transcript",
+    lambda r: remember_transcript(r["transcript_cache"], r["transcribe"]),
+    after=["transcript_cache", "transcribe"],
+    record=False
+)
+add_reply_stages(voice_pipeline, "transcript")
+
+
+async def generate_reply(text: str) -> VoiceResponse:
+    """Understand intent, generate a response and synthesize it"""
+    run = await text_pipeline.run(text=text)
+    return run["reply"]
+
+
+def audio_url(audio_path: Optional[str]) -> Optional[str]:
+    if not audio_path:
+        return None
+    return f"/api/voice/audio/{os.path.basename(audio_path)}"
+
+
+# Inline audio saves clients the request for audio_url after each reply
+INLINE_AUDIO_DEFAULT = os.getenv("AUDIO_INLINE", "false").lower() == "true"
+
+
+async def add_inline_audio(reply: VoiceResponse, inline_audio: Optional[bool]) -> VoiceResponse:
+    """Embed the reply's audio when requested (or AUDIO_INLINE by default)"""
+    if not (INLINE_AUDIO_DEFAULT if inline_audio is None else inline_audio) or not reply.audio_url:
+        return reply
+    loop = asyncio.get_event_loop()
+    audio_path = await loop.run_in_executor(None, tts_service.audio_path, os.path.basename(reply.audio_url))
+    if audio_path:
+        reply.audio_base64 = base64.b64encode(await tts_service.read_audio(audio_path)).decode("ascii")
+    return reply
 
 
 @app.post("/api/voice/transcribe", response_model=VoiceResponse)
-async def process_voice(audio_file: UploadFile = File(...)):
+async def process_voice(audio_file: UploadFile = File(...), inline_audio: Optional[bool] = None):
     """
     Process voice input: transcribe, understand intent, generate response, and create TTS
     Supports WAV, WebM, MP3, and other audio formats
+    With ?inline_audio=true the response includes the audio as audio_base64
     """
     try:
-        # Get file extension from content type or filename
-        file_ext = ".wav"
-        if audio_file.content_type:
-            if "webm" in audio_file.content_type.lower():
-                file_ext = ".webm"
-            elif "mp3" in audio_file.content_type.lower():
-                file_ext = ".mp3"
-        elif audio_file.filename:
-            file_ext = os.path.splitext(audio_file.filename)[1] or ".wav"
-        
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_file:
-            content = await audio_file.read()
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
+        # Transcription, intent, response and TTS as one pipeline
+        run = await voice_pipeline.run(audio_file=audio_file)
+        return await add_inline_audio(run["reply"], inline_audio)
 
+    except (HTTPException, Overloaded):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing voice: {str(e)}")
+
+
+@app.post("/api/voice/transcribe/batch")
+async def process_voice_batch(files: List[UploadFile] = File(...), downstream: bool = False):
+    """
+    Transcribe many recordings at once. Speech segments of all the files
+    are decoded together in batches, which uses the CPU better than one
+    request per file. The response is NDJSON: one line per file as soon as
+    it is transcribed, {"index", "filename", "text"} (plus "intent",
+    "response" and "audio_url" with ?downstream=true, or "error"), in
+    completion order, then {"done": true, "files": n, "seconds": t}.
+    """
+    # The status is 200 once streaming starts, so shed load here
+    whisper_service.queue.check()
+    models.start(["whisper"])
+    start = time.perf_counter()
+
+    recordings = []
+    errors = {}
+    keys = {}
+    cached = {}  # index -> transcript from the transcript cache
+    for index, upload in enumerate(files):
         try:
-            # Step 1: Transcribe audio using Whisper
-            transcribed_text = await whisper_service.transcribe(tmp_path)
-            
-            if not transcribed_text or transcribed_text.strip() == "":
-                raise HTTPException(status_code=400, detail="No speech detected in audio")
-
-            # Step 2: Understand intent using BERT
-            intent = await bert_service.classify_intent(transcribed_text)
-            
-            # Step 3: Generate response using GPT
-            response_text = await gpt_service.generate_response(transcribed_text, intent)
-            
-            # Step 4: Generate TTS audio
-            audio_path = await tts_service.text_to_speech(response_text)
-            
-            return VoiceResponse(
-                text=transcribed_text,
-                intent=intent,
-                response=response_text,
-                audio_url=f"/api/voice/audio/{os.path.basename(audio_path)}"
-            )
+            data = await upload.read()
+            keys[index] = whisper_service.transcript_key(data)
+            cached_text = await whisper_service.transcript_cache.get(keys[index])
+            if cached_text is not None:
+                cached[index] = cached_text
+                recordings.append([])
+                continue
+            with stage_timer("decode"):
+                audio = await whisper_service.decode_audio(data)
+            with stage_timer("vad"):
+                recordings.append(vad.segments(audio))
+        except Exception as e:
+            errors[index] = f"Error decoding audio: {str(e)}"
+            recordings.append([])
+
+    async def transcripts():
+        """(index, text) of every file; cached files do not wait for the model"""
+        if not any(recordings):
+            for index in range(len(files)):
+                yield index, cached.get(index, "")
+            return
+        await models.require("whisper")
+        async for index, text in whisper_service.transcribe_many(recordings):
+            if index in cached:
+                text = cached[index]
+            elif index not in errors:
+                await whisper_service.transcript_cache.set(keys[index], text)
+            yield index, text
+
+    async def reply_line(index: int, text: str) -> dict:
+        line = {"index": index, "filename": files[index].filename, "text": text}
+        if index in errors:
+            line["error"] = errors[index]
+        elif not text:
+            line["error"] = "No speech detected in audio"
+        elif downstream:
+            try:
+                reply = await generate_reply(text)
+                line.update(intent=reply.intent, response=reply.response, audio_url=reply.audio_url)
+            except Overloaded as e:
+                line.update(error=str(e), retry_after=e.retry_after)
+            except Exception as e:
+                line["error"] = f"Error processing text: {str(e)}"
+        return line
+
+    async def lines():
+        pending = set()
+        try:
+            with stage_timer("transcribe"):
+                async for index, text in transcripts():
+                    if downstream and text and index not in errors:
+                        # Replies run while the remaining batches decode
+                        pending.add(asyncio.ensure_future(reply_line(index, text)))
+                        continue
+                    yield json.dumps(await reply_line(index, text)) + "\n"
+            for next_done in asyncio.as_completed(pending):
+                yield json.dumps(await next_done) + "\n"
+            yield json.dumps({"done": True, "files": len(files), "seconds": round(time.perf_counter() - start, 3)}) + "\n"
+        except Overloaded as e:
+            yield json.dumps({"error": str(e), "retry_after": e.retry_after}) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": f"Error transcribing batch: {str(e)}"}) + "\n"
         finally:
-            # Clean up temporary file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+            for task in pending:
+                task.cancel()
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing voice: {str(e)}")
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
 
 
 @app.post("/api/text/process")
-async def process_text(request: TextRequest):
+async def process_text(request: TextRequest, inline_audio: Optional[bool] = None):
     """
     Process text input: understand intent and generate response
+    With ?inline_audio=true the response includes the audio as audio_base64
     """
     try:
-        # Step 1: Understand intent using BERT
-        intent = await bert_service.classify_intent(request.text)
-        
-        # Step 2: Generate response using GPT
-        response_text = await gpt_service.generate_response(request.text, intent)
-        
-        # Step 3: Generate TTS audio
-        audio_path = await tts_service.text_to_speech(response_text)
-        
-        return VoiceResponse(
-            text=request.text,
-            intent=intent,
-            response=response_text,
-            audio_url=f"/api/voice/audio/{os.path.basename(audio_path)}"
-        )
+        return await add_inline_audio(await generate_reply(request.text), inline_audio)
+    except Overloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing text: {str(e)}")
 
 
-@app.get("/api/voice/audio/{filename}")
-async def get_audio(filename: str):
+@app.websocket("/api/voice/stream")
+async def stream_voice(websocket: WebSocket, format: str = "pcm16"):
     """
-    Serve generated audio files
+    Streaming transcription. The client sends audio chunks as binary
+    messages while recording (format=pcm16: 16 kHz mono little-endian
+    int16, or format=webm: MediaRecorder chunks) and {"event": "end"} when
+    done. The server replies with {"type": "partial"} transcripts of a
+    sliding window, a {"type": "final"} transcript at end of speech and
+    then the {"type": "response"} of the full pipeline.
     """
-    audio_dir = "generated_audio"
-    file_path = os.path.join(audio_dir, filename)
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Audio file not found")
-    
-    return FileResponse(file_path, media_type="audio/mpeg")
+    await websocket.accept()
+    try:
+        session = StreamingTranscriber(format)
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close()
+        return
+
+    partial_task = None
+    # Load Whisper while the user speaks if it is lazy
+    models.start(["whisper"])
+
+    async def send_partial():
+        # Partials are skipped while Whisper is loading or saturated
+        if not models.is_ready("whisper") or whisper_service.queue.full():
+            return
+        try:
+            window = await session.window(whisper_service.decode_audio)
+            if not vad.has_speech(window):
+                return
+            text = await whisper_service.transcribe_array(window)
+            if text:
+                await websocket.send_json({"type": "partial", "text": text})
+        except StreamTooLong as e:
+            # Decoding showed a webm stream to be longer than its cluster timecodes
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close(code=1009)
+        except Exception as e:
+            # Partials are best effort; the final transcript reports errors
+            print(f"Partial transcription error: {e}")
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect()
+
+            if message.get("bytes"):
+                try:
+                    session.add_chunk(message["bytes"])
+                except StreamTooLong as e:
+                    if partial_task is not None:
+                        partial_task.cancel()
+                    await websocket.send_json({"type": "error", "detail": str(e)})
+                    # 1009: message too big
+                    await websocket.close(code=1009)
+                    return
+            elif message.get("text"):
+                try:
+                    event = json.loads(message["text"])
+                except ValueError:
+                    event = {}
+                if event.get("event") == "end":
+                    break
+
+            if session.speech_ended():
+                break
+
+            # Only one partial transcription in flight at a time
+            if session.partial_due() and (partial_task is None or partial_task.done()):
+                partial_task = asyncio.create_task(send_partial())
+
+        if partial_task is not None:
+            partial_task.cancel()
+
+        try:
+            segments = vad.segments(await session.audio(whisper_service.decode_audio))
+            transcribed_text = ""
+            if segments:
+                await models.require("whisper")
+                transcribed_text = await whisper_service.transcribe_segments(segments)
+            await websocket.send_json({"type": "final", "text": transcribed_text})
+
+            if not transcribed_text:
+                await websocket.send_json({"type": "error", "detail": "No speech detected in audio"})
+            else:
+                reply = await generate_reply(transcribed_text)
+                await websocket.send_json({"type": "response", **reply.model_dump()})
+        except Overloaded as e:
+            await websocket.send_json({"type": "error", "detail": str(e), "retry_after": e.retry_after})
+        except StreamTooLong as e:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+        except Exception as e:
+            await websocket.send_json({"type": "error", "detail": f"Error processing voice: {str(e)}"})
+
+        await websocket.close()
+    except WebSocketDisconnect:
+        if partial_task is not None:
+            partial_task.cancel()
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/text/stream")
+async def stream_text(request: TextRequest):
+    """
+    Process text input and stream the response as server-sent events:
+    "intent", then "token" events per generated fragment interleaved with
+    "audio" events as each sentence is synthesized (with TTS_DELIVERY=memory,
+    as soon as its synthesis starts), then "done" with the complete
+    VoiceResponse (including the full TTS audio URL).
+    """
+    # Once the stream has started the status can no longer be 503, so shed
+    # load up front when a stage this request needs is already saturated
+    bert_service.queue.check()
+    gpt_service.queue.check()
+
+    async def events():
+        queue = asyncio.Queue()
+        fragments = []
+        segment_paths = []
+
+        async def tokens():
+            async for fragment in response_fragments(request.text, intent, cached_reply):
+                fragments.append(fragment)
+                await queue.put(sse_event("token", {"text": fragment}))
+                yield fragment
+
+        async def speak():
+            # Audio for each sentence is announced as soon as it is ready
+            try:
+                async for path in tts_service.synthesize_stream(tokens()):
+                    segment_paths.append(path)
+                    await queue.put(sse_event("audio", {"index": len(segment_paths) - 1, "url": audio_url(path)}))
+            finally:
+                await queue.put(None)
+
+        try:
+            intent = await classify_intent(request.text)
+            yield sse_event("intent", {"intent": intent})
+            await models.require("gpt")
+            cached_reply = await response_cache.get_reply(request.text, intent, gpt_service.model_id)
+
+            pipeline = asyncio.create_task(speak())
+            try:
+                while True:
+                    event = await queue.get()
+                    if event is None:
+                        break
+                    yield event
+                await pipeline
+            finally:
+                pipeline.cancel()
+
+            audio_path = await tts_service.concatenate(segment_paths)
+            reply = VoiceResponse(
+                text=request.text,
+                intent=intent,
+                response="".join(fragments).strip(),
+                audio_url=audio_url(audio_path),
+                audio_segments=[audio_url(path) for path in segment_paths],
+                cached=cached_reply is not None
+            )
+            yield sse_event("done", reply.model_dump())
+        except Overloaded as e:
+            yield sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error processing text: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.api_route("/api/voice/audio/{filename}", methods=["GET", "HEAD"])
+async def get_audio(filename: str, request: Request):
+    """
+    Serve generated audio files. Names are hashes of the synthesis input,
+    so a name always stands for the same speech: it is cached by clients
+    for a year, a hash of the audio bytes is its ETag (audio synthesized
+    again after eviction may differ) and byte ranges are supported for
+    seeking. With TTS_DELIVERY=memory audio
+    that is still being synthesized is streamed as it is produced, and
+    audio whose synthesis failed is a 502.
+    """
+    with stage_timer("file_serving"):
+        if tts_service.memory is not None:
+            buffer = tts_service.audio_buffer(filename)
+            if buffer is None:
+                raise HTTPException(status_code=404, detail="Audio file not found")
+            if buffer.error is not None:
+                raise HTTPException(status_code=502, detail=f"Audio synthesis failed: {buffer.error}")
+            return await buffer_response(request, buffer, media_type=buffer.media_type)
+
+        # Off the event loop: a stat per request on a slow disk adds up
+        loop = asyncio.get_event_loop()
+        file_path = await loop.run_in_executor(None, tts_service.audio_path, filename)
+        if file_path is None:
+            raise HTTPException(status_code=404, detail="Audio file not found")
+        
+        try:
+            return await file_response(request, file_path, media_type=tts_service.media_type(filename))
+        except FileNotFoundError:
+            # Evicted by the janitor since audio_path() found it
+            raise HTTPException(status_code=404, detail="Audio file not found")
 
 
 if __name__ == "__main__":
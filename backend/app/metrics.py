@@ -0,0 +1,262 @@
+"""
+Lightweight latency instrumentation: Prometheus-style histograms and gauges
+rendered by the /metrics endpoint, plus per-request stage timings reported
+in the Server-Timing response header.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key: tuple, extra=()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+        return "{" + body + "}"
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', _fmt(bound))])} {bucket_count}")
+                lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {_fmt(total)}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{self._format_labels(key)} {_fmt(value)}")
+        return lines
+
+
+class Counter(Gauge):
+    kind = "counter"
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _fmt(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "voice_assistant_request_seconds",
+    "End-to-end HTTP request latency",
+    ["endpoint", "method", "status"]
+)
+STAGE_SECONDS = Histogram(
+    "voice_assistant_stage_seconds",
+    "Latency of each request pipeline stage",
+    ["stage"]
+)
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    "voice_assistant_executor_queue_depth",
+    "Tasks submitted to a service executor that have not started yet",
+    ["executor"]
+)
+EXECUTOR_ACTIVE = Gauge(
+    "voice_assistant_executor_active",
+    "Tasks currently running on a service executor",
+    ["executor"]
+)
+EXECUTOR_WAIT_SECONDS = Histogram(
+    "voice_assistant_executor_wait_seconds",
+    "Time tasks spend queued before a service executor runs them",
+    ["executor"]
+)
+EXECUTOR_RUN_SECONDS = Histogram(
+    "voice_assistant_executor_run_seconds",
+    "Time tasks spend running on a service executor",
+    ["executor"]
+)
+MODEL_LOAD_SECONDS = Gauge(
+    "voice_assistant_model_load_seconds",
+    "Time taken to load each model",
+    ["model"]
+)
+
+
+# Stage timings of the current request, for the Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    """Record the duration of one pipeline stage"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time the enclosed block as one pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def server_timing_header(timings, total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request and reports the stage
+    timings recorded while handling it in a Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = []
+        token = _request_timings.set(timings)
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                header = server_timing_header(timings, time.perf_counter() - start)
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            endpoint = getattr(scope.get("endpoint"), "__name__", "other")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                endpoint=endpoint,
+                method=scope.get("method", ""),
+                status=status["code"]
+            )
+
+
+class InstrumentedExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that reports queue depth, wait and run time"""
+
+    def __init__(self, name: str, max_workers: int = 1):
+        super().__init__(max_workers=max_workers, thread_name_prefix=name)
+        self.name = name
+
+    def submit(self, fn, /, *args, **kwargs):
+        submitted = time.perf_counter()
+        EXECUTOR_QUEUE_DEPTH.inc(executor=self.name)
+
+        def run():
+            started = time.perf_counter()
+            EXECUTOR_QUEUE_DEPTH.dec(executor=self.name)
+            EXECUTOR_ACTIVE.inc(executor=self.name)
+            EXECUTOR_WAIT_SECONDS.observe(started - submitted, executor=self.name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                EXECUTOR_ACTIVE.dec(executor=self.name)
+                EXECUTOR_RUN_SECONDS.observe(time.perf_counter() - started, executor=self.name)
+
+        try:
+            future = super().submit(run)
+        except Exception:
+            EXECUTOR_QUEUE_DEPTH.dec(executor=self.name)
+            raise
+        # A task cancelled before it started never runs `run`
+        future.add_done_callback(
+            lambda f: EXECUTOR_QUEUE_DEPTH.dec(executor=self.name) if f.cancelled() else None
+        )
+        return future
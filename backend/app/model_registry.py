@@ -0,0 +1,183 @@
+"""
+Model registry: loads the models behind each service concurrently in the
+background (or lazily on first use), runs a warm-up inference and reports
+per-model readiness for /health.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.metrics import Gauge, MODEL_LOAD_SECONDS
+
+MODEL_READY = Gauge(
+    "voice_assistant_model_ready",
+    "1 once a model is loaded and can serve requests",
+    ["model"]
+)
+MODEL_WARMUP_SECONDS = Gauge(
+    "voice_assistant_model_warmup_seconds",
+    "Time taken by each model's warm-up inference",
+    ["model"]
+)
+
+
+class _ModelEntry:
+    def __init__(self, name: str, load_fn, warmup_fn=None):
+        self.name = name
+        self.load_fn = load_fn
+        self.warmup_fn = warmup_fn
+        self.state = "unloaded"  # unloaded -> loading -> ready | failed
+        self.future = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.ready_after = None
+        self.error = None
+        self.needs_warmup = False
+
+
+class ModelRegistry:
+    """
+    Each model is loaded at most once, on a small thread pool, so several
+    models load at the same time and the server accepts connections while
+    they do. Request handlers await require(name), which starts the load if
+    nobody has yet and waits for it to finish.
+    """
+
+    def __init__(self, max_workers: int = 0, warmup: bool = True):
+        self.max_workers = max_workers
+        self.warmup = warmup
+        self.created_at = time.perf_counter()
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def register(self, name: str, load_fn, warmup_fn=None):
+        """Register a blocking load function and optional warm-up function"""
+        self._entries[name] = _ModelEntry(name, load_fn, warmup_fn)
+        MODEL_READY.set(0, model=name)
+
+    @property
+    def names(self) -> list:
+        return list(self._entries)
+
+    def start(self, names=None):
+        """Begin loading the given models (default: all) in the background"""
+        for name in self._entries if names is None else names:
+            self._schedule(name)
+
+    def load(self, name: str):
+        """Load a model, blocking until it is ready"""
+        self._schedule(name).result()
+
+    def load_in_process(self, names=None):
+        """
+        Load models one after another on the calling thread, without a
+        thread pool and without warming them up. Used by the pre-fork server
+        before forking workers: no threads exist yet at fork time, and each
+        worker runs the warm-up when it starts the registry.
+        """
+        for name in self._entries if names is None else names:
+            entry = self._entries[name]
+            with self._lock:
+                if entry.future is not None:
+                    continue
+                entry.future = Future()
+                entry.state = "loading"
+            self._load(entry, warmup=False)
+
+    async def require(self, name: str):
+        """Wait until a model is ready, loading it now if nothing has yet"""
+        future = self._schedule(name)
+        if not future.done():
+            await asyncio.wrap_future(future)
+        else:
+            future.result()
+
+    def is_ready(self, name: str) -> bool:
+        return self._entries[name].state == "ready"
+
+    def all_ready(self) -> bool:
+        return all(entry.state == "ready" for entry in self._entries.values())
+
+    def status(self) -> dict:
+        """Per-model state and timings, in seconds"""
+        return {
+            name: {
+                "state": entry.state,
+                "load_seconds": _round(entry.load_seconds),
+                "warmup_seconds": _round(entry.warmup_seconds),
+                "ready_after_seconds": _round(entry.ready_after),
+                "error": entry.error
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule(self, name: str) -> Future:
+        if name not in self._entries:
+            raise Exception(f"Unknown model: {name}")
+        entry = self._entries[name]
+        with self._lock:
+            if entry.needs_warmup:
+                # Loaded before a fork; warm up in this process
+                entry.needs_warmup = False
+                self._get_executor().submit(self._warm_up, entry)
+            if entry.future is None:
+                entry.future = Future()
+                entry.state = "loading"
+                self._get_executor().submit(self._load, entry)
+            return entry.future
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            workers = self.max_workers or max(1, len(self._entries))
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model-load")
+        return self._executor
+
+    def _load(self, entry: _ModelEntry, warmup: bool = True):
+        print(f"Loading model: {entry.name}")
+        start = time.perf_counter()
+        try:
+            entry.load_fn()
+        except Exception as e:
+            print(f"Error loading {entry.name} model: {e}")
+            entry.error = str(e)
+            entry.state = "failed"
+            entry.future.set_exception(e)
+            return
+        entry.load_seconds = time.perf_counter() - start
+        MODEL_LOAD_SECONDS.set(entry.load_seconds, model=entry.name)
+
+        if warmup:
+            self._warm_up(entry)
+        else:
+            entry.needs_warmup = True
+
+        entry.ready_after = time.perf_counter() - self.created_at
+        entry.state = "ready"
+        MODEL_READY.set(1, model=entry.name)
+        print(f"{entry.name} model ready after {entry.ready_after:.1f}s")
+        entry.future.set_result(None)
+
+    def _warm_up(self, entry: _ModelEntry):
+        """
+        Pay one-off allocation and kernel selection costs before the first
+        real request does; a failed warm-up does not make the model unusable
+        """
+        if not self.warmup or entry.warmup_fn is None:
+            return
+        start = time.perf_counter()
+        try:
+            entry.warmup_fn()
+        except Exception as e:
+            print(f"Warm-up of {entry.name} model failed: {e}")
+        entry.warmup_seconds = time.perf_counter() - start
+        MODEL_WARMUP_SECONDS.set(entry.warmup_seconds, model=entry.name)
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
@@ -0,0 +1,181 @@
+"""
+A small DAG executor for request pipelines. Stages declare the stages (or
+pipeline inputs) they depend on and start as soon as those are done, so
+independent stages run concurrently.
+
+A stage may be conditional: when its `when` predicate is false once its
+dependencies are done, it is skipped and its result is None.
+
+A stage may speculate on a dependency: it starts with a guessed value
+before the dependency finishes, and when the real value differs the
+speculative run is cancelled and the stage restarts with it.
+
+Stage durations are recorded like any other pipeline stage (histogram and
+Server-Timing), and each run's critical path, the chain of stages that
+set its total latency, is recorded per stage.
+"""
+import asyncio
+import time
+
+from app.metrics import Counter, Histogram, record_stage
+
+PIPELINE_CRITICAL_PATH_SECONDS = Histogram(
+    "voice_assistant_pipeline_critical_path_seconds",
+    "Time each stage spent on the critical path of a pipeline run",
+    ["pipeline", "stage"]
+)
+PIPELINE_SPECULATIONS = Counter(
+    "voice_assistant_pipeline_speculations_total",
+    "Speculative stage runs by outcome (hit: the guess was right, miss: restarted)",
+    ["pipeline", "stage", "outcome"]
+)
+
+
+class Stage:
+    def __init__(self, name: str, fn, after=(), speculate=None, record: bool = True, when=None):
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+        # dependency -> guess(results) returning a provisional value or None
+        self.speculate = dict(speculate or {})
+        self.record = record
+        self.when = when
+
+
+class PipelineRun:
+    """The results and stage timings of one run"""
+
+    def __init__(self, pipeline, inputs: dict):
+        self.pipeline = pipeline
+        self.results = dict(inputs)
+        self.start = time.perf_counter()
+        self.started = {}   # stage -> start of the run whose result was kept
+        self.finished = {}  # stage -> time its result was committed
+
+    def __getitem__(self, name: str):
+        return self.results[name]
+
+    def critical_path(self) -> list:
+        """
+        [(stage, seconds)] from the first stage to the last one to finish.
+        Walking back from the last stage, each step follows the dependency
+        that finished last; a stage only counts for the time after it began
+        and after that dependency finished (speculation overlaps the two).
+        """
+        if not self.finished:
+            return []
+        path = []
+        name = max(self.finished, key=self.finished.get)
+        while name is not None:
+            stage = self.pipeline.stages[name]
+            deps = [dep for dep in stage.after if dep in self.finished]
+            previous = max(deps, key=self.finished.get) if deps else None
+            begin = self.started[name]
+            if previous is not None:
+                begin = max(begin, self.finished[previous])
+            path.append((name, max(0.0, self.finished[name] - begin)))
+            name = previous
+        return path[::-1]
+
+
+class Pipeline:
+    """
+    Stages are declared in order and may only depend on inputs and stages
+    declared before them, so the graph has no cycles. Each stage function
+    is called with the results so far (a dict with the values of all its
+    dependencies) and returns an awaitable.
+    """
+
+    def __init__(self, name: str, inputs=()):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.stages = {}
+
+    def stage(self, name: str, fn, after=(), speculate=None, record: bool = True, when=None) -> "Pipeline":
+        if name in self.stages or name in self.inputs:
+            raise Exception(f"Pipeline {self.name} already has a stage or input named {name}")
+        for dep in after:
+            if dep not in self.stages and dep not in self.inputs:
+                raise Exception(f"Stage {name} depends on unknown stage {dep}")
+        for dep in speculate or {}:
+            if dep not in self.stages:
+                raise Exception(f"Stage {name} can only speculate on a stage it depends on, not {dep}")
+            if dep not in after:
+                raise Exception(f"Stage {name} speculates on {dep} without depending on it")
+        self.stages[name] = Stage(name, fn, after, speculate, record, when)
+        return self
+
+    async def run(self, **inputs) -> PipelineRun:
+        """Run every stage; the first stage to fail cancels the rest and its error is raised"""
+        missing = [name for name in self.inputs if name not in inputs]
+        if missing:
+            raise Exception(f"Pipeline {self.name} is missing inputs: {', '.join(missing)}")
+        run = PipelineRun(self, inputs)
+        tasks = {}
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.ensure_future(self._execute(run, stage, tasks))
+        try:
+            done, _ = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        for name, seconds in run.critical_path():
+            PIPELINE_CRITICAL_PATH_SECONDS.observe(seconds, pipeline=self.name, stage=name)
+        return run
+
+    async def _execute(self, run: PipelineRun, stage: Stage, tasks: dict):
+        await self._wait_for([dep for dep in stage.after if dep not in stage.speculate], tasks)
+
+        if stage.when is not None and not stage.when(run.results):
+            run.results[stage.name] = None
+            run.started[stage.name] = run.finished[stage.name] = time.perf_counter()
+            return
+
+        guesses = {}
+        for dep, guess in stage.speculate.items():
+            if dep not in run.finished:
+                value = guess(run.results)
+                if value is not None:
+                    guesses[dep] = value
+
+        if guesses:
+            attempt = asyncio.ensure_future(self._attempt(stage, {**run.results, **guesses}))
+            try:
+                await self._wait_for(list(guesses), tasks)
+            except BaseException:
+                attempt.cancel()
+                raise
+            if all(run.results[dep] == value for dep, value in guesses.items()):
+                PIPELINE_SPECULATIONS.inc(pipeline=self.name, stage=stage.name, outcome="hit")
+                started, result, seconds = await attempt
+                self._commit(run, stage, started, result, seconds)
+                return
+            PIPELINE_SPECULATIONS.inc(pipeline=self.name, stage=stage.name, outcome="miss")
+            attempt.cancel()
+
+        await self._wait_for(list(stage.speculate), tasks)
+        started, result, seconds = await self._attempt(stage, dict(run.results))
+        self._commit(run, stage, started, result, seconds)
+
+    async def _attempt(self, stage: Stage, results: dict):
+        started = time.perf_counter()
+        result = await stage.fn(results)
+        return started, result, time.perf_counter() - started
+
+    def _commit(self, run: PipelineRun, stage: Stage, started: float, result, seconds: float):
+        run.results[stage.name] = result
+        run.started[stage.name] = started
+        run.finished[stage.name] = time.perf_counter()
+        if stage.record:
+            record_stage(stage.name, seconds)
+
+    async def _wait_for(self, names: list, tasks: dict):
+        """Wait for stages without cancelling them if this stage is cancelled"""
+        waiting = [tasks[name] for name in names if name in tasks]
+        if waiting:
+            await asyncio.wait(waiting)
+            for task in waiting:
+                task.result()
@@ -0,0 +1,192 @@
+"""
+Inference scheduling: bounded per-stage admission queues that reject work
+with 503 + Retry-After instead of queueing without bound, per-request
+deadlines and client-disconnect cancellation, and torch thread tuning.
+"""
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from app.metrics import Counter, Gauge
+
+STAGE_PENDING = Gauge(
+    "voice_assistant_stage_pending",
+    "Requests admitted to an inference stage (running or waiting)",
+    ["stage"]
+)
+STAGE_REJECTED = Counter(
+    "voice_assistant_stage_rejected_total",
+    "Requests rejected because an inference stage queue was full",
+    ["stage"]
+)
+REQUESTS_CANCELLED = Counter(
+    "voice_assistant_requests_cancelled_total",
+    "Requests whose handler was cancelled before it finished",
+    ["reason"]
+)
+
+
+class Overloaded(Exception):
+    """An inference stage is saturated; the client should retry later"""
+
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"The {stage} stage is overloaded, retry in {retry_after}s")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class StageQueue:
+    """
+    Admission control for one inference stage. Up to `concurrency` requests
+    are served at once and `max_queue` more may wait; further requests are
+    rejected with Overloaded. A negative max_queue disables the limit.
+
+    Used from the event loop only, so the counters need no lock.
+    """
+
+    def __init__(self, stage: str, concurrency: int = 1, max_queue: int = -1):
+        self.stage = stage
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.pending = 0
+        self._latency = None  # Moving average of time spent in the stage
+
+    def full(self) -> bool:
+        return self.max_queue >= 0 and self.pending >= self.concurrency + self.max_queue
+
+    def retry_after(self) -> int:
+        """Whole seconds a rejected client should wait: about one stage latency"""
+        return max(1, min(60, math.ceil(self._latency or 1.0)))
+
+    def check(self):
+        """Raise Overloaded if a new request would be rejected"""
+        if self.full():
+            STAGE_REJECTED.inc(stage=self.stage)
+            raise Overloaded(self.stage, self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a place in the stage for the enclosed block"""
+        self.check()
+        self.pending += 1
+        STAGE_PENDING.set(self.pending, stage=self.stage)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.pending -= 1
+            STAGE_PENDING.set(self.pending, stage=self.stage)
+            elapsed = time.perf_counter() - start
+            self._latency = elapsed if self._latency is None else 0.8 * self._latency + 0.2 * elapsed
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue
+        }
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that cancels an HTTP request's handler when the client
+    disconnects or when its deadline passes: `timeout` seconds, or less if
+    the client sends an X-Request-Timeout header. Cancellation reaches the
+    awaited inference work: executor tasks that have not started are
+    dropped, batched requests are skipped and local generation stops.
+    A request that times out before its response starts gets a 504.
+    `path_timeouts` overrides the timeout for particular paths (0 for none).
+    """
+
+    def __init__(self, app, timeout: float = 0, path_timeouts: dict = None):
+        self.app = app
+        self.timeout = timeout
+        self.path_timeouts = path_timeouts or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timeout = self._timeout(scope)
+        messages = asyncio.Queue()
+        response = {"started": False, "complete": False}
+
+        async def watch():
+            # Read ahead so a disconnect is seen while the handler is busy
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        async def send_tracked(message):
+            if message["type"] == "http.response.start":
+                response["started"] = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response["complete"] = True
+            await send(message)
+
+        handler = asyncio.ensure_future(self.app(scope, messages.get, send_tracked))
+        watcher = asyncio.ensure_future(watch())
+        try:
+            done, _ = await asyncio.wait(
+                {handler, watcher},
+                timeout=timeout if timeout > 0 else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if handler not in done and not response["complete"]:
+                reason = "disconnect" if watcher in done else "deadline"
+                REQUESTS_CANCELLED.inc(reason=reason)
+                handler.cancel()
+                try:
+                    await handler
+                except asyncio.CancelledError:
+                    pass
+                if reason == "deadline" and not response["started"]:
+                    await _send_json(send, 504, b'{"detail":"Request deadline exceeded"}')
+                return
+            await handler
+        finally:
+            handler.cancel()
+            watcher.cancel()
+
+    def _timeout(self, scope) -> float:
+        timeout = self.path_timeouts.get(scope.get("path"), self.timeout)
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-timeout":
+                try:
+                    requested = float(value)
+                except ValueError:
+                    break
+                if requested > 0:
+                    timeout = min(timeout, requested) if timeout > 0 else requested
+                break
+        return timeout
+
+
+async def _send_json(send, status: int, body: bytes):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def configure_torch_threads():
+    """Apply TORCH_THREADS and TORCH_INTEROP_THREADS (0 keeps torch's default)"""
+    import torch
+
+    threads = int(os.getenv("TORCH_THREADS", 0))
+    interop_threads = int(os.getenv("TORCH_INTEROP_THREADS", 0))
+    if threads > 0:
+        torch.set_num_threads(threads)
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            print(f"Could not set torch inter-op threads: {e}")
+    print(f"torch: {torch.get_num_threads()} intra-op threads, {torch.get_num_interop_threads()} inter-op threads")
@@ -0,0 +1,94 @@
+import io
+import shutil
+import subprocess
+import wave
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+FFMPEG_MISSING_MESSAGE = (
+    "ffmpeg is not installed. Please install it using: "
+    "brew install ffmpeg (macOS) or apt-get install ffmpeg (Linux)"
+)
+
+# Resolved once at startup instead of spawning `ffmpeg -version` per request
+FFMPEG_PATH = shutil.which("ffmpeg")
+
+
+def ffmpeg_available() -> bool:
+    return FFMPEG_PATH is not None
+
+
+def decode_audio(data: bytes) -> np.ndarray:
+    """
+    Decode uploaded audio bytes to 16 kHz mono float32 samples in memory.
+    PCM WAV is decoded natively; anything else is piped through ffmpeg.
+    """
+    if is_wav(data):
+        try:
+            return decode_wav(data)
+        except (wave.Error, ValueError):
+            pass  # Compressed or unusual WAV, let ffmpeg handle it
+    return decode_with_ffmpeg(data)
+
+
+def decode_pcm16(data: bytes) -> np.ndarray:
+    """Raw little-endian 16-bit PCM to float32 in [-1, 1]"""
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def is_wav(data: bytes) -> bool:
+    return len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+
+
+def decode_wav(data: bytes) -> np.ndarray:
+    """Decode an integer PCM WAV file without spawning a process"""
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+
+    if rate != SAMPLE_RATE:
+        samples = resample(samples, rate)
+    return samples.astype(np.float32)
+
+
+def resample(samples: np.ndarray, rate: int) -> np.ndarray:
+    """Linear-interpolation resampling to 16 kHz"""
+    if len(samples) == 0:
+        return samples
+    duration = len(samples) / rate
+    target = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    source = np.arange(len(samples)) / rate
+    return np.interp(target, source, samples).astype(np.float32)
+
+
+def decode_with_ffmpeg(data: bytes) -> np.ndarray:
+    """Pipe audio bytes through a single ffmpeg process, no temp files"""
+    if not ffmpeg_available():
+        raise Exception(FFMPEG_MISSING_MESSAGE)
+
+    cmd = [
+        FFMPEG_PATH, "-nostdin", "-threads", "0",
+        "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE),
+        "pipe:1"
+    ]
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"Failed to decode audio: {e.stderr.decode(errors='ignore')[-200:]}")
+    return decode_pcm16(out)
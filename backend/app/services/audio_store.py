@@ -0,0 +1,188 @@
+"""
+Generated audio kept in memory instead of generated_audio/ (TTS_DELIVERY=memory).
+Synthesizers write into an AudioBuffer from a worker thread while the
+audio endpoint streams the same buffer to clients, so playback can start
+before synthesis has finished.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+# Largest piece handed to a reader at once
+CHUNK_SIZE = 64 * 1024
+
+
+class AudioBuffer:
+    """
+    Audio being written and then held in memory. File-like (write/flush),
+    so synthesizers can write_to_fp() into it from any thread; readers on
+    the event loop get the bytes as they arrive.
+    """
+
+    def __init__(self, media_type: str):
+        self.media_type = media_type
+        self.done = False
+        self.error = None
+        self._data = bytearray()
+        self._lock = threading.Lock()
+        self._waiters = []  # (loop, future) of readers waiting for more data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def write(self, data: bytes) -> int:
+        with self._lock:
+            if self.done:
+                raise ValueError("Write to finished audio")
+            self._data += data
+            waiters, self._waiters = self._waiters, []
+        _wake(waiters)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def patch(self, offset: int, data: bytes):
+        """Overwrite bytes already written (e.g. a header with final sizes)"""
+        with self._lock:
+            self._data[offset:offset + len(data)] = data
+
+    def finish(self, error: Optional[BaseException] = None):
+        """Mark the audio complete, or failed with error"""
+        with self._lock:
+            if self.done:
+                return
+            self.done = True
+            self.error = error
+            waiters, self._waiters = self._waiters, []
+        _wake(waiters)
+
+    def getvalue(self) -> bytes:
+        with self._lock:
+            return bytes(self._data)
+
+    async def wait(self) -> bytes:
+        """The complete audio once it is finished; raises its error if it failed"""
+        while True:
+            with self._lock:
+                if self.done:
+                    break
+                future = self._waiter_locked()
+            await future
+        if self.error is not None:
+            raise self.error
+        return self.getvalue()
+
+    async def started(self):
+        """Wait for the first bytes; raises the error if the audio failed"""
+        while True:
+            with self._lock:
+                if self._data or self.done:
+                    break
+                future = self._waiter_locked()
+            await future
+        if self.error is not None:
+            raise self.error
+
+    async def chunks(self, start: int = 0) -> AsyncIterator[bytes]:
+        """The bytes from start on, as they are written, until the audio is finished"""
+        position = start
+        while True:
+            with self._lock:
+                future = None
+                if position < len(self._data):
+                    chunk = bytes(self._data[position:position + CHUNK_SIZE])
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    future = self._waiter_locked()
+            if future is None:
+                position += len(chunk)
+                yield chunk
+            else:
+                await future
+
+    def _waiter_locked(self) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters.append((loop, future))
+        return future
+
+
+def _wake(waiters: list):
+    for loop, future in waiters:
+        try:
+            loop.call_soon_threadsafe(_resolve, future)
+        except RuntimeError:
+            # The reader's loop is closed
+            pass
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AudioStore:
+    """
+    AudioBuffers by filename, bounded by total bytes; entries unused for
+    ttl seconds expire and the least recently used are evicted first.
+    Readers holding a buffer keep it alive after eviction.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # filename -> [buffer, last used]
+        self._lock = threading.Lock()
+
+    def get(self, filename: str) -> Optional[AudioBuffer]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None:
+                return None
+            if self.ttl > 0 and now - entry[1] > self.ttl:
+                del self._entries[filename]
+                return None
+            entry[1] = now
+            self._entries.move_to_end(filename)
+            return entry[0]
+
+    def add(self, filename: str, buffer: AudioBuffer):
+        with self._lock:
+            self._entries[filename] = [buffer, time.time()]
+            self._entries.move_to_end(filename)
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used beyond max_bytes"""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            if self.ttl > 0:
+                for filename in [name for name, (_, used) in self._entries.items() if now - used > self.ttl]:
+                    del self._entries[filename]
+                    removed += 1
+            size = sum(len(buffer) for buffer, _ in self._entries.values())
+            # The newest entry stays even if it alone is over the bound
+            while size > self.max_bytes and len(self._entries) > 1:
+                _, (buffer, _) = self._entries.popitem(last=False)
+                size -= len(buffer)
+                removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffers = [buffer for buffer, _ in self._entries.values()]
+        return {
+            "entries": len(buffers),
+            "in_progress": sum(1 for buffer in buffers if not buffer.done),
+            "bytes": sum(len(buffer) for buffer in buffers),
+            "max_bytes": self.max_bytes
+        }
@@ -3,9 +3,18 @@ import torch
 import os
 from dotenv import load_dotenv
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
+from app.metrics import InstrumentedExecutor
+from app.scheduler import StageQueue
+from app.services.batching import MicroBatcher
+from app.services.model_backends import backend_from_env, load_encoder
+from app.services.intent_engine import (
+    DEFAULT_INTENT,
+    KeywordIntentMatcher,
+    load_or_build_index,
+)
+
 load_dotenv()
 
 class BertService:
@@ -13,7 +22,32 @@ class BertService:
         self.tokenizer = None
         self.model = None
         self.model_name = os.getenv("BERT_MODEL", "bert-base-uncased")
-        self.executor = ThreadPoolExecutor(max_workers=1)
+        # torch (fp32), int8 (dynamic quantization) or onnx (ONNX Runtime)
+        self.backend = backend_from_env("BERT_BACKEND")
+        self.executor = InstrumentedExecutor("bert", max_workers=1)
+        
+        # Intent engine: "rules" uses keyword matching only, "hybrid" falls
+        # back to nearest-centroid over BERT embeddings when no rule matches,
+        # "embedding" classifies every text by nearest centroid
+        self.engine = os.getenv("INTENT_ENGINE", "hybrid").lower()
+        self.matcher = KeywordIntentMatcher()
+        self.centroid_classifier = None
+        
+        # Micro-batching: concurrent requests share one forward pass
+        self.max_batch_size = int(os.getenv("BERT_MAX_BATCH_SIZE", 16))
+        self.max_wait_ms = float(os.getenv("BERT_MAX_WAIT_MS", 5))
+        self.batcher = MicroBatcher(
+            self._classify_batch_sync,
+            self.executor,
+            max_batch_size=self.max_batch_size,
+            max_wait_ms=self.max_wait_ms
+        )
+        # Texts that need the model beyond one batch plus BERT_MAX_QUEUE are rejected
+        self.queue = StageQueue(
+            "bert",
+            concurrency=self.max_batch_size,
+            max_queue=int(os.getenv("BERT_MAX_QUEUE", 64))
+        )
         
         # Intent categories for classification
         self.intents = [
@@ -24,10 +58,26 @@ class BertService:
             "conversation",
             "goodbye"
         ]
+    
+    @property
+    def needs_model(self) -> bool:
+        """INTENT_ENGINE=rules classifies with keywords only"""
+        return self.engine != "rules"
+    
+    def load(self):
+        """Load the model (called by the model registry)"""
         self._load_model()
     
+    def warmup(self):
+        """Run one forward pass on the inference thread"""
+        if self.needs_model:
+            self.executor.submit(self._embed, ["Hello, how are you today?"]).result()
+    
     def _load_model(self):
         """Load BERT model for intent classification"""
+        if not self.needs_model:
+            print("INTENT_ENGINE=rules: not loading BERT")
+            return
         print(f"Loading BERT model: {self.model_name}")
         try:
             # For intent classification, we'll use a simple approach
@@ -36,70 +86,117 @@ class BertService:
             
             # Use a sequence classification model
             # We'll create a simple classifier using BERT embeddings
-            from transformers import AutoModel
-            self.model = AutoModel.from_pretrained(self.model_name)
-            self.model.eval()
+            self.model = load_encoder(self.model_name, self.backend)
+            
+            if self.engine in ("hybrid", "embedding"):
+                self.centroid_classifier = load_or_build_index(self.index_name, self._embed)
             
-            print("BERT model loaded successfully")
+            print(f"BERT model loaded successfully ({self.backend} backend)")
         except Exception as e:
             print(f"Error loading BERT model: {e}")
             raise
     
+    @property
+    def index_name(self) -> str:
+        """Centroids are computed per backend, whose embeddings differ slightly"""
+        return self.model_name if self.backend == "torch" else f"{self.model_name}-{self.backend}"
+    
     def is_loaded(self):
-        return self.model is not None and self.tokenizer is not None
+        return not self.needs_model or (self.model is not None and self.tokenizer is not None)
+    
+    def rule_intent(self, text: str):
+        """
+        The intent if the keyword rules decide it (always with
+        INTENT_ENGINE=rules), else None. Needs no model, so it can be
+        called before BERT is loaded.
+        """
+        if self.engine == "embedding":
+            return None
+        intent = self.matcher.match(text)
+        if intent is None and self.engine == "rules":
+            return DEFAULT_INTENT
+        return intent
     
     async def classify_intent(self, text: str) -> str:
         """
-        Classify intent of the text using BERT embeddings
+        Classify intent of the text.
+        Keyword rules are tried first without touching the model; only texts
+        they cannot decide are sent to BERT, batched with concurrent calls.
         """
+        intent = self.rule_intent(text)
+        if intent is not None:
+            return intent
+        
         if not self.model or not self.tokenizer:
             raise Exception("BERT model not loaded")
+        if self.centroid_classifier is None:
+            return DEFAULT_INTENT
         
-        loop = asyncio.get_event_loop()
-        intent = await loop.run_in_executor(
-            self.executor,
-            self._classify_intent_sync,
-            text
-        )
+        async with self.queue.slot():
+            return await self.batcher.submit(text)
+    
+    def provisional_intent(self, text: str) -> str:
+        """
+        A guess at the intent without the model: the keyword match, or the
+        default intent. Exact unless the text needs the embedding classifier.
+        """
+        return self.matcher.match(text) or DEFAULT_INTENT
+    
+    async def classify_intent_unbatched(self, text: str) -> str:
+        """Classify a single text with its own forward pass (no batching)"""
+        if not self.model or not self.tokenizer:
+            raise Exception("BERT model not loaded")
+        
+        async with self.queue.slot():
+            loop = asyncio.get_event_loop()
+            intent = await loop.run_in_executor(
+                self.executor,
+                self._classify_intent_sync,
+                text
+            )
         return intent
     
     def _classify_intent_sync(self, text: str) -> str:
         """Synchronous intent classification"""
+        return self._classify_batch_sync([text])[0]
+    
+    def _classify_batch_sync(self, texts: list) -> list:
+        """Synchronous intent classification for a batch of texts"""
         try:
-            # Tokenize input
-            inputs = self.tokenizer(
-                text,
-                return_tensors="pt",
-                truncation=True,
-                max_length=128,
-                padding=True
-            )
-            
-            # Get BERT embeddings
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                # Use [CLS] token embedding
-                embeddings = outputs.last_hidden_state[:, 0, :].numpy()
+            if self.engine == "embedding":
+                intents = [None] * len(texts)
+            else:
+                intents = [self.matcher.match(text) for text in texts]
+            pending = [i for i, intent in enumerate(intents) if intent is None]
             
-            # Simple rule-based intent classification based on keywords
-            # In production, use a fine-tuned classifier
-            text_lower = text.lower()
+            # Only run the transformer for texts the rules could not decide
+            if pending and self.centroid_classifier is not None:
+                embeddings = self._embed([texts[i] for i in pending])
+                for i, intent in zip(pending, self.centroid_classifier.classify(embeddings)):
+                    intents[i] = intent
             
-            if any(word in text_lower for word in ["hello", "hi", "hey", "good morning", "good afternoon"]):
-                return "greeting"
-            elif any(word in text_lower for word in ["what", "how", "why", "when", "where", "who", "?"]):
-                return "question"
-            elif any(word in text_lower for word in ["play", "stop", "open", "close", "turn on", "turn off", "set"]):
-                return "command"
-            elif any(word in text_lower for word in ["tell me", "explain", "describe", "information"]):
-                return "information"
-            elif any(word in text_lower for word in ["bye", "goodbye", "see you", "farewell"]):
-                return "goodbye"
-            else:
-                return "conversation"
+            return [intent or DEFAULT_INTENT for intent in intents]
                 
         except Exception as e:
             print(f"Intent classification error: {str(e)}")
-            return "conversation"  # Default fallback
-
-
+            return [DEFAULT_INTENT] * len(texts)  # Default fallback
+    
+    def _embed(self, texts: list) -> np.ndarray:
+        """Mean-pooled BERT embeddings for a batch of texts"""
+        # Tokenize all inputs together, padded to the longest one
+        inputs = self.tokenizer(
+            texts,
+            return_tensors="pt",
+            truncation=True,
+            max_length=128,
+            padding=True
+        )
+        
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+            # Average token embeddings, ignoring padding
+            mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+            summed = (outputs.last_hidden_state * mask).sum(dim=1)
+            embeddings = summed / mask.sum(dim=1).clamp(min=1)
+        
+        return embeddings.numpy()
@@ -1,21 +1,64 @@
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import AutoTokenizer, TextStreamer, StoppingCriteria, StoppingCriteriaList
 import torch
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from typing import AsyncIterator, Callable
+
+from app.metrics import InstrumentedExecutor
+from app.scheduler import StageQueue
+from app.services.local_generation import LocalGenerationEngine
+from app.services.model_backends import backend_from_env, load_causal_lm
+from app.services.openai_client import DeadlineExceeded, OpenAIChat
 
 load_dotenv()
 
+
+class GenerationCancelled(Exception):
+    """Raised inside a generation thread whose consumer went away"""
+
+
 class GPTService:
     def __init__(self):
         self.openai_client = None
         self.local_model = None
         self.tokenizer = None
         self.use_openai = False
-        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.local_engine = None
+        # Local model backend: torch (fp32), int8 (dynamic quantization) or
+        # onnx (ONNX Runtime)
+        self.backend = backend_from_env("GPT_BACKEND")
+        self.executor = InstrumentedExecutor("gpt", max_workers=1)
+        # Replies beyond those being generated plus GPT_MAX_QUEUE waiting are rejected
+        self.queue = StageQueue("gpt", max_queue=int(os.getenv("GPT_MAX_QUEUE", 16)))
+    
+    def load(self):
+        """Set up OpenAI or load the local model (called by the model registry)"""
         self._initialize()
+        if self.use_openai:
+            self.queue.concurrency = self.openai_client.max_in_flight
+        elif self.local_engine is not None:
+            self.queue.concurrency = self.local_engine.batcher.max_batch_size
+    
+    def warmup(self):
+        """Generate a few tokens locally on the inference thread"""
+        if self.local_model is None:
+            return
+        if self.local_engine is not None:
+            self.executor.submit(self.local_engine.warmup).result()
+            return
+        
+        def run():
+            inputs = self.tokenizer("Hello", return_tensors="pt")
+            with torch.no_grad():
+                self.local_model.generate(
+                    **inputs,
+                    max_new_tokens=4,
+                    do_sample=False,
+                    pad_token_id=self.tokenizer.eos_token_id
+                )
+        self.executor.submit(run).result()
     
     def _initialize(self):
         """Initialize GPT service - try OpenAI first, fallback to local model"""
@@ -23,9 +66,12 @@ class GPTService:
         
         if api_key and api_key != "your_openai_api_key_here":
             try:
-                self.openai_client = OpenAI(api_key=api_key)
+                self.openai_client = OpenAIChat(api_key=api_key)
                 self.use_openai = True
                 print("Using OpenAI API for GPT")
+                # The local model answers when OpenAI misses its deadline
+                if os.getenv("OPENAI_LOCAL_FALLBACK", "false").lower() == "true":
+                    self._load_local_model()
             except Exception as e:
                 print(f"Error initializing OpenAI: {e}, falling back to local model")
                 self._load_local_model()
@@ -36,33 +82,227 @@ class GPTService:
     def _load_local_model(self):
         """Load local GPT model as fallback"""
         try:
-            print("Loading local GPT model (gpt2)...")
+            print(f"Loading local GPT model (gpt2, {self.backend} backend)...")
             model_name = "gpt2"
             self.tokenizer = AutoTokenizer.from_pretrained(model_name)
             self.tokenizer.pad_token = self.tokenizer.eos_token
-            self.local_model = AutoModelForCausalLM.from_pretrained(model_name)
-            self.local_model.eval()
+            self.local_model = load_causal_lm(model_name, self.backend)
             print("Local GPT model loaded successfully")
         except Exception as e:
             print(f"Error loading local GPT model: {e}")
             # Use a simple fallback
             self.local_model = None
+            return
+        
+        # Batched decoding with a cached prompt prefix ("generate" keeps the
+        # plain one-request-at-a-time model.generate path). The engine drives
+        # torch key/value caches directly, so ONNX models use generate.
+        if os.getenv("GPT_LOCAL_ENGINE", "batched").lower() == "batched" and self.backend != "onnx":
+            try:
+                self.local_engine = LocalGenerationEngine(
+                    self.local_model,
+                    self.tokenizer,
+                    self.executor,
+                    max_batch_size=int(os.getenv("GPT_MAX_BATCH_SIZE", 8)),
+                    max_wait_ms=float(os.getenv("GPT_MAX_WAIT_MS", 10))
+                )
+            except Exception as e:
+                print(f"Error initializing batched generation, using model.generate: {e}")
+                self.local_engine = None
     
     def is_ready(self):
         return self.openai_client is not None or self.local_model is not None
     
+    @property
+    def model_id(self) -> str:
+        """What generates the replies, for caching them"""
+        if self.use_openai:
+            return f"openai:{self.openai_client.model}"
+        if self.local_model is not None:
+            return f"gpt2-{self.backend}"
+        return "fallback"
+    
+    def is_fallback_response(self, user_input: str, intent: str, response: str) -> bool:
+        """Whether a reply is the canned one used when generation fails"""
+        return response == self._get_fallback_response(intent, user_input)
+    
     async def generate_response(self, user_input: str, intent: str) -> str:
         """
         Generate response using GPT based on user input and intent
         """
+        async with self.queue.slot():
+            if self.use_openai:
+                try:
+                    return await self.openai_client.complete(
+                        self._messages(user_input, intent),
+                        max_tokens=150,
+                        temperature=0.7
+                    )
+                except Exception as e:
+                    print(f"Response generation error: {str(e)}")
+                    if not isinstance(e, DeadlineExceeded) or self.local_model is None:
+                        return self._get_fallback_response(intent, user_input)
+            return await self._generate_local(user_input, intent)
+    
+    async def _generate_local(self, user_input: str, intent: str) -> str:
+        if self.local_engine is not None:
+            try:
+                response = await self.local_engine.generate(user_input, intent)
+            except Exception as e:
+                print(f"Response generation error: {str(e)}")
+                return self._get_fallback_response(intent, user_input)
+            return response if response else "I understand. How can I help you?"
+        
         loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
+        return await loop.run_in_executor(
             self.executor,
             self._generate_response_sync,
             user_input,
             intent
         )
-        return response
+    
+    def _messages(self, user_input: str, intent: str) -> list:
+        return [
+            {"role": "system", "content": f"You are a helpful voice assistant. The user's intent is: {intent}."},
+            {"role": "user", "content": user_input}
+        ]
+    
+    async def stream_response(self, user_input: str, intent: str) -> AsyncIterator[str]:
+        """
+        Generate a response and yield text fragments as they are produced
+        """
+        async with self.queue.slot():
+            if self.use_openai:
+                emitted = False
+                try:
+                    async for fragment in self.openai_client.stream(
+                        self._messages(user_input, intent),
+                        max_tokens=150,
+                        temperature=0.7
+                    ):
+                        # Match the stripped output of the non-streaming path
+                        fragment = fragment if emitted else fragment.lstrip()
+                        if fragment:
+                            emitted = True
+                            yield fragment
+                    return
+                except Exception as e:
+                    print(f"Response streaming error: {str(e)}")
+                    if emitted:
+                        return
+                    if not isinstance(e, DeadlineExceeded) or self.local_model is None:
+                        yield self._get_fallback_response(intent, user_input)
+                        return
+            
+            if self.local_engine is not None:
+                async for fragment in self._stream_local(user_input, intent):
+                    yield fragment
+                return
+            
+            async for fragment in self._stream_threaded(user_input, intent):
+                yield fragment
+    
+    async def _stream_threaded(self, user_input: str, intent: str) -> AsyncIterator[str]:
+        """Stream from _stream_response_sync running on the executor"""
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+        done = object()
+        cancelled = threading.Event()
+
+        def emit(fragment):
+            # Abort the generation once nobody consumes it any more
+            if cancelled.is_set() and fragment is not done:
+                raise GenerationCancelled()
+            loop.call_soon_threadsafe(queue.put_nowait, fragment)
+
+        def produce():
+            try:
+                self._stream_response_sync(user_input, intent, emit)
+            finally:
+                emit(done)
+
+        future = loop.run_in_executor(self.executor, produce)
+        try:
+            while True:
+                fragment = await queue.get()
+                if fragment is done:
+                    break
+                yield fragment
+        finally:
+            cancelled.set()
+            try:
+                await future
+            except GenerationCancelled:
+                pass
+    
+    async def _stream_local(self, user_input: str, intent: str) -> AsyncIterator[str]:
+        """Stream from the batched local engine"""
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+        done = object()
+
+        def emit(fragment):
+            loop.call_soon_threadsafe(queue.put_nowait, fragment)
+
+        task = asyncio.ensure_future(self.local_engine.generate(user_input, intent, emit))
+        task.add_done_callback(lambda _: queue.put_nowait(done))
+        emitted = False
+        try:
+            while True:
+                fragment = await queue.get()
+                if fragment is done:
+                    break
+                emitted = True
+                yield fragment
+            await task
+        except Exception as e:
+            print(f"Response streaming error: {str(e)}")
+            if not emitted:
+                yield self._get_fallback_response(intent, user_input)
+            return
+        finally:
+            task.cancel()
+        
+        if not emitted:
+            yield "I understand. How can I help you?"
+    
+    def _stream_response_sync(self, user_input: str, intent: str, emit: Callable[[str], None]):
+        """Synchronous streaming generation, calling emit for each fragment"""
+        emitted = False
+        try:
+            system_prompt = f"You are a helpful voice assistant. The user's intent is: {intent}."
+            
+            if self.local_model and self.tokenizer:
+                prompt = f"{system_prompt}\nUser: {user_input}\nAssistant:"
+                inputs = self.tokenizer.encode(prompt, return_tensors="pt", max_length=512, truncation=True)
+                streamer = _FirstLineStreamer(self.tokenizer, emit)
+                
+                with torch.no_grad():
+                    self.local_model.generate(
+                        inputs,
+                        max_length=inputs.shape[1] + 100,
+                        num_return_sequences=1,
+                        temperature=0.7,
+                        do_sample=True,
+                        pad_token_id=self.tokenizer.eos_token_id,
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([streamer])
+                    )
+                emitted = streamer.emitted
+                if not emitted:
+                    emit("I understand. How can I help you?")
+                    emitted = True
+            
+            else:
+                emit(self._get_fallback_response(intent, user_input))
+                emitted = True
+                
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            print(f"Response streaming error: {str(e)}")
+            if not emitted:
+                emit(self._get_fallback_response(intent, user_input))
     
     def _generate_response_sync(self, user_input: str, intent: str) -> str:
         """Synchronous response generation"""
@@ -71,20 +311,7 @@ class GPTService:
             system_prompt = f"You are a helpful voice assistant. The user's intent is: {intent}."
             prompt = f"{system_prompt}\nUser: {user_input}\nAssistant:"
             
-            if self.use_openai and self.openai_client:
-                # Use OpenAI API
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": f"You are a helpful voice assistant. The user's intent is: {intent}."},
-                        {"role": "user", "content": user_input}
-                    ],
-                    max_tokens=150,
-                    temperature=0.7
-                )
-                return response.choices[0].message.content.strip()
-            
-            elif self.local_model and self.tokenizer:
+            if self.local_model and self.tokenizer:
                 # Use local GPT model
                 inputs = self.tokenizer.encode(prompt, return_tensors="pt", max_length=512, truncation=True)
                 
@@ -130,3 +357,30 @@ class GPTService:
         return responses.get(intent, "I'm here to help. How can I assist you?")
 
 
+class _FirstLineStreamer(TextStreamer, StoppingCriteria):
+    """
+    Streams decoded text of the local model's reply and stops generation at
+    the end of the first line, which is all the non-streaming path keeps.
+    """
+
+    def __init__(self, tokenizer, emit):
+        TextStreamer.__init__(self, tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.emit = emit
+        self.emitted = False
+        self.finished = False
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if self.finished or not text:
+            return
+        if not self.emitted:
+            # Leading whitespace and newlines are stripped before the reply
+            text = text.lstrip()
+        if "\n" in text:
+            text = text.split("\n")[0]
+            self.finished = True
+        if text:
+            self.emit(text)
+            self.emitted = True
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.finished
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+EXAMPLES_FILE = DATA_DIR / "intent_examples.json"
+EVAL_FILE = DATA_DIR / "intent_eval.json"
+INDEX_DIR = Path(os.getenv("INTENT_INDEX_DIR", "models"))
+
+# Keyword rules in priority order: the first intent with a matching keyword wins
+INTENT_KEYWORDS = [
+    ("greeting", ["hello", "hi", "hey", "good morning", "good afternoon"]),
+    ("question", ["what", "how", "why", "when", "where", "who", "?"]),
+    ("command", ["play", "stop", "open", "close", "turn on", "turn off", "set"]),
+    ("information", ["tell me", "explain", "describe", "information"]),
+    ("goodbye", ["bye", "goodbye", "see you", "farewell"]),
+]
+
+DEFAULT_INTENT = "conversation"
+
+
+class KeywordIntentMatcher:
+    """
+    Zero-model intent matcher.
+
+    All keyword lists are compiled into one regex that is scanned once over
+    the text. Keywords match as substrings, exactly like the original
+    `any(word in text_lower ...)` rules, and intent priority is preserved.
+    """
+
+    def __init__(self, rules=INTENT_KEYWORDS):
+        self.intents = [intent for intent, _ in rules]
+        self._priority = {intent: i for i, intent in enumerate(self.intents)}
+        # A zero-width lookahead tries every start position, so overlapping
+        # keywords are all seen; at each position the highest priority intent
+        # is tried first.
+        alternatives = "|".join(
+            f"(?P<{intent}>{'|'.join(re.escape(word) for word in words)})"
+            for intent, words in rules
+        )
+        self._pattern = re.compile(f"(?=(?:{alternatives}))")
+
+    def match(self, text: str):
+        """Return the matched intent, or None when no keyword is present"""
+        best = None
+        for m in self._pattern.finditer(text.lower()):
+            intent = m.lastgroup
+            if best is None or self._priority[intent] < self._priority[best]:
+                best = intent
+                if self._priority[best] == 0:
+                    break
+        return best
+
+
+class CentroidIntentClassifier:
+    """Nearest-centroid intent classifier over sentence embeddings"""
+
+    def __init__(self, intents, centroids: np.ndarray):
+        self.intents = list(intents)
+        self.centroids = _normalize(centroids.astype(np.float32))
+
+    @classmethod
+    def from_examples(cls, embed_fn, examples: dict):
+        """Build centroids by embedding example utterances with embed_fn"""
+        intents = list(examples.keys())
+        centroids = np.stack([embed_fn(examples[intent]).mean(axis=0) for intent in intents])
+        return cls(intents, centroids)
+
+    def classify(self, embeddings: np.ndarray) -> list:
+        """Return the nearest intent for each row of embeddings"""
+        # Rows and centroids are unit length, so one matmul gives the cosine
+        # similarity of every query against every intent
+        scores = _normalize(embeddings.astype(np.float32)) @ self.centroids.T
+        return [self.intents[i] for i in scores.argmax(axis=1)]
+
+    def save(self, path, fingerprint: str):
+        """Store the centroid matrix on disk"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(tmp_path, centroids=self.centroids, intents=np.array(self.intents), fingerprint=fingerprint)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, fingerprint: str):
+        """Load a stored index, or return None if missing or out of date"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            if str(data["fingerprint"]) != fingerprint:
+                return None
+            return cls([str(intent) for intent in data["intents"]], data["centroids"])
+
+
+def index_path(model_name: str) -> Path:
+    """Location of the precomputed centroid index for a model"""
+    safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", model_name)
+    return INDEX_DIR / f"intent_centroids-{safe_name}.npz"
+
+
+def examples_fingerprint(model_name: str, examples: dict) -> str:
+    """Identifies the model and example set an index was built from"""
+    payload = json.dumps({"model": model_name, "examples": examples}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_or_build_index(model_name: str, embed_fn, examples=None):
+    """
+    Load the precomputed centroid index for model_name, building and saving
+    it from the example utterances if it is missing or stale.
+    """
+    examples = examples if examples is not None else load_examples()
+    fingerprint = examples_fingerprint(model_name, examples)
+    path = index_path(model_name)
+
+    classifier = CentroidIntentClassifier.load(path, fingerprint)
+    if classifier is not None:
+        print(f"Loaded intent index from {path}")
+        return classifier
+
+    print(f"Building intent index for {model_name}")
+    classifier = CentroidIntentClassifier.from_examples(embed_fn, examples)
+    try:
+        classifier.save(path, fingerprint)
+    except OSError as e:
+        print(f"Could not save intent index to {path}: {e}")
+    return classifier
+
+
+def load_examples(path=EXAMPLES_FILE) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def load_eval_set(path=EVAL_FILE) -> list:
+    """Labelled (text, intent) pairs for measuring classifier accuracy"""
+    with open(path, "r") as f:
+        return [(item["text"], item["intent"]) for item in json.load(f)]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
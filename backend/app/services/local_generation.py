@@ -0,0 +1,181 @@
+import asyncio
+import threading
+
+import torch
+
+from app.services.batching import MicroBatcher
+
+try:
+    from transformers import DynamicCache
+except ImportError:  # Older transformers only understand tuple caches
+    DynamicCache = None
+
+# Every prompt starts with this text, so its key/values are computed once
+PROMPT_PREFIX = "You are a helpful voice assistant. The user's intent is:"
+
+
+def build_prompt_suffix(user_input: str, intent: str) -> str:
+    """The part of the prompt that follows PROMPT_PREFIX"""
+    return f" {intent}.\nUser: {user_input}\nAssistant:"
+
+
+class LocalGenerationEngine:
+    """
+    Batched sampling for the local causal LM.
+
+    The key/value cache of the shared prompt prefix is computed once and
+    reused by every request. Concurrent requests are collected by a
+    MicroBatcher and decoded together in one padded batch; each row stops at
+    end-of-text or at the end of the first line of the reply.
+    """
+
+    def __init__(self, model, tokenizer, executor, max_batch_size: int = 8, max_wait_ms: float = 10,
+                 max_new_tokens: int = 100, temperature: float = 0.7, top_k: int = 50, max_prompt_tokens: int = 512):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_k = top_k
+        self.eos_token_id = tokenizer.eos_token_id
+
+        self.prefix_ids = tokenizer.encode(PROMPT_PREFIX)
+        self.max_suffix_tokens = max(1, max_prompt_tokens - len(self.prefix_ids))
+        with torch.no_grad():
+            outputs = self.model(torch.tensor([self.prefix_ids]), use_cache=True)
+        self.prefix_past = _to_legacy(outputs.past_key_values)
+
+        self.batcher = MicroBatcher(
+            self._generate_batch_sync,
+            executor,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms
+        )
+
+    async def generate(self, user_input: str, intent: str, emit=None) -> str:
+        """
+        Generate the first line of the assistant's reply. If emit is given it
+        is called (from the executor thread) with each new text fragment.
+        """
+        cancelled = threading.Event()
+        try:
+            return await self.batcher.submit((build_prompt_suffix(user_input, intent), emit, cancelled))
+        except asyncio.CancelledError:
+            # Stop decoding this row if its batch is already running
+            cancelled.set()
+            raise
+
+    def warmup(self):
+        """Decode a few tokens of a two-request batch (blocking)"""
+        suffix = build_prompt_suffix("Hello", "greeting")
+        self._generate_batch_sync([(suffix, None, None), (suffix, None, None)], max_new_tokens=4)
+
+    def _generate_batch_sync(self, items: list, max_new_tokens: int = None) -> list:
+        """Decode a batch of (prompt suffix, emit, cancelled event) requests together"""
+        suffixes = [self.tokenizer.encode(suffix)[-self.max_suffix_tokens:] for suffix, _, _ in items]
+        emitters = [emit for _, emit, _ in items]
+        cancel_events = [cancelled for _, _, cancelled in items]
+        batch_size = len(items)
+        prefix_len = len(self.prefix_ids)
+        suffix_len = max(len(ids) for ids in suffixes)
+
+        # Layout per row: [shared prefix][padding][suffix]. Padding sits
+        # between prefix and suffix so every row's last token is aligned.
+        input_ids = torch.full((batch_size, suffix_len), self.eos_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((batch_size, prefix_len + suffix_len), dtype=torch.long)
+        attention_mask[:, :prefix_len] = 1
+        position_ids = torch.ones((batch_size, suffix_len), dtype=torch.long)
+        for row, ids in enumerate(suffixes):
+            pad = suffix_len - len(ids)
+            input_ids[row, pad:] = torch.tensor(ids)
+            attention_mask[row, prefix_len + pad:] = 1
+            position_ids[row, pad:] = torch.arange(prefix_len, prefix_len + len(ids))
+
+        past = self._expand_prefix(batch_size)
+        generated = [[] for _ in range(batch_size)]
+        emitted_text = [""] * batch_size
+        finished = torch.zeros(batch_size, dtype=torch.bool)
+        next_positions = position_ids[:, -1] + 1
+
+        with torch.no_grad():
+            for _ in range(max_new_tokens or self.max_new_tokens):
+                outputs = self.model(
+                    input_ids=input_ids,
+                    past_key_values=past,
+                    attention_mask=attention_mask,
+                    position_ids=position_ids,
+                    use_cache=True
+                )
+                past = outputs.past_key_values
+                next_tokens = self._sample(outputs.logits[:, -1, :])
+
+                for row in range(batch_size):
+                    if finished[row]:
+                        continue
+                    if cancel_events[row] is not None and cancel_events[row].is_set():
+                        finished[row] = True
+                        continue
+                    token = int(next_tokens[row])
+                    if token == self.eos_token_id:
+                        finished[row] = True
+                        continue
+                    generated[row].append(token)
+
+                    # Leading whitespace is skipped, like the strip() in the
+                    # non-batched path; the next newline ends the reply
+                    full_text = self._decode(generated[row])
+                    if "\n" in full_text:
+                        finished[row] = True
+                    text = full_text.split("\n")[0]
+                    if not finished[row]:
+                        # Hold back an incomplete multi-byte character
+                        text = text.rstrip("\ufffd")
+                    if emitters[row] is not None and len(text) > len(emitted_text[row]):
+                        emitters[row](text[len(emitted_text[row]):])
+                        emitted_text[row] = text
+
+                if bool(finished.all()):
+                    break
+
+                next_tokens = next_tokens.masked_fill(finished, self.eos_token_id)
+                input_ids = next_tokens.unsqueeze(-1)
+                attention_mask = torch.cat(
+                    [attention_mask, torch.ones((batch_size, 1), dtype=torch.long)], dim=1
+                )
+                position_ids = next_positions.unsqueeze(-1)
+                next_positions = next_positions + 1
+
+        return [self._decode(tokens).split("\n")[0].strip() for tokens in generated]
+
+    def _decode(self, tokens: list) -> str:
+        return self.tokenizer.decode(tokens, skip_special_tokens=True).lstrip()
+
+    def _sample(self, logits: torch.Tensor) -> torch.Tensor:
+        """Temperature and top-k sampling, matching generate()'s defaults"""
+        logits = logits / self.temperature
+        if self.top_k:
+            top_values, _ = torch.topk(logits, min(self.top_k, logits.shape[-1]))
+            logits = logits.masked_fill(logits < top_values[:, -1:], float("-inf"))
+        probs = torch.softmax(logits, dim=-1)
+        return torch.multinomial(probs, num_samples=1).squeeze(-1)
+
+    def _expand_prefix(self, batch_size: int):
+        """The cached prefix key/values broadcast to the batch"""
+        legacy = tuple(
+            (key.expand(batch_size, -1, -1, -1), value.expand(batch_size, -1, -1, -1))
+            for key, value in self.prefix_past
+        )
+        if DynamicCache is None:
+            return legacy
+        cache = DynamicCache()
+        for layer_idx, (key, value) in enumerate(legacy):
+            cache.update(key, value, layer_idx)
+        return cache
+
+
+def _to_legacy(past):
+    """Normalize a model's cache to a tuple of (key, value) per layer"""
+    if hasattr(past, "layers"):
+        return tuple((layer.keys, layer.values) for layer in past.layers)
+    if hasattr(past, "to_legacy_cache"):
+        return past.to_legacy_cache()
+    return tuple((layer[0], layer[1]) for layer in past)
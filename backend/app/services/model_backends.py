@@ -0,0 +1,106 @@
+"""
+Inference backends for the CPU models, selected per service by environment
+variable (WHISPER_BACKEND, BERT_BACKEND, GPT_BACKEND):
+
+  - "torch": the fp32 PyTorch model as loaded
+  - "int8": torch dynamic quantization; Linear layers (and GPT-2's Conv1D
+    projections) get int8 weights and quantize activations on the fly
+  - "onnx": export to ONNX Runtime through the optional `optimum[onnxruntime]`
+    package; exported models are kept in ONNX_CACHE_DIR for later starts
+"""
+import os
+import re
+from pathlib import Path
+
+import torch
+
+BACKENDS = ("torch", "int8", "onnx")
+
+ONNX_CACHE_DIR = Path(os.getenv("ONNX_CACHE_DIR", "models/onnx"))
+
+
+def backend_from_env(variable: str, supported=BACKENDS) -> str:
+    """Read a backend choice, falling back to torch for unsupported values"""
+    backend = os.getenv(variable, "torch").strip().lower()
+    if backend not in supported:
+        print(f"Warning: {variable}={backend} is not supported (choose from {', '.join(supported)}); using torch")
+        return "torch"
+    return backend
+
+
+def quantize_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """Dynamic int8 quantization of every Linear-like layer"""
+    _replace_with_plain_linear(model)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_encoder(model_name: str, backend: str = "torch"):
+    """A BERT-style encoder whose outputs have last_hidden_state"""
+    if backend == "onnx":
+        from_pretrained = _onnx_model_class("ORTModelForFeatureExtraction").from_pretrained
+        return _load_onnx(from_pretrained, model_name, "feature-extraction")
+
+    from transformers import AutoModel
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+    return quantize_int8(model) if backend == "int8" else model
+
+
+def load_causal_lm(model_name: str, backend: str = "torch"):
+    """A causal language model supporting generate()"""
+    if backend == "onnx":
+        from_pretrained = _onnx_model_class("ORTModelForCausalLM").from_pretrained
+        return _load_onnx(from_pretrained, model_name, "text-generation-with-past")
+
+    from transformers import AutoModelForCausalLM
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    model.eval()
+    return quantize_int8(model) if backend == "int8" else model
+
+
+def _onnx_model_class(name: str):
+    try:
+        import optimum.onnxruntime
+    except ImportError:
+        raise Exception(
+            "The onnx backend needs ONNX Runtime support from optimum. "
+            "Please install it using: pip install optimum[onnxruntime]"
+        )
+    return getattr(optimum.onnxruntime, name)
+
+
+def _load_onnx(from_pretrained, model_name: str, task: str):
+    """Load an exported model, exporting and saving it on first use"""
+    export_dir = ONNX_CACHE_DIR / f"{re.sub(r'[^A-Za-z0-9._-]', '_', model_name)}-{task}"
+    if (export_dir / "config.json").exists():
+        return from_pretrained(str(export_dir))
+
+    print(f"Exporting {model_name} to ONNX ({task}), this happens once")
+    model = from_pretrained(model_name, export=True)
+    try:
+        model.save_pretrained(str(export_dir))
+    except OSError as e:
+        print(f"Could not save ONNX model to {export_dir}: {e}")
+    return model
+
+
+def _replace_with_plain_linear(module: torch.nn.Module):
+    """
+    quantize_dynamic only swaps modules whose type is exactly nn.Linear, so
+    convert Linear subclasses (Whisper's fp16-casting Linear) and GPT-2's
+    Conv1D (a Linear with transposed weights) to nn.Linear first.
+    """
+    for name, child in module.named_children():
+        if type(child) is not torch.nn.Linear and isinstance(child, torch.nn.Linear):
+            linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            linear.weight = child.weight
+            linear.bias = child.bias
+            setattr(module, name, linear)
+        elif type(child).__name__ == "Conv1D" and hasattr(child, "nf"):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous())
+            linear.bias = child.bias
+            setattr(module, name, linear)
+        else:
+            _replace_with_plain_linear(child)
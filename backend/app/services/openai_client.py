@@ -0,0 +1,196 @@
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import httpx
+import openai
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from app.metrics import Counter, Gauge
+
+load_dotenv()
+
+OPENAI_REQUESTS = Counter(
+    "voice_assistant_openai_requests_total",
+    "OpenAI API attempts by outcome (ok, retry, error, deadline)",
+    ["outcome"]
+)
+OPENAI_IN_FLIGHT = Gauge(
+    "voice_assistant_openai_in_flight",
+    "OpenAI API requests currently in flight"
+)
+
+
+class DeadlineExceeded(Exception):
+    """No reply from the OpenAI API before the request's deadline"""
+
+
+class OpenAIChat:
+    """
+    Chat completions over AsyncOpenAI. Every request shares one pooled
+    HTTP/1.1 connection pool, at most max_in_flight run at once (the rest
+    wait for a slot), each attempt has a timeout and rate limits (429),
+    server errors (5xx) and connection failures are retried with full
+    jitter exponential backoff until the overall deadline.
+    """
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
+        self.model = os.getenv("GPT_MODEL", "gpt-3.5-turbo")
+        self.max_in_flight = int(os.getenv("OPENAI_MAX_IN_FLIGHT", 16))
+        self.timeout = float(os.getenv("OPENAI_TIMEOUT_S", 10))
+        self.max_retries = int(os.getenv("OPENAI_MAX_RETRIES", 3))
+        self.backoff_base = float(os.getenv("OPENAI_BACKOFF_BASE_S", 0.25))
+        self.backoff_max = float(os.getenv("OPENAI_BACKOFF_MAX_S", 4))
+        self.deadline = float(os.getenv("OPENAI_DEADLINE_S", 15))
+
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_in_flight,
+                max_keepalive_connections=self.max_in_flight
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5))
+        )
+        # Retries are done here, with jitter and within the deadline
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+            http_client=self.http_client,
+            max_retries=0,
+            timeout=self.timeout
+        )
+        self._semaphore = None
+        self.in_flight = 0
+
+    async def complete(self, messages: List[dict], **kwargs) -> str:
+        """The reply text; raises DeadlineExceeded or the last API error"""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                async with self._slot():
+                    response = await self._create(messages, False, kwargs, deadline)
+                OPENAI_REQUESTS.inc(outcome="ok")
+                return response.choices[0].message.content.strip()
+            except Exception as e:
+                attempt += 1
+                await self._before_retry(attempt, e, deadline)
+
+    async def stream(self, messages: List[dict], **kwargs) -> AsyncIterator[str]:
+        """
+        Yield reply fragments as they arrive. Failures before the first
+        fragment are retried; after it the error is raised, since the
+        fragments already yielded can't be taken back.
+        """
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            emitted = False
+            try:
+                async with self._slot():
+                    stream = await self._create(messages, True, kwargs, deadline)
+                    try:
+                        chunks = stream.__aiter__()
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), self._remaining(deadline))
+                            except StopAsyncIteration:
+                                break
+                            except asyncio.TimeoutError:
+                                raise DeadlineExceeded(f"No complete reply within {self.deadline}s")
+                            if not chunk.choices:
+                                continue
+                            fragment = chunk.choices[0].delta.content
+                            if fragment:
+                                emitted = True
+                                yield fragment
+                    finally:
+                        await stream.close()
+                OPENAI_REQUESTS.inc(outcome="ok")
+                return
+            except Exception as e:
+                if emitted:
+                    OPENAI_REQUESTS.inc(outcome="deadline" if isinstance(e, DeadlineExceeded) else "error")
+                    raise
+                attempt += 1
+                await self._before_retry(attempt, e, deadline)
+
+    @asynccontextmanager
+    async def _slot(self):
+        """One of the max_in_flight concurrent requests"""
+        # Created on first use so it belongs to the serving event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        async with self._semaphore:
+            self.in_flight += 1
+            OPENAI_IN_FLIGHT.set(self.in_flight)
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+                OPENAI_IN_FLIGHT.set(self.in_flight)
+
+    async def _create(self, messages: List[dict], stream: bool, kwargs: dict, deadline: float):
+        remaining = self._remaining(deadline)
+        try:
+            return await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    stream=stream,
+                    timeout=min(self.timeout, remaining),
+                    **kwargs
+                ),
+                remaining
+            )
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"No reply within {self.deadline}s")
+
+    def _remaining(self, deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"No reply within {self.deadline}s")
+        return remaining
+
+    async def _before_retry(self, attempt: int, error: Exception, deadline: float):
+        """Wait before attempt number `attempt`, or re-raise the error if it should not be retried"""
+        if isinstance(error, DeadlineExceeded):
+            OPENAI_REQUESTS.inc(outcome="deadline")
+            raise error
+        if not _retryable(error) or attempt > self.max_retries:
+            OPENAI_REQUESTS.inc(outcome="error")
+            raise error
+        delay = self._backoff(attempt, error)
+        if time.monotonic() + delay >= deadline:
+            OPENAI_REQUESTS.inc(outcome="deadline")
+            raise DeadlineExceeded(f"No reply within {self.deadline}s (last error: {error})")
+        OPENAI_REQUESTS.inc(outcome="retry")
+        await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full jitter, or the server's Retry-After when it sends one"""
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                return min(self.backoff_max, float(response.headers.get("retry-after", "")))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "max_in_flight": self.max_in_flight}
+
+    async def close(self):
+        await self.http_client.aclose()
+
+
+def _retryable(error: Exception) -> bool:
+    """Rate limits, server errors and network failures are worth retrying"""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
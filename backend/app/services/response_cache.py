@@ -0,0 +1,58 @@
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from app.cache import store_call, store_from_env
+
+load_dotenv()
+
+
+def normalize_text(text: str) -> str:
+    """
+    The text as the keyword rules see it (lower case), without surrounding
+    whitespace: "Hello " and "hello" match. Punctuation and inner spacing
+    are kept, since the rules match substrings ("turn on", "?") and would
+    classify "turn-on the light" and "turn on the light" differently.
+    """
+    return text.strip().lower()
+
+
+class ResponseCache:
+    """
+    Cache of the text pipeline's intents (keyed by normalized text) and
+    replies (keyed by normalized text, intent and the generating model).
+    Off unless RESPONSE_CACHE_ENABLED=true; RESPONSE_CACHE_BACKEND=sqlite
+    shares it between worker processes.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+        self.store = store_from_env("response", "RESPONSE_CACHE", "cache/responses.db") if self.enabled else None
+
+    async def get_intent(self, text: str) -> Optional[str]:
+        key = normalize_text(text)
+        if not self.enabled or not key:
+            return None
+        return await store_call(self.store, "get", "intent", key)
+
+    async def set_intent(self, text: str, intent: str):
+        key = normalize_text(text)
+        if self.enabled and key:
+            await store_call(self.store, "set", "intent", key, intent)
+
+    async def get_reply(self, text: str, intent: str, model: str) -> Optional[str]:
+        key = normalize_text(text)
+        if not self.enabled or not key:
+            return None
+        return await store_call(self.store, "get", "reply", f"{model}\0{intent}\0{key}")
+
+    async def set_reply(self, text: str, intent: str, model: str, reply: str):
+        key = normalize_text(text)
+        if self.enabled and key and reply:
+            await store_call(self.store, "set", "reply", f"{model}\0{intent}\0{key}", reply)
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        return {"enabled": True, **self.store.stats()}
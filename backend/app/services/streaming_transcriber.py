@@ -0,0 +1,210 @@
+import os
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+from app.services.audio_decoder import SAMPLE_RATE, decode_pcm16
+
+load_dotenv()
+
+
+# EBML IDs of a WebM Cluster and of its Timecode child
+WEBM_CLUSTER_ID = b"\x1f\x43\xb6\x75"
+WEBM_TIMECODE_ID = 0xE7
+
+
+class StreamTooLong(Exception):
+    """The session went over WHISPER_STREAM_MAX_S or WHISPER_STREAM_MAX_MB"""
+
+
+def _read_vint(data, pos: int):
+    """(value, position after it) of an EBML variable-length integer, or None if incomplete"""
+    if pos >= len(data):
+        return None
+    first = data[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        return (-1, pos + 1)
+    if pos + length > len(data):
+        return None
+    value = first & (mask - 1)
+    for byte in data[pos + 1:pos + length]:
+        value = (value << 8) | byte
+    return value, pos + length
+
+
+def _cluster_timecode(data, pos: int):
+    """
+    The Timecode of the Cluster whose size starts at pos: None if the data
+    is incomplete, -1 if it is not a Cluster after all
+    """
+    size = _read_vint(data, pos)
+    if size is None or size[1] >= len(data):
+        return None
+    pos = size[1]
+    if data[pos] != WEBM_TIMECODE_ID:
+        return -1
+    length = _read_vint(data, pos + 1)
+    if length is None:
+        return None
+    length, pos = length
+    if not 1 <= length <= 8:
+        return -1
+    if pos + length > len(data):
+        return None
+    return int.from_bytes(data[pos:pos + length], "big")
+
+
+class StreamingTranscriber:
+    """
+    Buffers audio received in chunks for one streaming session and decides
+    when to emit partial transcripts and when speech has ended.
+
+    Supported formats:
+      - "pcm16": raw little-endian 16-bit mono PCM at 16 kHz, decoded
+        incrementally as chunks arrive
+      - "webm": MediaRecorder WebM/Opus chunks; the container is only
+        decodable as a whole, so the accumulated bytes are decoded with
+        the supplied decode function when audio is needed
+    """
+
+    def __init__(self, audio_format: str = "pcm16"):
+        if audio_format not in ("pcm16", "webm"):
+            raise ValueError(f"Unsupported stream format: {audio_format}")
+        self.audio_format = audio_format
+        self.window_seconds = float(os.getenv("WHISPER_STREAM_WINDOW_S", 10))
+        self.partial_interval = float(os.getenv("WHISPER_STREAM_INTERVAL_S", 1.0))
+        self.silence_ms = float(os.getenv("WHISPER_STREAM_SILENCE_MS", 800))
+        self.silence_threshold = float(os.getenv("WHISPER_STREAM_SILENCE_RMS", 0.01))
+        # The whole utterance is buffered (and transcribed at the end), so
+        # sessions are bounded in duration and in bytes received
+        self.max_seconds = float(os.getenv("WHISPER_STREAM_MAX_S", 120))
+        self.max_bytes = int(float(os.getenv("WHISPER_STREAM_MAX_MB", 8)) * 1024 * 1024)
+        self.received_bytes = 0
+
+        self._pcm_chunks = []
+        self._pcm_samples = 0
+        self._pending_byte = b""
+        self._encoded = bytearray()
+        self._decoded = None
+        self._webm_scan = 0
+        self._webm_seconds = 0.0
+        self._samples_at_last_partial = 0
+        self._last_partial_time = time.monotonic()
+        self._heard_speech = False
+        self._trailing_silence = 0
+
+    @property
+    def duration(self) -> float:
+        """
+        Seconds of audio received so far; for webm the start of the last
+        Cluster (a lower bound, exact once the audio is decoded)
+        """
+        if self.audio_format == "webm":
+            if self._decoded is not None:
+                return len(self._decoded) / SAMPLE_RATE
+            return self._webm_seconds
+        return self._pcm_samples / SAMPLE_RATE
+
+    def _check_duration(self, seconds: float):
+        if self.max_seconds > 0 and seconds > self.max_seconds:
+            raise StreamTooLong(f"Stream is longer than the {self.max_seconds:g} second limit")
+
+    def _track_webm_duration(self):
+        """
+        Read the timecodes of Clusters received since the last call. WebM
+        can only be decoded whole, but MediaRecorder starts a Cluster every
+        few seconds with its start time (in ms, the default TimecodeScale),
+        which bounds the duration without decoding.
+        """
+        data = self._encoded
+        while True:
+            start = data.find(WEBM_CLUSTER_ID, self._webm_scan)
+            if start < 0:
+                # An ID may be split across chunks
+                self._webm_scan = max(self._webm_scan, len(data) - len(WEBM_CLUSTER_ID) + 1)
+                return
+            timecode = _cluster_timecode(data, start + len(WEBM_CLUSTER_ID))
+            if timecode is None:
+                self._webm_scan = start
+                return
+            if timecode >= 0:
+                self._webm_seconds = max(self._webm_seconds, timecode / 1000)
+            self._webm_scan = start + len(WEBM_CLUSTER_ID)
+
+    def add_chunk(self, data: bytes):
+        """Buffer a chunk; raises StreamTooLong once the session is over its limits"""
+        self.received_bytes += len(data)
+        if self.max_bytes > 0 and self.received_bytes > self.max_bytes:
+            raise StreamTooLong(f"Stream is longer than the {self.max_bytes // (1024 * 1024)} MB limit")
+
+        if self.audio_format == "webm":
+            self._encoded.extend(data)
+            self._decoded = None
+            self._track_webm_duration()
+            self._check_duration(self._webm_seconds)
+            return
+
+        data = self._pending_byte + data
+        usable = len(data) - (len(data) % 2)
+        self._pending_byte = data[usable:]
+        if not usable:
+            return
+
+        samples = decode_pcm16(data[:usable])
+        self._check_duration((self._pcm_samples + len(samples)) / SAMPLE_RATE)
+        self._pcm_chunks.append(samples)
+        self._pcm_samples += len(samples)
+        self._track_silence(samples)
+
+    def _track_silence(self, samples: np.ndarray):
+        """Update the end-of-speech detector with newly received samples"""
+        frame = int(SAMPLE_RATE * 0.03)
+        for start in range(0, len(samples), frame):
+            chunk = samples[start:start + frame]
+            rms = float(np.sqrt(np.mean(chunk ** 2))) if len(chunk) else 0.0
+            if rms >= self.silence_threshold:
+                self._heard_speech = True
+                self._trailing_silence = 0
+            else:
+                self._trailing_silence += len(chunk)
+
+    def speech_ended(self) -> bool:
+        """True once speech was heard and followed by enough silence"""
+        if self.audio_format != "pcm16" or self.silence_ms <= 0:
+            return False
+        return self._heard_speech and self._trailing_silence * 1000 / SAMPLE_RATE >= self.silence_ms
+
+    def partial_due(self) -> bool:
+        """True when enough new audio arrived since the last partial"""
+        if self.audio_format == "webm":
+            # Re-decoding the container is costly, so pace partials by wall time
+            elapsed = time.monotonic() - self._last_partial_time
+            return len(self._encoded) > 0 and self._decoded is None and elapsed >= self.partial_interval
+        new_samples = self._pcm_samples - self._samples_at_last_partial
+        return new_samples >= self.partial_interval * SAMPLE_RATE
+
+    async def audio(self, decode_fn=None) -> np.ndarray:
+        """The whole utterance as 16 kHz float32 samples"""
+        if self.audio_format == "webm":
+            if self._decoded is None:
+                self._decoded = await decode_fn(bytes(self._encoded)) if self._encoded else np.zeros(0, np.float32)
+                # The last Cluster may run for a few seconds past its timecode
+                self._check_duration(len(self._decoded) / SAMPLE_RATE)
+            return self._decoded
+        if not self._pcm_chunks:
+            return np.zeros(0, dtype=np.float32)
+        if len(self._pcm_chunks) > 1:
+            self._pcm_chunks = [np.concatenate(self._pcm_chunks)]
+        return self._pcm_chunks[0]
+
+    async def window(self, decode_fn=None) -> np.ndarray:
+        """The most recent window_seconds of audio, for partial transcripts"""
+        samples = await self.audio(decode_fn)
+        self._samples_at_last_partial = self._pcm_samples
+        self._last_partial_time = time.monotonic()
+        return samples[-int(self.window_seconds * SAMPLE_RATE):]
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.cache import CACHE_REQUESTS, store_call, store_from_env
+
+load_dotenv()
+
+
+def audio_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class TranscriptCache:
+    """
+    Transcripts keyed by the SHA-256 of the uploaded audio bytes, the
+    Whisper model (and backend) and the language, so a retried upload or a
+    canned clip is answered without decoding or running the model.
+    On unless TRANSCRIPT_CACHE_ENABLED=false; TRANSCRIPT_CACHE_BACKEND=sqlite
+    shares it between worker processes and keeps it across restarts.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("TRANSCRIPT_CACHE_ENABLED", "true").lower() == "true"
+        self.store = store_from_env("transcript", "TRANSCRIPT_CACHE", "cache/transcripts.db") if self.enabled else None
+
+    @staticmethod
+    def key(data: bytes, model: str, language: str) -> str:
+        return f"{model}\0{language}\0{audio_digest(data)}"
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        return await store_call(self.store, "get", "transcript", key)
+
+    async def set(self, key: str, text: str):
+        if self.enabled and text:
+            await store_call(self.store, "set", "transcript", key, text)
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        return {"enabled": True, **self.store.stats()}
+
+
+class MelCache:
+    """
+    Log-mel spectrograms of speech segments, keyed by the samples and the
+    number of mel bands, in an in-process LRU bounded by bytes (0 = off).
+    Computing one is a few milliseconds per 30 s window; it pays off for
+    repeated segments when the transcript cache does not apply (another
+    model, or the same clip inside different uploads).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(segment: np.ndarray, n_mels: int) -> str:
+        return f"{n_mels}\0{hashlib.sha256(np.ascontiguousarray(segment).tobytes()).hexdigest()}"
+
+    def get(self, key: str):
+        with self._lock:
+            mel = self._entries.get(key)
+            if mel is not None:
+                self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc(cache="mel", namespace="mel", result="hit" if mel is not None else "miss")
+        return mel
+
+    def set(self, key: str, mel):
+        size = mel.element_size() * mel.nelement()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = mel
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.element_size() * evicted.nelement()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "mb": round(self.size / 1e6, 1), "max_mb": round(self.max_bytes / 1e6, 1)}
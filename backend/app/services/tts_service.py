@@ -1,47 +1,613 @@
 from gtts import gTTS
 import os
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import hashlib
+import io
+import re
+import shutil
+import struct
+import subprocess
+import threading
+import time
 import uuid
+import wave
+from typing import AsyncIterator, List
+
+from app.metrics import InstrumentedExecutor
+from app.scheduler import Overloaded, StageQueue
+from app.services.audio_store import AudioBuffer, AudioStore
+
+
+class TTSBackend(ABC):
+    """A speech synthesizer returning the encoded audio of a text"""
+
+    name = ""
+    extension = ""
+    media_type = ""
+
+    @abstractmethod
+    def synthesize(self, text: str, language: str, slow: bool) -> bytes:
+        """Return the encoded audio of the text"""
+
+    def synthesize_to(self, text: str, language: str, slow: bool, fp):
+        """Write the audio to a file-like object, as it is produced if the backend can"""
+        fp.write(self.synthesize(text, language, slow))
+
+
+class GTTSBackend(TTSBackend):
+    """Google Translate's TTS over HTTP (needs network access); MP3"""
+
+    name = "gtts"
+    extension = "mp3"
+    media_type = "audio/mpeg"
+
+    def synthesize(self, text: str, language: str, slow: bool) -> bytes:
+        buffer = io.BytesIO()
+        self.synthesize_to(text, language, slow, buffer)
+        return buffer.getvalue()
+
+    def synthesize_to(self, text: str, language: str, slow: bool, fp):
+        # gTTS writes each part of a long text as soon as it is downloaded
+        gTTS(text=text, lang=language, slow=slow).write_to_fp(fp)
+
+
+class EspeakBackend(TTSBackend):
+    """
+    Local formant synthesis with espeak-ng (or espeak): no network, a few
+    milliseconds per sentence on one core, robotic voice; WAV
+    """
+
+    name = "espeak"
+    extension = "wav"
+    media_type = "audio/wav"
+
+    def __init__(self):
+        self.binary = shutil.which(os.getenv("TTS_ESPEAK_BINARY", "espeak-ng")) or shutil.which("espeak")
+        if self.binary is None:
+            raise Exception(
+                "espeak-ng is not installed. Please install it using: "
+                "brew install espeak-ng (macOS) or apt-get install espeak-ng (Linux)"
+            )
+        self.voice = os.getenv("TTS_ESPEAK_VOICE", "")
+        self.words_per_minute = int(os.getenv("TTS_ESPEAK_WPM", 165))
+
+    def synthesize(self, text: str, language: str, slow: bool) -> bytes:
+        words_per_minute = self.words_per_minute * 3 // 4 if slow else self.words_per_minute
+        result = subprocess.run(
+            [self.binary, "--stdout", "-v", self.voice or language, "-s", str(words_per_minute), "--stdin"],
+            input=text.encode("utf-8"),
+            capture_output=True,
+            timeout=30
+        )
+        if result.returncode != 0 or not result.stdout:
+            raise Exception(f"espeak failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+        # Written to a pipe, the RIFF and data sizes are placeholders
+        return build_wav(*parse_wav(result.stdout))
+
+
+TTS_BACKENDS = {"gtts": GTTSBackend, "espeak": EspeakBackend}
+
+
+def tts_backend_from_env() -> TTSBackend:
+    """The TTS_BACKEND synthesizer, falling back to gTTS if it is unavailable"""
+    name = os.getenv("TTS_BACKEND", "gtts").strip().lower()
+    if name not in TTS_BACKENDS:
+        print(f"Warning: TTS_BACKEND={name} is not supported (choose from {', '.join(TTS_BACKENDS)}); using gtts")
+        name = "gtts"
+    try:
+        return TTS_BACKENDS[name]()
+    except Exception as e:
+        print(f"Warning: TTS backend {name} is unavailable, using gtts: {e}")
+        return GTTSBackend()
+
+
+def parse_wav(data: bytes):
+    """
+    ((channels, sample width, rate), PCM frames) of a PCM WAV file. The
+    data chunk may claim any size; it runs to the end of the file.
+    """
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise Exception("Not a WAV file")
+    params = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id, size = struct.unpack("<4sI", data[offset:offset + 8])
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            _, channels, rate, _, _, bits = struct.unpack("<HHIIHH", data[body:body + 16])
+            params = (channels, bits // 8, rate)
+        elif chunk_id == b"data":
+            if params is None:
+                raise Exception("WAV data before its format")
+            frames = data[body:min(len(data), body + size)]
+            frame_size = params[0] * params[1]
+            return params, frames[:len(frames) - len(frames) % frame_size]
+        offset = body + size + (size & 1)
+    raise Exception("WAV file without audio data")
+
+
+def wav_header(params, data_size: int) -> bytes:
+    """The 44 byte header of a PCM WAV file with data_size bytes of frames"""
+    channels, sample_width, rate = params
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", min(36 + data_size, 0xFFFFFFFF), b"WAVE",
+        b"fmt ", 16, 1, channels, rate, rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b"data", min(data_size, 0xFFFFFFFF - 36)
+    )
+
+
+def build_wav(params, frames: bytes) -> bytes:
+    channels, sample_width, rate = params
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(sample_width)
+        f.setframerate(rate)
+        f.writeframes(frames)
+    return buffer.getvalue()
+
 
 class TTSService:
     def __init__(self):
         self.audio_dir = "generated_audio"
-        self.executor = ThreadPoolExecutor(max_workers=2)
+        # Synthesizer chosen by TTS_BACKEND: gtts (network) or espeak (local)
+        self.backend = tts_backend_from_env()
+        workers = int(os.getenv("TTS_WORKERS", 2))
+        self.executor = InstrumentedExecutor("tts", max_workers=workers)
+        # Sentences beyond the workers plus TTS_MAX_QUEUE waiting are rejected
+        self.queue = StageQueue("tts", concurrency=workers, max_queue=int(os.getenv("TTS_MAX_QUEUE", 32)))
+        self.slow = False
+
+        # Content-addressed cache of generated audio, evicted least recently used
+        self.cache_max_files = int(os.getenv("TTS_CACHE_MAX_FILES", 1000))
+        self.cache_max_bytes = int(os.getenv("TTS_CACHE_MAX_MB", 200)) * 1024 * 1024
+        # Files unused for this long are removed by cleanup() (0 = no limit)
+        self.cache_max_age = float(os.getenv("TTS_CACHE_MAX_AGE_S", 7 * 24 * 3600))
+        self._cache = OrderedDict()  # filename -> size in bytes
+        self._cache_bytes = 0
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # TTS_DELIVERY=memory keeps audio in a bounded in-memory store instead
+        # of generated_audio/ and streams it to clients while it is synthesized
+        delivery = os.getenv("TTS_DELIVERY", "disk").strip().lower()
+        if delivery not in ("disk", "memory"):
+            print(f"Warning: TTS_DELIVERY={delivery} is not supported (choose from disk, memory); using disk")
+            delivery = "disk"
+        self.delivery = delivery
+        self.memory = None
+        if delivery == "memory":
+            self.memory = AudioStore(
+                max_bytes=int(os.getenv("TTS_MEMORY_MAX_MB", 64)) * 1024 * 1024,
+                ttl=float(os.getenv("TTS_MEMORY_TTL_S", 600))
+            )
+        self._background = set()
+
         self._ensure_audio_dir()
-    
+        self._load_cache_index()
+
     def _ensure_audio_dir(self):
         """Create audio directory if it doesn't exist"""
         if not os.path.exists(self.audio_dir):
             os.makedirs(self.audio_dir)
-    
+
+    def _load_cache_index(self):
+        """Index audio left over from previous runs, oldest first"""
+        self.cleanup()
+
+    def cleanup(self) -> int:
+        """
+        Janitor pass over the audio directory: delete files unused for
+        longer than the maximum age and abandoned temporary files, then
+        rebuild the index from what is on disk (including files written by
+        other worker processes) and evict down to the size bounds. A file's
+        mtime is its last use. Expired in-memory audio is dropped too.
+        Returns the number of files (and in-memory entries) deleted.
+        """
+        now = time.time()
+        entries = []
+        removed = 0
+        for entry in os.scandir(self.audio_dir):
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+                if entry.name.endswith(".tmp"):
+                    # Left behind by a synthesis that was killed
+                    if now - stat.st_mtime > 3600:
+                        os.remove(entry.path)
+                        removed += 1
+                elif entry.name.endswith(_AUDIO_EXTENSIONS):
+                    if self.cache_max_age > 0 and now - stat.st_mtime > self.cache_max_age:
+                        os.remove(entry.path)
+                        removed += 1
+                    else:
+                        entries.append((stat.st_mtime, entry.name, stat.st_size))
+            except OSError:
+                pass
+
+        with self._cache_lock:
+            index = OrderedDict((filename, size) for _, filename, size in sorted(entries))
+            # Files written since the scan started
+            for filename, size in self._cache.items():
+                if filename not in index and os.path.exists(os.path.join(self.audio_dir, filename)):
+                    index[filename] = size
+            self._cache = index
+            self._cache_bytes = sum(self._cache.values())
+            before = len(self._cache)
+            self._evict_locked()
+            removed += before - len(self._cache)
+        if self.memory is not None:
+            removed += self.memory.evict()
+        return removed
+
+    def audio_path(self, filename: str):
+        """
+        Path of a generated audio file (with TTS_DELIVERY=memory, its
+        name in the memory store), or None if there is no such file
+        """
+        if not re.fullmatch(r"[0-9a-f]{64}\.(mp3|wav)", filename):
+            return None
+        if self.memory is not None:
+            return filename if self.memory.get(filename) is not None else None
+        filepath = os.path.join(self.audio_dir, filename)
+        return filepath if os.path.isfile(filepath) else None
+
+    @staticmethod
+    def media_type(filename: str) -> str:
+        for backend in TTS_BACKENDS.values():
+            if filename.endswith(f".{backend.extension}"):
+                return backend.media_type
+        return "application/octet-stream"
+
+    def audio_buffer(self, filename: str):
+        """The in-memory audio of filename (complete or not), or None"""
+        if self.memory is None:
+            return None
+        return self.memory.get(filename)
+
+    async def read_audio(self, audio_path: str) -> bytes:
+        if self.memory is not None:
+            buffer = self.memory.get(audio_path)
+            if buffer is None:
+                raise Exception("TTS audio has expired")
+            return await buffer.wait()
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, _read_file, audio_path)
+
+    def cache_key(self, text: str, language: str) -> str:
+        """Hash of everything that affects the synthesized audio"""
+        payload = "\0".join([self.backend.name, language, str(self.slow), text])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def cache_stats(self) -> dict:
+        with self._cache_lock:
+            stats = {
+                "delivery": self.delivery,
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "files": len(self._cache),
+                "bytes": self._cache_bytes
+            }
+        if self.memory is not None:
+            stats["memory"] = self.memory.stats()
+        return stats
+
     async def text_to_speech(self, text: str, language: str = "en") -> str:
         """
         Convert text to speech and save as MP3 file
         Returns path to the generated audio file
         """
-        loop = asyncio.get_event_loop()
-        audio_path = await loop.run_in_executor(
-            self.executor,
-            self._text_to_speech_sync,
-            text,
-            language
-        )
+        if self.memory is not None:
+            filename, buffer = self._speech_buffer(text, language)
+            await buffer.wait()
+            return filename
+
+        # Cache hits are answered without leaving the event loop
+        cached_path = self._lookup(self.cache_key(text, language))
+        if cached_path:
+            return cached_path
+
+        async with self.queue.slot():
+            loop = asyncio.get_event_loop()
+            audio_path = await loop.run_in_executor(
+                self.executor,
+                self._text_to_speech_sync,
+                text,
+                language
+            )
         return audio_path
-    
+
+    async def start_speech(self, text: str, language: str = "en") -> str:
+        """
+        With TTS_DELIVERY=memory: start synthesizing text (unless it is in
+        the store already) and return its name once the first bytes are
+        written, so a synthesizer that fails straight away (gTTS without
+        network) fails the reply rather than its audio URL
+        """
+        filename, buffer = self._speech_buffer(text, language)
+        await buffer.started()
+        return filename
+
+    async def synthesize_stream(self, fragments: AsyncIterator[str], language: str = "en") -> AsyncIterator[str]:
+        """
+        Consume text as it is generated, synthesize each sentence as soon as
+        it is complete (concurrently on the executor) and yield the audio
+        paths in sentence order. With TTS_DELIVERY=memory a sentence is
+        yielded as soon as its first audio bytes are written; the rest
+        streams from the memory store while it is produced.
+        """
+        splitter = SentenceSplitter()
+        pending = asyncio.Queue()
+        speak = self.start_speech if self.memory is not None else self.text_to_speech
+
+        async def schedule():
+            try:
+                async for fragment in fragments:
+                    for sentence in splitter.feed(fragment):
+                        await pending.put(asyncio.ensure_future(speak(sentence, language)))
+                tail = splitter.flush()
+                if tail:
+                    await pending.put(asyncio.ensure_future(speak(tail, language)))
+            finally:
+                await pending.put(None)
+
+        producer = asyncio.ensure_future(schedule())
+        try:
+            while True:
+                task = await pending.get()
+                if task is None:
+                    break
+                yield await task
+            await producer
+        finally:
+            producer.cancel()
+            while not pending.empty():
+                task = pending.get_nowait()
+                if task is not None:
+                    task.cancel()
+
+    async def concatenate(self, audio_paths: List[str]) -> str:
+        """
+        Join segments into a single file. MP3 frames concatenate as they
+        are; WAV segments are merged into one header and data chunk.
+        Returns None when there are no segments (an empty reply).
+        """
+        if not audio_paths:
+            return None
+        if len(audio_paths) == 1:
+            return audio_paths[0]
+        if self.memory is not None:
+            return self._join_in_memory(audio_paths)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self._concatenate_sync, audio_paths)
+
+    def _join_in_memory(self, names: List[str]) -> str:
+        """
+        Name of the joined audio, returned at once: the segments are copied
+        into it in order as they are synthesized, so the reply streams from
+        its first sentence on
+        """
+        extension = os.path.splitext(names[0])[1]
+        filename = f"{hashlib.sha256(chr(0).join(names).encode('utf-8')).hexdigest()}{extension}"
+        buffer = self.memory.get(filename)
+        if buffer is not None and buffer.error is None:
+            return filename
+
+        segments = [self.memory.get(name) for name in names]
+        if any(segment is None for segment in segments):
+            raise Exception("TTS audio expired before it was joined")
+        buffer = AudioBuffer(segments[0].media_type)
+        self.memory.add(filename, buffer)
+        self._run_in_background(self._join_into(buffer, segments, extension == ".wav"))
+        return filename
+
+    async def _join_into(self, buffer: AudioBuffer, segments: List[AudioBuffer], wav: bool):
+        try:
+            if wav:
+                # One header for all segments; its sizes are filled in at the end
+                params = None
+                for segment in segments:
+                    segment_params, frames = parse_wav(await segment.wait())
+                    if params is None:
+                        params = segment_params
+                        buffer.write(wav_header(params, 0xFFFFFFFF))
+                    elif segment_params != params:
+                        raise Exception("Cannot join WAV segments with different formats")
+                    buffer.write(frames)
+                buffer.patch(0, wav_header(params, len(buffer) - 44))
+            else:
+                # MP3 frames concatenate, so bytes are passed on as they arrive
+                for segment in segments:
+                    async for chunk in segment.chunks():
+                        buffer.write(chunk)
+            buffer.finish()
+        except Exception as e:
+            buffer.finish(e)
+
+    def _speech_buffer(self, text: str, language: str):
+        """(filename, AudioBuffer) of text in the memory store, starting synthesis on a miss"""
+        filename = f"{self.cache_key(text, language)}.{self.backend.extension}"
+        buffer = self.memory.get(filename)
+        if buffer is not None and buffer.error is None:
+            with self._cache_lock:
+                self.cache_hits += 1
+            return filename, buffer
+
+        # Synthesis runs in the background, so shed load here
+        self.queue.check()
+        with self._cache_lock:
+            self.cache_misses += 1
+        buffer = AudioBuffer(self.backend.media_type)
+        self.memory.add(filename, buffer)
+        self._run_in_background(self._synthesize_into(buffer, text, language))
+        return filename, buffer
+
+    async def _synthesize_into(self, buffer: AudioBuffer, text: str, language: str):
+        try:
+            async with self.queue.slot():
+                loop = asyncio.get_event_loop()
+                await loop.run_in_executor(
+                    self.executor,
+                    self.backend.synthesize_to,
+                    text,
+                    language,
+                    self.slow,
+                    buffer
+                )
+            buffer.finish()
+        except Overloaded as e:
+            buffer.finish(e)
+        except Exception as e:
+            buffer.finish(Exception(f"TTS error: {str(e)}"))
+
+    def _run_in_background(self, coroutine):
+        # The event loop only keeps weak references to tasks
+        task = asyncio.ensure_future(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _concatenate_sync(self, audio_paths: List[str]) -> str:
+        names = "\0".join(os.path.basename(path) for path in audio_paths)
+        extension = os.path.splitext(audio_paths[0])[1]
+        filename = f"{hashlib.sha256(names.encode('utf-8')).hexdigest()}{extension}"
+        filepath = os.path.join(self.audio_dir, filename)
+
+        with self._cache_lock:
+            if filename in self._cache and os.path.exists(filepath):
+                self._touch_locked(filename)
+                return filepath
+
+        segments = [_read_file(path) for path in audio_paths]
+        if extension == ".wav":
+            parsed = [parse_wav(segment) for segment in segments]
+            if len({params for params, _ in parsed}) > 1:
+                raise Exception("Cannot join WAV segments with different formats")
+            data = build_wav(parsed[0][0], b"".join(frames for _, frames in parsed))
+        else:
+            data = b"".join(segments)
+        self._write_file(filepath, data)
+
+        self._add_to_cache(filename, len(data))
+        return filepath
+
+    def _lookup(self, key: str):
+        """Return the cached file path for key, or None on a miss"""
+        filename = f"{key}.{self.backend.extension}"
+        filepath = os.path.join(self.audio_dir, filename)
+        with self._cache_lock:
+            if filename in self._cache:
+                if os.path.exists(filepath):
+                    self._touch_locked(filename)
+                    self.cache_hits += 1
+                    return filepath
+                # Removed behind our back
+                self._cache_bytes -= self._cache.pop(filename)
+            self.cache_misses += 1
+        return None
+
     def _text_to_speech_sync(self, text: str, language: str) -> str:
         """Synchronous text-to-speech conversion"""
         try:
-            # Generate unique filename
-            filename = f"{uuid.uuid4().hex}.mp3"
+            key = self.cache_key(text, language)
+            filename = f"{key}.{self.backend.extension}"
             filepath = os.path.join(self.audio_dir, filename)
-            
-            # Generate speech using gTTS
-            tts = gTTS(text=text, lang=language, slow=False)
-            tts.save(filepath)
-            
+
+            # Another request may have synthesized the same text meanwhile
+            with self._cache_lock:
+                if filename in self._cache and os.path.exists(filepath):
+                    self._touch_locked(filename)
+                    return filepath
+
+            data = self.backend.synthesize(text, language, self.slow)
+            self._write_file(filepath, data)
+
+            self._add_to_cache(filename, len(data))
             return filepath
         except Exception as e:
             raise Exception(f"TTS error: {str(e)}")
 
+    def _write_file(self, filepath: str, data: bytes):
+        """Write via a temporary name so readers never see a partial file"""
+        tmp_path = os.path.join(self.audio_dir, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _touch_locked(self, filename: str):
+        """Mark a file as just used, in the index and (for cleanup) on disk"""
+        self._cache.move_to_end(filename)
+        try:
+            os.utime(os.path.join(self.audio_dir, filename))
+        except OSError:
+            pass
+
+    def _add_to_cache(self, filename: str, size: int):
+        with self._cache_lock:
+            if filename in self._cache:
+                self._cache_bytes -= self._cache.pop(filename)
+            self._cache[filename] = size
+            self._cache_bytes += size
+            self._evict_locked()
+
+    def _evict_locked(self):
+        """Delete least recently used files until the cache is within bounds"""
+        while self._cache and (
+            len(self._cache) > self.cache_max_files or self._cache_bytes > self.cache_max_bytes
+        ):
+            filename, size = self._cache.popitem(last=False)
+            self._cache_bytes -= size
+            try:
+                os.remove(os.path.join(self.audio_dir, filename))
+            except OSError:
+                pass
+
+
+_AUDIO_EXTENSIONS = tuple(f".{backend.extension}" for backend in TTS_BACKENDS.values())
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class SentenceSplitter:
+    """
+    Incrementally splits streamed text into sentences. Very short sentences
+    are merged with the next one so each synthesis call has enough text.
+    """
+
+    _boundary = re.compile(r"(?<=[.!?])\s+")
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, fragment: str) -> List[str]:
+        """Add text and return the sentences completed by it"""
+        self._buffer += fragment
+
+        sentences = []
+        start = 0
+        for boundary in self._boundary.finditer(self._buffer):
+            sentence = self._buffer[start:boundary.start()].strip()
+            if len(sentence) >= self.min_chars:
+                sentences.append(sentence)
+                start = boundary.end()
+        # Keep the unfinished (or too short) remainder for later
+        self._buffer = self._buffer[start:]
+        return sentences
 
+    def flush(self) -> str:
+        """Return whatever text is left at the end of the stream"""
+        tail = self._buffer.strip()
+        self._buffer = ""
+        return tail
@@ -0,0 +1,106 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+from app.metrics import Counter
+from app.services.audio_decoder import SAMPLE_RATE
+
+load_dotenv()
+
+AUDIO_SECONDS = Counter(
+    "voice_assistant_audio_seconds_total",
+    "Seconds of audio received and seconds left for Whisper after VAD",
+    ["kind"]
+)
+
+FRAME_MS = 30
+
+
+class VoiceActivityDetector:
+    """
+    Energy-based voice activity detection for 16 kHz float32 audio.
+
+    Frames of FRAME_MS whose RMS reaches the threshold count as speech.
+    Pauses shorter than min_silence_ms are kept inside a speech region,
+    regions shorter than min_speech_ms are dropped as clicks or noise, and
+    every region keeps pad_ms of context on both sides.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("VAD_ENABLED", "true").lower() == "true"
+        self.threshold = float(os.getenv("VAD_THRESHOLD_RMS", 0.01))
+        self.min_speech_ms = float(os.getenv("VAD_MIN_SPEECH_MS", 250))
+        self.min_silence_ms = float(os.getenv("VAD_MIN_SILENCE_MS", 600))
+        self.pad_ms = float(os.getenv("VAD_PAD_MS", 200))
+        # Whisper processes audio in 30 second windows
+        self.max_segment_seconds = float(os.getenv("VAD_MAX_SEGMENT_S", 30))
+
+    def speech_regions(self, audio: np.ndarray) -> list:
+        """(start, end) sample offsets of the speech in the audio"""
+        frame = SAMPLE_RATE * FRAME_MS // 1000
+        count = -(-len(audio) // frame)
+        if count == 0:
+            return []
+        frames = np.zeros(count * frame, dtype=np.float32)
+        frames[:len(audio)] = audio
+        rms = np.sqrt(np.mean(frames.reshape(count, frame) ** 2, axis=1))
+
+        edges = np.diff(np.concatenate(([0], (rms >= self.threshold).astype(np.int8), [0])))
+        runs = zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+        min_silence = self.min_silence_ms / FRAME_MS
+        regions = []
+        for start, end in runs:
+            if regions and start - regions[-1][1] < min_silence:
+                regions[-1][1] = end
+            else:
+                regions.append([start, end])
+
+        min_speech = self.min_speech_ms / FRAME_MS
+        pad = int(self.pad_ms / FRAME_MS)
+        padded = []
+        for start, end in regions:
+            if end - start < min_speech:
+                continue
+            start = max(0, (start - pad) * frame)
+            end = min(len(audio), (end + pad) * frame)
+            if padded and start <= padded[-1][1]:
+                padded[-1] = (padded[-1][0], end)
+            else:
+                padded.append((start, end))
+        return padded
+
+    def has_speech(self, audio: np.ndarray) -> bool:
+        return not self.enabled or bool(self.speech_regions(audio))
+
+    def segments(self, audio: np.ndarray) -> list:
+        """
+        The speech of a recording with long silences removed, packed into
+        segments of at most max_segment_seconds that can be transcribed
+        independently. Empty when the recording holds no speech.
+        """
+        AUDIO_SECONDS.inc(len(audio) / SAMPLE_RATE, kind="received")
+        if not self.enabled:
+            segments = [audio] if len(audio) else []
+        else:
+            segments = self._pack(audio, self.speech_regions(audio))
+        AUDIO_SECONDS.inc(sum(len(segment) for segment in segments) / SAMPLE_RATE, kind="transcribed")
+        return segments
+
+    def _pack(self, audio: np.ndarray, regions: list) -> list:
+        max_samples = int(self.max_segment_seconds * SAMPLE_RATE)
+        segments = []
+        pieces = []
+        length = 0
+        for start, end in regions:
+            # A region longer than one segment is cut at the segment length
+            for piece_start in range(start, end, max_samples):
+                piece = audio[piece_start:min(end, piece_start + max_samples)]
+                if pieces and length + len(piece) > max_samples:
+                    segments.append(np.concatenate(pieces))
+                    pieces, length = [], 0
+                pieces.append(piece)
+                length += len(piece)
+        if pieces:
+            segments.append(np.concatenate(pieces))
+        return segments
@@ -2,17 +2,112 @@ import whisper
 import os
 from dotenv import load_dotenv
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import AsyncIterator, Tuple
+import numpy as np
+import torch
+
+from app.metrics import InstrumentedExecutor
+from app.scheduler import StageQueue
+from app.services.model_backends import backend_from_env, quantize_int8
+from app.services.transcript_cache import MelCache, TranscriptCache
+from app.services.audio_decoder import (
+    FFMPEG_MISSING_MESSAGE,
+    SAMPLE_RATE,
+    decode_audio,
+    ffmpeg_available,
+)
 
 load_dotenv()
 
+# The service inside a Whisper worker process (WHISPER_PROCESSES > 0)
+_process_service = None
+
+
+def _init_process_worker(torch_threads: int):
+    global _process_service
+    import torch
+    torch.set_num_threads(torch_threads)
+    os.environ["WHISPER_PROCESSES"] = "0"
+    _process_service = WhisperService()
+    _process_service.load()
+
+
+def _transcribe_array_in_process(audio: np.ndarray) -> str:
+    return _process_service._transcribe_array_sync(audio)
+
+
+def _transcribe_file_in_process(audio_path: str) -> str:
+    return _process_service._transcribe_sync(audio_path)
+
+
+def _decode_batch_in_process(segments: list) -> list:
+    return _process_service._decode_batch_sync(segments)
+
+
 class WhisperService:
     def __init__(self):
         self.model = None
         self.model_name = os.getenv("WHISPER_MODEL", "base")
-        self.executor = ThreadPoolExecutor(max_workers=1)
+        # torch (fp32) or int8 (dynamic quantization); openai-whisper models
+        # have no ONNX export path
+        self.backend = backend_from_env("WHISPER_BACKEND", ("torch", "int8"))
+        self.language = os.getenv("WHISPER_LANGUAGE", "en")
+        
+        # Transcripts of uploads seen before, and optionally the log-mel
+        # spectrograms of batched segments (WHISPER_MEL_CACHE_MB, 0 = off)
+        self.transcript_cache = TranscriptCache()
+        self.mel_cache = MelCache(int(float(os.getenv("WHISPER_MEL_CACHE_MB", 0)) * 1024 * 1024))
+        
+        # WHISPER_PROCESSES > 0 runs transcription in that many worker
+        # processes, each with its own model copy and torch threads, so
+        # transcriptions run in parallel outside this process's GIL
+        self.processes = int(os.getenv("WHISPER_PROCESSES", 0))
+        self._pool_ready = False
+        if self.processes > 0:
+            torch_threads = int(os.getenv("WHISPER_PROCESS_THREADS", 0)) or max(1, (os.cpu_count() or 1) // self.processes)
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+                initargs=(torch_threads,)
+            )
+        else:
+            self.executor = InstrumentedExecutor("whisper", max_workers=1)
+        
+        # Segments decoded together by transcribe_many
+        self.batch_size = int(os.getenv("WHISPER_BATCH_SIZE", 8))
+        
+        # Requests beyond the workers plus WHISPER_MAX_QUEUE waiting are rejected
+        self.queue = StageQueue(
+            "whisper",
+            concurrency=max(1, self.processes),
+            max_queue=int(os.getenv("WHISPER_MAX_QUEUE", 8))
+        )
+        if not ffmpeg_available():
+            print(f"Warning: {FFMPEG_MISSING_MESSAGE}. Only WAV uploads can be decoded.")
+    
+    def load(self):
+        """Load the model (called by the model registry)"""
+        if self.processes > 0:
+            # Start every worker process; each loads its own model
+            print(f"Starting {self.processes} Whisper worker processes")
+            futures = [self.executor.submit(os.getpid) for _ in range(self.processes)]
+            for future in futures:
+                future.result()
+            self._pool_ready = True
+            return
         self._load_model()
     
+    def warmup(self):
+        """Transcribe a second of silence on the inference thread(s)"""
+        silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        if self.processes > 0:
+            wait([self.executor.submit(_transcribe_array_in_process, silence) for _ in range(self.processes)])
+            return
+        self.executor.submit(self._transcribe_array_sync, silence).result()
+    
     def _load_model(self):
         """Load Whisper model asynchronously"""
         print(f"Loading Whisper model: {self.model_name}")
@@ -29,40 +124,217 @@ class WhisperService:
             except Exception as e2:
                 print(f"Error loading fallback model: {e2}")
                 raise
+        
+        if self.backend == "int8":
+            self.model = quantize_int8(self.model.cpu())
+            print("Whisper model quantized to int8")
     
     def is_loaded(self):
-        return self.model is not None
+        return self.model is not None or self._pool_ready
+    
+    def transcript_key(self, data: bytes) -> str:
+        """Transcript cache key of uploaded audio bytes for this model and language"""
+        return self.transcript_cache.key(data, f"{self.model_name}:{self.backend}", self.language)
     
     async def transcribe(self, audio_path: str) -> str:
         """
         Transcribe audio file to text using Whisper
         """
-        if not self.model:
+        if not self.is_loaded():
             raise Exception("Whisper model not loaded")
         
         # Run transcription in thread pool to avoid blocking
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            self.executor,
-            self._transcribe_sync,
-            audio_path
-        )
+        transcribe = _transcribe_file_in_process if self.processes > 0 else self._transcribe_sync
+        async with self.queue.slot():
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(
+                self.executor,
+                transcribe,
+                audio_path
+            )
+        return result
+    
+    async def transcribe_bytes(self, data: bytes) -> str:
+        """
+        Decode uploaded audio bytes in memory and transcribe them
+        """
+        if not self.is_loaded():
+            raise Exception("Whisper model not loaded")
+        
+        # Decode outside the model executor so it overlaps other transcriptions
+        audio = await self.decode_audio(data)
+        return await self.transcribe_array(audio)
+    
+    async def transcribe_array(self, audio: np.ndarray) -> str:
+        """
+        Transcribe 16 kHz mono float32 samples using Whisper
+        """
+        if not self.is_loaded():
+            raise Exception("Whisper model not loaded")
+        if len(audio) == 0:
+            return ""
+        
+        transcribe = _transcribe_array_in_process if self.processes > 0 else self._transcribe_array_sync
+        async with self.queue.slot():
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(
+                self.executor,
+                transcribe,
+                audio
+            )
         return result
     
+    async def transcribe_segments(self, segments: list) -> str:
+        """
+        Transcribe independent speech segments concurrently (in parallel
+        with WHISPER_PROCESSES > 1) and join the texts in order
+        """
+        if not self.is_loaded():
+            raise Exception("Whisper model not loaded")
+        
+        transcribe = _transcribe_array_in_process if self.processes > 0 else self._transcribe_array_sync
+        # At most one segment per stage worker is handed to the executor
+        limit = asyncio.Semaphore(self.queue.concurrency)
+        
+        async def run_segment(segment):
+            if len(segment) == 0:
+                return ""
+            async with limit:
+                loop = asyncio.get_event_loop()
+                return await loop.run_in_executor(self.executor, transcribe, segment)
+        
+        # The request is one admission, however many segments it has
+        async with self.queue.slot():
+            tasks = [asyncio.ensure_future(run_segment(segment)) for segment in segments]
+            try:
+                texts = await asyncio.gather(*tasks)
+            finally:
+                # gather leaves the other segments running when one fails
+                for task in tasks:
+                    task.cancel()
+        return " ".join(text for text in texts if text)
+    
+    async def transcribe_many(self, recordings: list) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Transcribe many recordings with batched decoding. Each recording is
+        a list of speech segments (cut to Whisper's 30 second window); the
+        log-mel spectrograms of up to batch_size segments, from any of the
+        recordings, go through one whisper.decode call. Yields
+        (recording index, text) as soon as all of a recording's segments
+        are decoded.
+        """
+        if not self.is_loaded():
+            raise Exception("Whisper model not loaded")
+        
+        window = whisper.audio.N_SAMPLES
+        pieces = []  # (recording index, segment index, samples)
+        remaining = []
+        for index, segments in enumerate(recordings):
+            count = 0
+            for segment in segments:
+                for start in range(0, len(segment), window):
+                    pieces.append((index, count, segment[start:start + window]))
+                    count += 1
+            remaining.append(count)
+        texts = [[""] * count for count in remaining]
+        
+        # Recordings without speech are finished straight away
+        for index, count in enumerate(remaining):
+            if count == 0:
+                yield index, ""
+        
+        if not pieces:
+            return
+        
+        decode = _decode_batch_in_process if self.processes > 0 else self._decode_batch_sync
+        # At most one batch per stage worker is handed to the executor
+        limit = asyncio.Semaphore(self.queue.concurrency)
+        
+        async def run_batch(batch):
+            async with limit:
+                loop = asyncio.get_event_loop()
+                results = await loop.run_in_executor(self.executor, decode, [samples for _, _, samples in batch])
+            return batch, results
+        
+        # The whole job is one admission, however many batches it has
+        async with self.queue.slot():
+            tasks = [
+                asyncio.ensure_future(run_batch(pieces[start:start + self.batch_size]))
+                for start in range(0, len(pieces), self.batch_size)
+            ]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    batch, results = await next_done
+                    for (index, position, _), text in zip(batch, results):
+                        texts[index][position] = text
+                        remaining[index] -= 1
+                        if remaining[index] == 0:
+                            yield index, " ".join(text for text in texts[index] if text)
+            finally:
+                # On failure (or when the consumer stops early) batches still
+                # waiting for a worker are dropped
+                for task in tasks:
+                    task.cancel()
+    
+    def _decode_batch_sync(self, segments: list) -> list:
+        """Decode up to 30 second segments in one batched forward pass"""
+        try:
+            mel = torch.stack([self._log_mel(segment) for segment in segments]).to(self.model.device)
+            options = whisper.DecodingOptions(language=self.language, task="transcribe", fp16=False, without_timestamps=True)
+            results = whisper.decode(self.model, mel, options)
+        except Exception as e:
+            raise Exception(f"Transcription error: {str(e)}")
+        
+        # Same no-speech rule as whisper.transcribe
+        return [
+            "" if result.no_speech_prob > 0.6 and result.avg_logprob < -1 else result.text.strip()
+            for result in results
+        ]
+    
+    def _log_mel(self, segment: np.ndarray):
+        """The padded log-mel spectrogram of a segment, from the mel cache if enabled"""
+        n_mels = self.model.dims.n_mels
+        key = self.mel_cache.key(segment, n_mels) if self.mel_cache.enabled else None
+        if key is not None:
+            mel = self.mel_cache.get(key)
+            if mel is not None:
+                return mel
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(segment.astype(np.float32))), n_mels)
+        if key is not None:
+            self.mel_cache.set(key, mel)
+        return mel
+    
+    def _transcribe_array_sync(self, audio: np.ndarray) -> str:
+        """Synchronous transcription of an in-memory waveform"""
+        try:
+            result = self.model.transcribe(
+                audio.astype(np.float32),
+                language=self.language,
+                task="transcribe",
+                fp16=False
+            )
+            return result["text"].strip()
+        except Exception as e:
+            raise Exception(f"Transcription error: {str(e)}")
+    
+    async def decode_audio(self, data: bytes) -> np.ndarray:
+        """
+        Decode encoded audio bytes (WebM, MP3, ...) to 16 kHz mono float32
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, decode_audio, data)
+    
     def _transcribe_sync(self, audio_path: str) -> str:
         """Synchronous transcription"""
         try:
-            # Check if ffmpeg is available
-            import subprocess
-            try:
-                subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                raise Exception("ffmpeg is not installed. Please install it using: brew install ffmpeg (macOS) or apt-get install ffmpeg (Linux)")
+            # Whisper decodes files with ffmpeg
+            if not ffmpeg_available():
+                raise Exception(FFMPEG_MISSING_MESSAGE)
             
             # Transcribe audio
             result = self.model.transcribe(
                 audio_path,
-                language="en",
+                language=self.language,
                 task="transcribe",
                 fp16=False  # Use fp32 for better compatibility
             )
@@ -70,7 +342,7 @@ class WhisperService:
         except Exception as e:
             error_msg = str(e)
             if "ffmpeg" in error_msg.lower() or "no such file" in error_msg.lower():
-                raise Exception("ffmpeg is not installed. Please install it using: brew install ffmpeg (macOS) or apt-get install ffmpeg (Linux)")
+                raise Exception(FFMPEG_MISSING_MESSAGE)
             raise Exception(f"Transcription error: {error_msg}")
 
 
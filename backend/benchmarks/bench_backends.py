@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Compare the torch, int8 and onnx backends of each model: load time, memory,
+latency and an accuracy check against the fp32 torch backend.
+
+  - whisper: word error rate on a folder of recordings. Each name.wav may
+    have a name.txt reference transcript; without one the torch backend's
+    transcript is the reference.
+  - bert: accuracy on the labelled intent eval set (embedding engine, so
+    every utterance goes through the model) and agreement with torch
+  - gpt: greedy replies to fixed prompts; agreement with torch and a sanity
+    check (non-empty, printable, not degenerate repetition)
+
+Every (service, backend) pair runs in a fresh process so resident memory
+is measured without other models loaded.
+
+Usage:
+    python benchmarks/bench_backends.py --services bert gpt --backends torch int8 onnx
+    python benchmarks/bench_backends.py --services whisper --audio-dir path/to/wavs
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import common  # noqa: F401  (sets up sys.path)
+from common import percentile, print_table
+
+GPT_PROMPTS = [
+    ("Hello there!", "greeting"),
+    ("What is the tallest mountain in Europe?", "question"),
+    ("Turn on the lights please", "command"),
+    ("Tell me about the moon landing", "information"),
+    ("I had a pretty long day at work", "conversation"),
+    ("Goodbye for now", "goodbye"),
+]
+
+
+def rss_mb() -> float:
+    """Resident memory of this process"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_whisper(backend: str, audio_dir: str) -> dict:
+    os.environ["WHISPER_BACKEND"] = backend
+    os.environ["WHISPER_PROCESSES"] = "0"
+    from app.services.audio_decoder import decode_audio
+    from app.services.whisper_service import WhisperService
+
+    files = sorted(Path(audio_dir).glob("*.wav"))
+    audio = {path.stem: decode_audio(path.read_bytes()) for path in files}
+
+    service = WhisperService()
+    before = rss_mb()
+    start = time.perf_counter()
+    service.load()
+    load_s = time.perf_counter() - start
+    memory = rss_mb() - before
+    service._transcribe_array_sync(next(iter(audio.values())))
+
+    outputs, latencies = {}, []
+    for name, samples in audio.items():
+        start = time.perf_counter()
+        outputs[name] = service._transcribe_array_sync(samples)
+        latencies.append(time.perf_counter() - start)
+    references = {
+        path.stem: path.with_suffix(".txt").read_text().strip()
+        for path in files if path.with_suffix(".txt").exists()
+    }
+    return {"load_s": load_s, "rss_mb": memory, "latencies": latencies, "outputs": outputs, "references": references}
+
+
+def run_bert(backend: str) -> dict:
+    os.environ["BERT_BACKEND"] = backend
+    os.environ["INTENT_ENGINE"] = "embedding"
+    from app.services.bert_service import BertService
+    from app.services.intent_engine import load_eval_set
+
+    eval_set = load_eval_set()
+    service = BertService()
+    before = rss_mb()
+    start = time.perf_counter()
+    service.load()
+    load_s = time.perf_counter() - start
+    memory = rss_mb() - before
+    service._classify_batch_sync([eval_set[0][0]])
+
+    outputs, latencies = [], []
+    for text, _ in eval_set:
+        start = time.perf_counter()
+        outputs.append(service._classify_batch_sync([text])[0])
+        latencies.append(time.perf_counter() - start)
+    return {
+        "load_s": load_s, "rss_mb": memory, "latencies": latencies,
+        "outputs": outputs, "references": [intent for _, intent in eval_set]
+    }
+
+
+def run_gpt(backend: str) -> dict:
+    os.environ["GPT_BACKEND"] = backend
+    os.environ["OPENAI_API_KEY"] = ""
+    os.environ["GPT_LOCAL_ENGINE"] = "generate"
+    import torch
+    from app.services.gpt_service import GPTService
+
+    service = GPTService()
+    before = rss_mb()
+    start = time.perf_counter()
+    service.load()
+    load_s = time.perf_counter() - start
+    memory = rss_mb() - before
+    if service.local_model is None:
+        raise SystemExit("The local gpt2 model could not be loaded")
+
+    def greedy(user_input, intent):
+        prompt = f"You are a helpful voice assistant. The user's intent is: {intent}.\nUser: {user_input}\nAssistant:"
+        inputs = service.tokenizer(prompt, return_tensors="pt")
+        with torch.no_grad():
+            output = service.local_model.generate(
+                **inputs,
+                max_new_tokens=30,
+                do_sample=False,
+                pad_token_id=service.tokenizer.eos_token_id
+            )
+        text = service.tokenizer.decode(output[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+        return text.strip().split("\n")[0].strip()
+
+    greedy(*GPT_PROMPTS[0])
+    outputs, latencies = [], []
+    for prompt in GPT_PROMPTS:
+        start = time.perf_counter()
+        outputs.append(greedy(*prompt))
+        latencies.append(time.perf_counter() - start)
+    return {"load_s": load_s, "rss_mb": memory, "latencies": latencies, "outputs": outputs}
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance divided by the reference length"""
+    ref = re.findall(r"[a-z0-9']+", reference.lower())
+    hyp = re.findall(r"[a-z0-9']+", hypothesis.lower())
+    distances = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        previous, distances[0] = distances[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            previous, distances[j] = distances[j], min(
+                distances[j] + 1,
+                distances[j - 1] + 1,
+                previous + (ref_word != hyp_word)
+            )
+    return distances[-1] / max(1, len(ref))
+
+
+def is_sane(text: str) -> bool:
+    """Non-empty, printable and not one word repeated over and over"""
+    words = text.split()
+    return bool(words) and text.isprintable() and len(set(words)) > len(words) // 3
+
+
+def quality(service: str, result: dict, baseline: dict) -> dict:
+    if service == "whisper":
+        outputs = result["outputs"]
+        references = {name: result["references"].get(name, baseline["outputs"][name]) for name in outputs}
+        errors = [word_error_rate(references[name], outputs[name]) for name in outputs]
+        return {"quality": f"WER {sum(errors) / max(1, len(errors)):.3f}"}
+    if service == "bert":
+        outputs = result["outputs"]
+        accuracy = sum(o == r for o, r in zip(outputs, result["references"])) / len(outputs)
+        agreement = sum(o == b for o, b in zip(outputs, baseline["outputs"])) / len(outputs)
+        return {"quality": f"accuracy {accuracy:.3f}, agreement {agreement:.3f}"}
+    outputs = result["outputs"]
+    agreement = sum(o == b for o, b in zip(outputs, baseline["outputs"])) / len(outputs)
+    sane = sum(is_sane(o) for o in outputs) / len(outputs)
+    return {"quality": f"agreement {agreement:.3f}, sane {sane:.3f}"}
+
+
+def run_worker(service: str, backend: str, audio_dir: str):
+    if service == "whisper":
+        result = run_whisper(backend, audio_dir)
+    elif service == "bert":
+        result = run_bert(backend)
+    else:
+        result = run_gpt(backend)
+    print("RESULT " + json.dumps(result))
+
+
+def measure(service: str, backend: str, audio_dir: str) -> dict:
+    """Run one (service, backend) pair in a fresh process"""
+    command = [sys.executable, __file__, "--worker", service, backend]
+    if audio_dir:
+        command += ["--audio-dir", audio_dir]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    print(f"{service}/{backend} failed:\n{completed.stderr[-2000:]}")
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--services", nargs="+", default=["bert", "gpt"], choices=["whisper", "bert", "gpt"])
+    parser.add_argument("--backends", nargs="+", default=["torch", "int8", "onnx"], choices=["torch", "int8", "onnx"])
+    parser.add_argument("--audio-dir", help="Folder of .wav recordings (with optional .txt transcripts) for whisper")
+    parser.add_argument("--worker", nargs=2, metavar=("SERVICE", "BACKEND"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker, args.audio_dir)
+        return
+    if "whisper" in args.services and not args.audio_dir:
+        raise SystemExit("--audio-dir is required to benchmark whisper")
+
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+    rows = []
+    for service in args.services:
+        baseline = None
+        for backend in backends:
+            if service == "whisper" and backend == "onnx":
+                continue  # openai-whisper has no ONNX export path
+            result = measure(service, backend, args.audio_dir)
+            if result is None:
+                continue
+            baseline = baseline or result
+            rows.append({
+                "name": f"{service}/{backend}",
+                "load_s": result["load_s"],
+                "rss_mb": result["rss_mb"],
+                "p50_ms": percentile(result["latencies"], 50) * 1000,
+                "p95_ms": percentile(result["latencies"], 95) * 1000,
+                **quality(service, result, baseline)
+            })
+    print()
+    print_table(rows, columns=("name", "load_s", "rss_mb", "p50_ms", "p95_ms", "quality"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Files per minute of the batch transcription endpoint against looping over
+POST /api/voice/transcribe, on a running server.
+
+  - loop: one /api/voice/transcribe request per file, `--concurrency` at
+    a time (transcription plus intent, response and TTS)
+  - batch + downstream: every file in one /api/voice/transcribe/batch
+    request with ?downstream=true (same work as the loop)
+  - batch, transcript only: the batch endpoint without the later stages
+
+With --in-process no server is needed and only Whisper is compared:
+transcribing file by file against WhisperService.transcribe_many.
+
+Usage:
+    python benchmarks/bench_batch_transcription.py --audio-dir path/to/wavs --url http://localhost:8000
+    python benchmarks/bench_batch_transcription.py --audio-dir path/to/wavs --in-process --repeat 4
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import common  # noqa: F401  (sets up sys.path)
+from common import print_table, run_concurrent
+
+
+def row(name: str, files: int, elapsed: float, failed: int = 0) -> dict:
+    return {
+        "name": name,
+        "files": files,
+        "failed": failed,
+        "seconds": elapsed,
+        "files_per_min": files / elapsed * 60 if elapsed > 0 else 0.0,
+    }
+
+
+async def bench_server(url: str, uploads: list, concurrency: int) -> list:
+    import httpx
+
+    base = url.rstrip("/")
+    rows = []
+    async with httpx.AsyncClient(timeout=None) as client:
+        failed = []
+
+        async def one(upload):
+            response = await client.post(f"{base}/api/voice/transcribe", files={"audio_file": upload})
+            if response.status_code != 200:
+                failed.append(response.status_code)
+
+        # Warm up every stage before timing
+        await one(uploads[0])
+        failed.clear()
+
+        _, elapsed = await run_concurrent(one, uploads, concurrency)
+        rows.append(row(f"loop (concurrency {concurrency})", len(uploads), elapsed, len(failed)))
+
+        for name, downstream in (("batch + downstream", True), ("batch, transcript only", False)):
+            start = time.perf_counter()
+            lines = []
+            async with client.stream(
+                "POST",
+                f"{base}/api/voice/transcribe/batch",
+                params={"downstream": str(downstream).lower()},
+                files=[("files", upload) for upload in uploads]
+            ) as response:
+                async for line in response.aiter_lines():
+                    if line:
+                        lines.append(json.loads(line))
+            elapsed = time.perf_counter() - start
+            errors = sum(1 for line in lines if "error" in line)
+            rows.append(row(name, len(uploads), elapsed, errors))
+    return rows
+
+
+async def bench_in_process(uploads: list) -> list:
+    from app.services.audio_decoder import decode_audio
+    from app.services.vad import VoiceActivityDetector
+    from app.services.whisper_service import WhisperService
+
+    service = WhisperService()
+    service.load()
+    vad = VoiceActivityDetector()
+    recordings = [vad.segments(decode_audio(data)) for _, data in uploads]
+    async for _ in service.transcribe_many(recordings[:1]):
+        pass
+
+    start = time.perf_counter()
+    for segments in recordings:
+        await service.transcribe_segments(segments)
+    looped = row("file by file", len(recordings), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    async for _ in service.transcribe_many(recordings):
+        pass
+    batched = row(f"transcribe_many (batch {service.batch_size})", len(recordings), time.perf_counter() - start)
+    return [looped, batched]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio-dir", required=True, help="Folder of .wav recordings")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight when looping")
+    parser.add_argument("--repeat", type=int, default=1, help="Use every recording this many times")
+    parser.add_argument("--in-process", action="store_true", help="Compare Whisper only, without a server")
+    args = parser.parse_args()
+
+    paths = sorted(Path(args.audio_dir).glob("*.wav"))
+    if not paths:
+        raise SystemExit(f"No .wav files in {args.audio_dir}")
+    uploads = [(path.name, path.read_bytes()) for path in paths] * args.repeat
+
+    if args.in_process:
+        rows = asyncio.run(bench_in_process(uploads))
+    else:
+        rows = asyncio.run(bench_server(args.url, uploads, args.concurrency))
+    print_table(rows, columns=("name", "files", "failed", "seconds", "files_per_min"))
+
+
+if __name__ == "__main__":
+    main()
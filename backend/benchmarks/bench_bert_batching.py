@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for BertService.classify_intent: micro-batched path versus
+the per-request path (one forward pass per call). The keyword rules would
+decide most of the sample texts without BERT, so the service runs with
+the embedding engine and every text reaches the model.
+
+Usage:
+    python benchmarks/bench_bert_batching.py --requests 256 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+
+import common  # noqa: F401  (sets up sys.path)
+from common import print_table, run_concurrent, summarize
+
+from app.services.bert_service import BertService
+
+SAMPLE_TEXTS = [
+    "Hello there, how are you doing today?",
+    "What is the weather like in London?",
+    "Turn on the living room lights",
+    "Tell me about the history of Rome",
+    "I had a pretty long day at work",
+    "Goodbye, see you tomorrow",
+    "Can you explain how photosynthesis works?",
+    "Play some relaxing music",
+]
+
+
+async def bench(service, requests, concurrency):
+    payloads = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] for i in range(requests)]
+    rows = []
+    for level in concurrency:
+        latencies, elapsed = await run_concurrent(service.classify_intent_unbatched, payloads, level)
+        rows.append(summarize(f"per-request c={level}", latencies, elapsed))
+        latencies, elapsed = await run_concurrent(service.classify_intent, payloads, level)
+        rows.append(summarize(f"batched c={level}", latencies, elapsed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    service = BertService()
+    # Bypass the keyword rules: the benchmark measures BERT inference
+    service.engine = "embedding"
+    service.load()
+    print(f"Batching: max_batch_size={service.max_batch_size} max_wait_ms={service.max_wait_ms}\n")
+
+    # Warm up both paths so the first measurements don't include one-off costs
+    asyncio.run(bench(service, 16, [4]))
+    print_table(asyncio.run(bench(service, args.requests, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Cold-start time of the API server under different model loading settings.
+
+Each configuration starts a fresh `uvicorn app.main:app` process and
+measures how long it takes until the server accepts connections
+(listening_s), until /health reports every model ready (ready_s) and the
+latency of the first /api/text/process request sent once it is ready. With
+lazy loading the first request is sent as soon as the server listens and
+ready_s is when it completes.
+
+Before models were loaded by the registry the server only started
+listening once every model was loaded, one after another; the "serial, no
+warm-up" row reproduces that loading order (its ready_s is the old
+time-to-listening).
+
+Usage:
+    python benchmarks/bench_cold_start.py --port 8765
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from common import BACKEND_DIR, print_table
+
+CONFIGS = [
+    ("serial, no warm-up", {"MODEL_PRELOAD": "all", "MODEL_LOAD_WORKERS": "1", "MODEL_WARMUP": "false"}),
+    ("concurrent, no warm-up", {"MODEL_PRELOAD": "all", "MODEL_LOAD_WORKERS": "0", "MODEL_WARMUP": "false"}),
+    ("concurrent + warm-up", {"MODEL_PRELOAD": "all", "MODEL_LOAD_WORKERS": "0", "MODEL_WARMUP": "true"}),
+    ("lazy (load on first use)", {"MODEL_PRELOAD": "none", "MODEL_WARMUP": "true"}),
+]
+
+FIRST_REQUEST = {"text": "Can you tell me something interesting about the ocean?"}
+
+
+def fetch(url, payload=None, timeout=300):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def measure(name, overrides, port, timeout):
+    env = dict(os.environ, **overrides)
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=str(BACKEND_DIR),
+        env=env,
+        stdout=subprocess.DEVNULL
+    )
+    row = {"name": name}
+    try:
+        health = None
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise SystemExit(f"Server exited with code {server.returncode}")
+            try:
+                health = fetch(f"{base}/health", timeout=5)
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.05)
+                continue
+            if "listening_s" not in row:
+                row["listening_s"] = time.perf_counter() - start
+            if overrides.get("MODEL_PRELOAD") == "none" or health["status"] != "loading":
+                break
+            time.sleep(0.05)
+        else:
+            raise SystemExit(f"{name}: server not ready after {timeout}s")
+
+        if overrides.get("MODEL_PRELOAD") != "none":
+            row["ready_s"] = time.perf_counter() - start
+
+        request_start = time.perf_counter()
+        fetch(f"{base}/api/text/process", FIRST_REQUEST)
+        row["first_request_ms"] = (time.perf_counter() - request_start) * 1000
+        if "ready_s" not in row:
+            row["ready_s"] = time.perf_counter() - start
+
+        # A second request shows the steady state the first one is compared to
+        request_start = time.perf_counter()
+        fetch(f"{base}/api/text/process", FIRST_REQUEST)
+        row["second_request_ms"] = (time.perf_counter() - request_start) * 1000
+
+        models = fetch(f"{base}/health")["models"]
+        row["load_s"] = " ".join(f"{model}={info['load_seconds']}" for model, info in models.items())
+    finally:
+        server.terminate()
+        server.wait()
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    rows = [measure(name, overrides, args.port, args.timeout) for name, overrides in CONFIGS]
+    print_table(rows, columns=("name", "listening_s", "ready_s", "first_request_ms", "second_request_ms", "load_s"))
+
+
+if __name__ == "__main__":
+    main()
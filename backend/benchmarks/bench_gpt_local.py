@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Throughput of the local gpt2 fallback: the batched engine with a cached
+prompt prefix versus one model.generate call per request, at several
+concurrency levels.
+
+Usage:
+    OPENAI_API_KEY= python benchmarks/bench_gpt_local.py --requests 32 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+
+import common  # noqa: F401  (sets up sys.path)
+from common import print_table, run_concurrent, summarize
+
+from app.services.gpt_service import GPTService
+
+PROMPTS = [
+    ("Hello there!", "greeting"),
+    ("What is the tallest mountain in Europe?", "question"),
+    ("Turn on the lights please", "command"),
+    ("Tell me about the moon landing", "information"),
+    ("I had a pretty long day at work", "conversation"),
+    ("Goodbye for now", "goodbye"),
+]
+
+
+async def bench(gpt, requests, concurrency):
+    loop = asyncio.get_event_loop()
+    payloads = [PROMPTS[i % len(PROMPTS)] for i in range(requests)]
+
+    async def per_request(payload):
+        await loop.run_in_executor(gpt.executor, gpt._generate_response_sync, *payload)
+
+    async def batched(payload):
+        await gpt.local_engine.generate(*payload)
+
+    rows = []
+    for level in concurrency:
+        latencies, elapsed = await run_concurrent(per_request, payloads, level)
+        rows.append(summarize(f"generate() c={level}", latencies, elapsed))
+        latencies, elapsed = await run_concurrent(batched, payloads, level)
+        rows.append(summarize(f"engine c={level}", latencies, elapsed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    gpt = GPTService()
+    gpt.load()
+    if gpt.local_engine is None:
+        raise SystemExit("The batched local engine is not active (unset OPENAI_API_KEY, GPT_LOCAL_ENGINE=batched)")
+    print(f"Engine: max_batch_size={gpt.local_engine.batcher.max_batch_size}\n")
+
+    asyncio.run(bench(gpt, 4, [2]))  # warm up
+    print_table(asyncio.run(bench(gpt, args.requests, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Time-to-first-token of GPTService.stream_response versus the end-to-end
+latency of GPTService.generate_response (and of the full text pipeline,
+which also waits for TTS before returning).
+
+Usage:
+    python benchmarks/bench_gpt_streaming.py --runs 10 [--with-tts]
+"""
+import argparse
+import asyncio
+import time
+
+import common  # noqa: F401  (sets up sys.path)
+from common import percentile
+
+from app.services.gpt_service import GPTService
+from app.services.tts_service import TTSService
+
+PROMPTS = [
+    ("Hello there!", "greeting"),
+    ("What is the tallest mountain in Europe?", "question"),
+    ("Tell me about the moon landing", "information"),
+    ("I had a pretty long day at work", "conversation"),
+]
+
+
+async def bench(gpt, tts, runs):
+    blocking, first_token, streamed_total, end_to_end = [], [], [], []
+
+    for i in range(runs):
+        user_input, intent = PROMPTS[i % len(PROMPTS)]
+
+        start = time.perf_counter()
+        text = await gpt.generate_response(user_input, intent)
+        blocking.append(time.perf_counter() - start)
+        if tts:
+            # Vary the text so the TTS cache doesn't hide synthesis time
+            await tts.text_to_speech(f"{text} ({i})")
+            end_to_end.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        first = None
+        async for _ in gpt.stream_response(user_input, intent):
+            if first is None:
+                first = time.perf_counter() - start
+        first_token.append(first if first is not None else time.perf_counter() - start)
+        streamed_total.append(time.perf_counter() - start)
+
+    def row(name, values):
+        if values:
+            print(f"{name:<32} p50={percentile(values, 50) * 1000:9.1f}ms  p95={percentile(values, 95) * 1000:9.1f}ms")
+
+    row("generate_response (blocking)", blocking)
+    row("blocking + TTS (JSON endpoint)", end_to_end)
+    row("stream_response first token", first_token)
+    row("stream_response complete", streamed_total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--with-tts", action="store_true", help="include TTS in the end-to-end baseline")
+    args = parser.parse_args()
+
+    gpt = GPTService()
+    gpt.load()
+    tts = TTSService() if args.with_tts else None
+    print(f"Backend: {'OpenAI' if gpt.use_openai else 'local gpt2' if gpt.local_model else 'fallback responses'}\n")
+    asyncio.run(bench(gpt, tts, args.runs))
+
+
+if __name__ == "__main__":
+    main()
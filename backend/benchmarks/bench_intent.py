@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Accuracy and per-query latency of the intent engines on the labelled eval
+set in app/data/intent_eval.json.
+
+Usage:
+    python benchmarks/bench_intent.py --repeat 5
+"""
+import argparse
+import time
+
+import common  # noqa: F401  (sets up sys.path)
+from common import percentile
+
+from app.services.bert_service import BertService
+from app.services.intent_engine import DEFAULT_INTENT, load_eval_set
+
+
+def evaluate(name, classify_one, classify_batch, eval_set, repeat):
+    texts = [text for text, _ in eval_set]
+    labels = [intent for _, intent in eval_set]
+
+    predictions = classify_batch(texts)
+    accuracy = sum(p == l for p, l in zip(predictions, labels)) / len(labels)
+
+    latencies = []
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            classify_one(text)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        classify_batch(texts)
+    batched_ms = (time.perf_counter() - start) * 1000 / (repeat * len(texts))
+
+    print(f"{name:<10} accuracy={accuracy:6.1%}  "
+          f"single p50={percentile(latencies, 50) * 1000:8.3f}ms "
+          f"p99={percentile(latencies, 99) * 1000:8.3f}ms  "
+          f"batched={batched_ms:8.3f}ms/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    eval_set = load_eval_set()
+    service = BertService()
+    service.load()
+    if service.centroid_classifier is None:
+        raise SystemExit("Set INTENT_ENGINE=hybrid or embedding to load the centroid index")
+    print(f"{len(eval_set)} labelled utterances, model {service.model_name}\n")
+
+    matcher = service.matcher
+    rules_one = lambda text: matcher.match(text) or DEFAULT_INTENT
+    evaluate("rules", rules_one, lambda texts: [rules_one(t) for t in texts], eval_set, args.repeat)
+
+    def embedding_batch(texts):
+        return service.centroid_classifier.classify(service._embed(texts))
+    evaluate("embedding", lambda text: embedding_batch([text])[0], embedding_batch, eval_set, args.repeat)
+
+    service.engine = "hybrid"
+    evaluate("hybrid", service._classify_intent_sync, service._classify_batch_sync, eval_set, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
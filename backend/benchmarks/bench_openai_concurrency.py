@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Concurrent throughput of the OpenAI path against the local stub server
+(benchmarks/openai_stub.py, started here), so no API key or network is
+needed:
+
+  - "sync client, 1 thread": the synchronous OpenAI client on a single
+    worker thread, as GPTService used before (one completion at a time)
+  - "async generate_response" / "async stream_response": GPTService with
+    AsyncOpenAI, a shared connection pool and OPENAI_MAX_IN_FLIGHT
+
+The stub can inject 500s, 429s and stalls to exercise retries and the
+deadline fallback; "fallbacks" counts canned fallback replies.
+
+Usage:
+    python benchmarks/bench_openai_concurrency.py --requests 200 --concurrency 32
+    python benchmarks/bench_openai_concurrency.py --error-rate 0.1 --rate-limit-rate 0.1 --stall-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import common  # noqa: F401  (sets up sys.path)
+from common import print_table, run_concurrent, summarize
+
+PROMPT = ("What is the tallest mountain in Europe?", "question")
+
+
+def start_stub(args) -> subprocess.Popen:
+    stub = subprocess.Popen([
+        sys.executable, str(Path(__file__).parent / "openai_stub.py"),
+        "--port", str(args.port),
+        "--latency-ms", str(args.latency_ms),
+        "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate),
+        "--stall-rate", str(args.stall_rate),
+    ])
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{args.port}/stats", timeout=1)
+            return stub
+        except OSError:
+            time.sleep(0.1)
+    stub.kill()
+    raise SystemExit("The stub server did not start")
+
+
+def stub_stats(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as response:
+        return json.loads(response.read())
+
+
+async def bench_sync(base_url: str, requests: int, concurrency: int) -> dict:
+    from openai import OpenAI
+
+    client = OpenAI(api_key="stub", base_url=base_url, timeout=float(os.getenv("OPENAI_TIMEOUT_S", 10)))
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_event_loop()
+    failures = []
+
+    def complete():
+        try:
+            client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[{"role": "user", "content": PROMPT[0]}],
+                max_tokens=150
+            )
+        except Exception as e:
+            failures.append(e)
+
+    latencies, elapsed = await run_concurrent(lambda _: loop.run_in_executor(executor, complete), range(requests), concurrency)
+    executor.shutdown()
+    return {**summarize("sync client, 1 thread", latencies, elapsed), "fallbacks": len(failures)}
+
+
+async def bench_async(gpt, requests: int, concurrency: int, stream: bool) -> dict:
+    fallback = gpt._get_fallback_response(PROMPT[1], PROMPT[0])
+    fallbacks = []
+
+    async def one(_):
+        if stream:
+            text = "".join([fragment async for fragment in gpt.stream_response(*PROMPT)])
+        else:
+            text = await gpt.generate_response(*PROMPT)
+        if text == fallback:
+            fallbacks.append(text)
+
+    latencies, elapsed = await run_concurrent(one, range(requests), concurrency)
+    name = "async stream_response" if stream else "async generate_response"
+    return {**summarize(name, latencies, elapsed), "fallbacks": len(fallbacks)}
+
+
+async def bench(args, base_url: str) -> list:
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    from app.services.gpt_service import GPTService
+
+    gpt = GPTService()
+    gpt.load()
+    # Admit every benchmark request instead of shedding load
+    gpt.queue.max_queue = -1
+
+    rows = []
+    if not args.skip_sync:
+        rows.append(await bench_sync(base_url, args.requests, args.concurrency))
+    for stream in (False, True):
+        rows.append(await bench_async(gpt, args.requests, args.concurrency, stream))
+    await gpt.openai_client.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--skip-sync", action="store_true", help="Skip the slow single-thread baseline")
+    args = parser.parse_args()
+
+    stub = start_stub(args)
+    try:
+        rows = asyncio.run(bench(args, f"http://127.0.0.1:{args.port}/v1"))
+        stats = stub_stats(args.port)
+    finally:
+        stub.terminate()
+        try:
+            stub.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            # Stalled requests hold up uvicorn's graceful shutdown
+            stub.kill()
+
+    print_table(rows, columns=("name", "requests", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "fallbacks"))
+    print(f"\nStub: {stats['requests']} requests, {stats['errors']} 500s, {stats['rate_limited']} 429s, "
+          f"{stats['stalled']} stalled, at most {stats['max_in_flight']} in flight")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Synthesis time per character of each TTS backend (TTSBackend.synthesize,
+bypassing the audio cache) over sentences of increasing length. Backends
+that are unavailable here (espeak-ng not installed, gTTS without network)
+are reported and skipped.
+
+For WAV output the audio duration is known, so the real-time factor
+(synthesis time / audio seconds) is shown as well.
+
+Usage:
+    python benchmarks/bench_tts_backends.py --repeat 5
+    python benchmarks/bench_tts_backends.py --backends espeak
+"""
+import argparse
+import time
+
+import common  # noqa: F401  (sets up sys.path)
+from common import percentile, print_table
+
+from app.services.tts_service import TTS_BACKENDS, parse_wav
+
+SENTENCES = [
+    "Hello!",
+    "Sure, I can help with that.",
+    "The tallest mountain in Europe is Mount Elbrus, in the Caucasus.",
+    "I have turned on the lights in the living room and set the thermostat to twenty one degrees, "
+    "is there anything else you would like me to do before you go to bed?",
+]
+
+
+def bench_backend(backend, repeat: int) -> list:
+    rows = []
+    for text in SENTENCES:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = backend.synthesize(text, "en", False)
+            timings.append(time.perf_counter() - start)
+        p50 = percentile(timings, 50)
+        row = {
+            "backend": backend.name,
+            "chars": len(text),
+            "p50_ms": p50 * 1000,
+            "p95_ms": percentile(timings, 95) * 1000,
+            "ms_per_char": p50 * 1000 / len(text),
+            "kb": len(data) / 1024,
+        }
+        if backend.extension == "wav":
+            (channels, sample_width, rate), frames = parse_wav(data)
+            seconds = len(frames) / (channels * sample_width * rate)
+            row["audio_s"] = seconds
+            row["rtf"] = p50 / seconds if seconds else None
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(TTS_BACKENDS), choices=list(TTS_BACKENDS))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for name in args.backends:
+        try:
+            backend = TTS_BACKENDS[name]()
+            backend.synthesize("Warm up.", "en", False)
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        rows.extend(bench_backend(backend, args.repeat))
+
+    if rows:
+        print()
+        print_table(rows, columns=("backend", "chars", "p50_ms", "p95_ms", "ms_per_char", "kb", "audio_s", "rtf"))
+
+
+if __name__ == "__main__":
+    main()
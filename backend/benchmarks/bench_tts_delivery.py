@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Time to the first audio byte and to the last one for each TTS delivery
+mode (TTS_DELIVERY), synthesizing unique sentences concurrently:
+
+  - "disk": text_to_speech() writes the audio to generated_audio/ and
+    returns its path once synthesis has finished; the client then reads
+    the file
+  - "memory": start_speech() returns the name right away and the audio is
+    read from the in-memory store as the synthesizer writes it, as the
+    audio endpoint streams it
+
+Sentences are synthesized with the stub gTTS of stub_models.py
+(STUB_TTS_CHAR_MS per character, written frame by frame like gTTS parts)
+unless --backend names a real one. Each mode runs in its own temporary
+directory, whose size afterwards is the audio written to disk.
+
+Usage:
+    python benchmarks/bench_tts_delivery.py --sentences 64 --concurrency 8
+    python benchmarks/bench_tts_delivery.py --backend espeak
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import common  # noqa: F401  (sets up sys.path)
+from common import percentile, print_table, run_concurrent
+
+import stub_models
+import app.services.tts_service as tts_module
+
+SENTENCE = "Sentence {index} of the benchmark, long enough to be synthesized in several parts."
+
+
+async def bench(mode: str, args) -> dict:
+    os.environ["TTS_DELIVERY"] = mode
+    os.environ["TTS_MAX_QUEUE"] = "-1"
+    workdir = tempfile.mkdtemp(prefix=f"tts-delivery-{mode}-")
+    os.chdir(workdir)
+    service = tts_module.TTSService()
+    if args.backend == "stub":
+        tts_module.gTTS = stub_models.StubTTS
+        service.backend = tts_module.GTTSBackend()
+    else:
+        service.backend = tts_module.TTS_BACKENDS[args.backend]()
+
+    first_byte = []
+    sizes = []
+
+    async def speak(index):
+        text = SENTENCE.format(index=index)
+        start = time.perf_counter()
+        if mode == "memory":
+            filename = await service.start_speech(text)
+            size = 0
+            async for chunk in service.audio_buffer(filename).chunks():
+                if not size:
+                    first_byte.append(time.perf_counter() - start)
+                size += len(chunk)
+        else:
+            data = await service.read_audio(await service.text_to_speech(text))
+            first_byte.append(time.perf_counter() - start)
+            size = len(data)
+        sizes.append(size)
+
+    latencies, elapsed = await run_concurrent(speak, range(args.sentences), args.concurrency)
+    on_disk = sum(entry.stat().st_size for entry in os.scandir(service.audio_dir))
+    return {
+        "name": mode,
+        "sentences": len(latencies),
+        "first_byte_p50_ms": percentile(first_byte, 50) * 1000,
+        "first_byte_p95_ms": percentile(first_byte, 95) * 1000,
+        "last_byte_p50_ms": percentile(latencies, 50) * 1000,
+        "last_byte_p95_ms": percentile(latencies, 95) * 1000,
+        "kb_per_sentence": sum(sizes) / max(1, len(sizes)) / 1024,
+        "kb_on_disk": on_disk / 1024,
+        "elapsed_s": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sentences", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", default=["disk", "memory"], choices=["disk", "memory"])
+    parser.add_argument("--backend", default="stub", choices=["stub", *tts_module.TTS_BACKENDS])
+    args = parser.parse_args()
+
+    rows = [asyncio.run(bench(mode, args)) for mode in args.modes]
+    print_table(rows, columns=(
+        "name", "sentences", "first_byte_p50_ms", "first_byte_p95_ms",
+        "last_byte_p50_ms", "last_byte_p95_ms", "kb_per_sentence", "kb_on_disk", "elapsed_s"
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Requests per second of the frontend server (../web_server.py) in each
+mode, started here on local ports:
+
+  - "simple": single-threaded TCPServer + SimpleHTTPRequestHandler, files
+    read from disk for every request, no compression or validators
+  - "threaded": a thread per connection, assets in memory, precompressed
+    variants, ETags and 304s
+  - "asyncio": the same assets and headers served on one event loop
+
+Each client fetches the page, stylesheet and script with
+Accept-Encoding: gzip, br. With --revalidate, clients send the ETag of
+their previous response, as a browser reloading the page does (the
+simple server has no ETags and always answers 200). With --slow-clients
+N, N connections are opened that never finish their request first; on
+the single-threaded server they stall every other client.
+
+Usage:
+    python benchmarks/bench_web_server.py --requests 2000 --concurrency 32
+    python benchmarks/bench_web_server.py --slow-clients 1 --timeout 2
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import common  # noqa: F401  (sets up sys.path)
+from common import BACKEND_DIR, print_table, run_concurrent, summarize
+
+import httpx
+
+PATHS = ["/", "/static/css/style.css", "/static/js/app.js"]
+MODES = ["simple", "threaded", "asyncio"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode: str, port: int) -> subprocess.Popen:
+    env = {**os.environ, "WEB_PORT": str(port), "WEB_SERVER_MODE": mode}
+    server = subprocess.Popen(
+        [sys.executable, str(BACKEND_DIR.parent / "web_server.py")],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise SystemExit(f"The {mode} server did not start")
+
+
+async def bench(mode: str, port: int, args) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+    slow = [socket.create_connection(("127.0.0.1", port)) for _ in range(args.slow_clients)]
+    for sock in slow:
+        sock.sendall(b"GET / HTTP/1.1\r\n")  # and nothing more
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    etags = {}
+    statuses = {}
+    transferred = []
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            async def fetch(index):
+                path = PATHS[index % len(PATHS)]
+                headers = {"Accept-Encoding": "gzip, br"}
+                if args.revalidate and path in etags:
+                    headers["If-None-Match"] = etags[path]
+                try:
+                    async with client.stream("GET", path, headers=headers) as response:
+                        size = 0
+                        async for chunk in response.aiter_raw():
+                            size += len(chunk)
+                    if "etag" in response.headers:
+                        etags[path] = response.headers["etag"]
+                    status = str(response.status_code)
+                    transferred.append(size)
+                except httpx.HTTPError:
+                    status = "error"
+                statuses[status] = statuses.get(status, 0) + 1
+
+            latencies, elapsed = await run_concurrent(fetch, range(args.requests), args.concurrency)
+    finally:
+        for sock in slow:
+            sock.close()
+
+    row = summarize(mode, latencies, elapsed)
+    row["kb_per_response"] = sum(transferred) / max(1, len(transferred)) / 1024
+    row["statuses"] = " ".join(f"{status}:{count}" for status, count in sorted(statuses.items()))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--port", type=int, default=0, help="First port to use (default: any free ports)")
+    parser.add_argument("--revalidate", action="store_true", help="Send If-None-Match like a reloading browser")
+    parser.add_argument("--slow-clients", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    rows = []
+    for offset, mode in enumerate(args.modes):
+        port = args.port + offset if args.port else free_port()
+        server = start_server(mode, port)
+        try:
+            rows.append(asyncio.run(bench(mode, port, args)))
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    print_table(rows, columns=("name", "requests", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "kb_per_response", "statuses"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Make the backend package importable when running scripts directly
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(name, latencies, elapsed):
+    """Build a result row from per-request latencies (seconds)"""
+    count = len(latencies)
+    return {
+        "name": name,
+        "requests": count,
+        "throughput_rps": count / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def print_table(rows, columns=("name", "requests", "throughput_rps", "p50_ms", "p95_ms", "p99_ms")):
+    """Print result rows as a plain text table"""
+    widths = {col: max(len(col), *(len(_fmt(row.get(col))) for row in rows)) for col in columns}
+    print("  ".join(col.ljust(widths[col]) for col in columns))
+    print("  ".join("-" * widths[col] for col in columns))
+    for row in rows:
+        print("  ".join(_fmt(row.get(col)).ljust(widths[col]) for col in columns))
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return "" if value is None else str(value)
+
+
+async def run_concurrent(fn, payloads, concurrency):
+    """
+    Call the async fn once per payload with at most `concurrency` calls in
+    flight. Returns (latencies, elapsed seconds).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(payload):
+        async with semaphore:
+            start = time.perf_counter()
+            await fn(payload)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in payloads))
+    return latencies, time.perf_counter() - start
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the API server with concurrent clients.
+
+Each of --clients clients sends requests back to back for --duration
+seconds (after --warmup seconds whose results are discarded), choosing a
+workload per request by the weights in --mix:
+
+  - text:   POST /api/text/process with phrases from the intent eval set
+  - audio:  POST /api/voice/transcribe with the WAVs in --samples
+            (benchmarks/samples/ by default, see make_samples.py)
+  - stream: POST /api/text/stream, also timing the first token event
+  - batch:  POST /api/voice/transcribe/batch with every sample at once
+
+The server is started here with stub models (--server stub, see
+stub_models.py) or real ones (--server real), or an already running
+server is used (--url). Per endpoint the report has throughput, errors
+and p50/p95/p99 latency; per stage it has the percentiles of the
+durations each response reports in its Server-Timing header.
+
+Results are written as JSON (--output) with the configuration, machine
+and git commit, and --compare prints the change against an earlier
+result file.
+
+Usage:
+    python benchmarks/load_test.py --clients 16 --duration 30 --mix text=3,audio=1
+    python benchmarks/load_test.py --server real --clients 4 --mix text=1,stream=1
+    python benchmarks/load_test.py --url http://localhost:8000 --compare results/load_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import struct
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from common import BACKEND_DIR, percentile, print_table
+
+SAMPLES_DIR = Path(__file__).parent / "samples"
+RESULTS_DIR = Path(__file__).parent / "results"
+EVAL_FILE = BACKEND_DIR / "app" / "data" / "intent_eval.json"
+
+ENDPOINTS = {
+    "text": "/api/text/process",
+    "audio": "/api/voice/transcribe",
+    "stream": "/api/text/stream",
+    "batch": "/api/voice/transcribe/batch",
+}
+
+
+class Recorder:
+    """Collects per-request results, ignoring those during warm-up"""
+
+    def __init__(self):
+        self.recording = False
+        self.latencies = defaultdict(list)
+        self.first_event = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.stages = defaultdict(lambda: defaultdict(list))
+        self.started = self.stopped = None
+
+    def start(self):
+        self.recording = True
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.recording = False
+        self.stopped = time.perf_counter()
+
+    def add(self, workload: str, status, latency: float, server_timing: str = None, first_event: float = None):
+        if not self.recording:
+            return
+        self.statuses[workload][str(status)] += 1
+        if status != 200:
+            return
+        self.latencies[workload].append(latency)
+        if first_event is not None:
+            self.first_event[workload].append(first_event)
+        for stage, seconds in parse_server_timing(server_timing):
+            self.stages[workload][stage].append(seconds)
+
+
+def parse_server_timing(header: str) -> list:
+    """[(stage, seconds)] from "intent;dur=12.3, gpt;dur=80.1, total;dur=99.0" """
+    timings = []
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                try:
+                    timings.append((name, float(value) / 1000))
+                except ValueError:
+                    pass
+    return timings
+
+
+class Workloads:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, samples: list, unique: bool):
+        self.client = client
+        self.recorder = recorder
+        self.samples = samples
+        self.unique = unique
+        self.phrases = [item["text"] for item in json.loads(EVAL_FILE.read_text())]
+        self.counter = 0
+
+    def phrase(self, rng: random.Random) -> str:
+        text = rng.choice(self.phrases)
+        if self.unique:
+            # Defeat the response and TTS caches
+            self.counter += 1
+            text = f"{text} (request {self.counter})"
+        return text
+
+    def recording(self, samples: list) -> list:
+        if not self.unique:
+            return samples
+        # Defeat the transcript cache: the last two samples of each WAV
+        # (its data chunk ends the file) become an inaudible request number
+        unique = []
+        for name, data in samples:
+            self.counter += 1
+            unique.append((name, data[:-4] + struct.pack("<I", self.counter)))
+        return unique
+
+    async def run(self, workload: str, rng: random.Random):
+        start = time.perf_counter()
+        try:
+            if workload == "stream":
+                await self.stream(rng, start)
+                return
+            if workload == "text":
+                response = await self.client.post(ENDPOINTS["text"], json={"text": self.phrase(rng)})
+            elif workload == "audio":
+                name, data = self.recording([rng.choice(self.samples)])[0]
+                response = await self.client.post(ENDPOINTS["audio"], files={"audio_file": (name, data, "audio/wav")})
+            else:
+                files = [("files", (name, data, "audio/wav")) for name, data in self.recording(self.samples)]
+                response = await self.client.post(ENDPOINTS["batch"], files=files)
+            status = response.status_code
+            if status == 200 and workload == "batch" and '"error"' in response.text:
+                status = "partial"
+            self.recorder.add(workload, status, time.perf_counter() - start, response.headers.get("server-timing"))
+        except httpx.HTTPError as e:
+            self.recorder.add(workload, type(e).__name__, time.perf_counter() - start)
+
+    async def stream(self, rng: random.Random, start: float):
+        first_event = None
+        status = None
+        async with self.client.stream("POST", ENDPOINTS["stream"], json={"text": self.phrase(rng)}) as response:
+            status = response.status_code
+            server_timing = response.headers.get("server-timing")
+            async for line in response.aiter_lines():
+                if line.startswith("event: token") and first_event is None:
+                    first_event = time.perf_counter() - start
+                elif line.startswith("event: error"):
+                    status = "stream_error"
+        self.recorder.add("stream", status, time.perf_counter() - start, server_timing, first_event)
+
+
+async def client_loop(workloads: Workloads, mix: dict, seed: int, stop_at: float):
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    while time.perf_counter() < stop_at:
+        await workloads.run(rng.choices(names, weights)[0], rng)
+
+
+async def run_load(base_url: str, args, samples: list) -> Recorder:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.clients * 2, max_keepalive_connections=args.clients * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        workloads = Workloads(client, recorder, samples, args.unique)
+        loop_start = time.perf_counter()
+        stop_at = loop_start + args.warmup + args.duration
+        clients = [
+            asyncio.ensure_future(client_loop(workloads, args.mix, args.seed + index, stop_at))
+            for index in range(args.clients)
+        ]
+        await asyncio.sleep(args.warmup)
+        recorder.start()
+        await asyncio.gather(*clients)
+        recorder.stop()
+    return recorder
+
+
+def summarize_results(recorder: Recorder) -> dict:
+    elapsed = recorder.stopped - recorder.started
+    endpoints = {}
+    for workload, statuses in recorder.statuses.items():
+        latencies = recorder.latencies[workload]
+        row = {
+            "endpoint": ENDPOINTS[workload],
+            "requests": sum(statuses.values()),
+            "ok": len(latencies),
+            "errors": {status: count for status, count in statuses.items() if status != "200"},
+            "throughput_rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+            **latency_percentiles(latencies),
+        }
+        if recorder.first_event[workload]:
+            row["first_token"] = latency_percentiles(recorder.first_event[workload])
+        row["stages"] = {
+            stage: {"count": len(values), **latency_percentiles(values)}
+            for stage, values in sorted(recorder.stages[workload].items())
+        }
+        endpoints[workload] = row
+
+    stages = defaultdict(list)
+    for per_stage in recorder.stages.values():
+        for stage, values in per_stage.items():
+            stages[stage].extend(values)
+    return {
+        "duration_s": elapsed,
+        "endpoints": endpoints,
+        "stages": {stage: {"count": len(values), **latency_percentiles(values)} for stage, values in sorted(stages.items())},
+    }
+
+
+def latency_percentiles(values: list) -> dict:
+    return {f"p{pct}_ms": percentile(values, pct) * 1000 for pct in (50, 95, 99)}
+
+
+def print_report(summary: dict):
+    rows = []
+    for workload, row in summary["endpoints"].items():
+        rows.append({
+            "name": workload,
+            "requests": row["requests"],
+            "errors": sum(row["errors"].values()),
+            "throughput_rps": row["throughput_rps"],
+            "p50_ms": row["p50_ms"],
+            "p95_ms": row["p95_ms"],
+            "p99_ms": row["p99_ms"],
+            "first_token_p50_ms": row.get("first_token", {}).get("p50_ms"),
+        })
+    print_table(rows, columns=("name", "requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "first_token_p50_ms"))
+    for workload, row in summary["endpoints"].items():
+        if row["errors"]:
+            print(f"{workload} errors: {row['errors']}")
+
+    print()
+    rows = [{"name": stage, **values} for stage, values in summary["stages"].items()]
+    if rows:
+        print_table(rows, columns=("name", "count", "p50_ms", "p95_ms", "p99_ms"))
+
+
+def print_comparison(summary: dict, baseline: dict):
+    """Change of throughput and latency percentiles against an earlier run"""
+    def change(new, old):
+        if not old:
+            return None
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    rows = []
+    for workload, row in summary["endpoints"].items():
+        old = baseline["summary"]["endpoints"].get(workload)
+        if old is None:
+            continue
+        rows.append({
+            "name": workload,
+            "throughput": change(row["throughput_rps"], old["throughput_rps"]),
+            "p50": change(row["p50_ms"], old["p50_ms"]),
+            "p95": change(row["p95_ms"], old["p95_ms"]),
+            "p99": change(row["p99_ms"], old["p99_ms"]),
+        })
+    for stage, values in summary["stages"].items():
+        old = baseline["summary"]["stages"].get(stage)
+        if old is not None:
+            rows.append({"name": f"stage {stage}", "p50": change(values["p50_ms"], old["p50_ms"]),
+                         "p95": change(values["p95_ms"], old["p95_ms"]), "p99": change(values["p99_ms"], old["p99_ms"])})
+    print(f"\nCompared with {baseline.get('started_at')} ({baseline.get('git_commit') or 'unknown commit'}):")
+    print_table(rows, columns=("name", "throughput", "p50", "p95", "p99"))
+
+
+def start_server(kind: str, port: int, timeout: float) -> subprocess.Popen:
+    if kind == "stub":
+        command = [sys.executable, str(Path(__file__).parent / "stub_server.py"), "--port", str(port)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    server = subprocess.Popen(command, cwd=str(BACKEND_DIR), stdout=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"The {kind} server exited with status {server.returncode}")
+        try:
+            health = httpx.get(f"http://127.0.0.1:{port}/health", timeout=2).json()
+            if health["status"] == "healthy":
+                return server
+            if health["status"] == "degraded":
+                print(f"Warning: server is degraded: {health['models']}")
+                return server
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.5)
+    server.kill()
+    raise SystemExit(f"The {kind} server was not ready after {timeout}s")
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown workload {name!r} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=str(BACKEND_DIR), capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["stub", "real"], default="stub", help="Models of the server started here")
+    parser.add_argument("--url", help="Load test this running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds of load before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("text=3,audio=1"), help="Workload weights, e.g. text=3,audio=1,stream=1")
+    parser.add_argument("--samples", default=str(SAMPLES_DIR), help="Folder of .wav files for the audio workloads")
+    parser.add_argument("--unique", action="store_true", help="Make every text and recording unique so caches miss")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/load_<time>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    samples = [(path.name, path.read_bytes()) for path in sorted(Path(args.samples).glob("*.wav"))]
+    if not samples and ({"audio", "batch"} & set(args.mix)):
+        raise SystemExit(f"No .wav files in {args.samples}; run benchmarks/make_samples.py")
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        print(f"Starting the server with {args.server} models...")
+        server = start_server(args.server, args.port, args.startup_timeout)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    started_at = datetime.now(timezone.utc)
+    try:
+        print(f"{args.clients} clients, {args.warmup:g}s warm-up, {args.duration:g}s measured, mix {args.mix}")
+        recorder = asyncio.run(run_load(base_url, args, samples))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    summary = summarize_results(recorder)
+    print()
+    print_report(summary)
+
+    result = {
+        "version": 1,
+        "started_at": started_at.isoformat(),
+        "git_commit": git_commit(),
+        "config": {
+            "server": "external" if args.url else args.server,
+            "clients": args.clients,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "mix": args.mix,
+            "unique": args.unique,
+            "seed": args.seed,
+            "samples": [name for name, _ in samples],
+            # Settings of a server started here, including the stub stage costs
+            "env": {key: value for key, value in sorted(os.environ.items()) if key.startswith(("STUB_", "WHISPER_", "BERT_", "GPT_", "TTS_", "TORCH_", "VAD_", "RESPONSE_CACHE_"))},
+        },
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "summary": summary,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"load_{started_at.strftime('%Y%m%dT%H%M%SZ')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        print_comparison(summary, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
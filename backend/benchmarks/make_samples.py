@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Generate the sample recordings in benchmarks/samples/ used by the load
+test's audio workload. They are synthetic: a voiced pulse train shaped by
+changing vowel formants into syllables, words and pauses over low
+background noise. That gives Whisper, VAD and the decoder the same amount
+of work as speech of the same length; the transcripts are meaningless.
+Put real recordings (16-bit WAV) in the folder to load test with speech.
+
+Usage:
+    python benchmarks/make_samples.py
+"""
+import wave
+from pathlib import Path
+
+import numpy as np
+
+SAMPLES_DIR = Path(__file__).parent / "samples"
+RATE = 16000
+
+# (name, seconds of speech, words)
+SAMPLES = [("short_command", 2.0, 4), ("question", 5.0, 10), ("long_request", 12.0, 24)]
+
+VOWEL_FORMANTS = [(730, 1090), (270, 2290), (530, 1840), (570, 840), (440, 1020), (300, 870)]
+
+
+def resonate(signal: np.ndarray, frequency: float, bandwidth: float) -> np.ndarray:
+    """Two-pole resonator (one formant)"""
+    r = np.exp(-np.pi * bandwidth / RATE)
+    a1, a2 = -2 * r * np.cos(2 * np.pi * frequency / RATE), r * r
+    out = np.zeros_like(signal)
+    for i in range(len(signal)):
+        out[i] = signal[i] - a1 * out[i - 1] - a2 * out[i - 2] if i >= 2 else signal[i]
+    return out
+
+
+def syllable(rng: np.random.Generator, seconds: float) -> np.ndarray:
+    count = int(seconds * RATE)
+    pitch = rng.uniform(110, 190) * np.linspace(1.05, 0.95, count)
+    phase = np.cumsum(pitch / RATE)
+    pulses = (np.diff(np.floor(phase), prepend=0) > 0).astype(np.float64)
+    f1, f2 = VOWEL_FORMANTS[rng.integers(len(VOWEL_FORMANTS))]
+    voiced = resonate(pulses, f1, 90) + 0.5 * resonate(pulses, f2, 120)
+    envelope = np.sin(np.linspace(0, np.pi, count)) ** 0.7
+    return voiced * envelope
+
+
+def make_sample(rng: np.random.Generator, seconds: float, words: int) -> np.ndarray:
+    parts = [np.zeros(int(0.3 * RATE))]
+    word_seconds = seconds / words
+    for index in range(words):
+        syllables = rng.integers(1, 4)
+        for _ in range(syllables):
+            parts.append(syllable(rng, word_seconds * 0.8 / syllables))
+        # Short gaps between words, a longer pause halfway through
+        pause = 0.6 if index == words // 2 else rng.uniform(0.05, 0.15)
+        parts.append(np.zeros(int(pause * RATE)))
+    parts.append(np.zeros(int(0.3 * RATE)))
+    audio = np.concatenate(parts)
+    audio = 0.3 * audio / np.abs(audio).max()
+    return audio + rng.normal(0, 0.002, len(audio))
+
+
+def write_wav(path: Path, audio: np.ndarray):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+
+
+def main():
+    SAMPLES_DIR.mkdir(exist_ok=True)
+    rng = np.random.default_rng(2024)
+    for name, seconds, words in SAMPLES:
+        path = SAMPLES_DIR / f"{name}.wav"
+        audio = make_sample(rng, seconds, words)
+        write_wav(path, audio)
+        print(f"{path}: {len(audio) / RATE:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the OpenAI chat completions API, for testing and benchmarking
+the OpenAI path without network access or cost. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:8089/v1 (any OPENAI_API_KEY works).
+
+Replies take --latency-ms (plus up to --jitter-ms) and stream in
+--chunks pieces when stream=true. A share of requests fail: --error-rate
+of them with 500, --rate-limit-rate with 429 and a Retry-After header, and
+--stall-rate never answer within the client's timeout.
+
+Usage:
+    python benchmarks/openai_stub.py --port 8089 --latency-ms 400 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY = "Sure, here is a short answer from the stub server. It streams like the real API does."
+
+
+def create_app(latency_ms: float, jitter_ms: float, chunks: int, error_rate: float,
+               rate_limit_rate: float, stall_rate: float) -> FastAPI:
+    app = FastAPI()
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0, "stalled": 0, "in_flight": 0, "max_in_flight": 0}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        roll = random.random()
+        if roll < error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=500, content={"error": {"message": "stub server error", "type": "server_error"}})
+        if roll < error_rate + rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "stub rate limit", "type": "rate_limit_error"}},
+                headers={"Retry-After": "0.2"}
+            )
+
+        if roll < error_rate + rate_limit_rate + stall_rate:
+            # Hangs until the client gives up and disconnects
+            stats["stalled"] += 1
+            await asyncio.sleep(3600)
+
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        delay = (latency_ms + random.uniform(0, jitter_ms)) / 1000
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "gpt-3.5-turbo")
+
+        if not body.get("stream"):
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                stats["in_flight"] -= 1
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": REPLY},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 20, "completion_tokens": 20, "total_tokens": 40}
+            }
+
+        words = REPLY.split(" ")
+        size = max(1, -(-len(words) // chunks))
+        pieces = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+
+        async def events():
+            try:
+                for piece in pieces:
+                    await asyncio.sleep(delay / len(pieces))
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--chunks", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = create_app(args.latency_ms, args.jitter_ms, args.chunks, args.error_rate, args.rate_limit_rate, args.stall_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
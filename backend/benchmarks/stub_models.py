@@ -0,0 +1,123 @@
+"""
+Stand-in models for load testing the server without model weights, a GPU
+or network access. Each stage sleeps for a configurable time instead of
+running its model, so a load test measures the serving path itself
+(admission queues, executors, batching, streaming, caching, file I/O)
+with stage latencies of a known size. Sleeping does not use the CPU, so
+stubbed runs do not show contention between models for cores; use real
+models for capacity numbers.
+
+install() patches the services created by app.main and must run before
+the app starts (before the model registry loads anything).
+"""
+import hashlib
+import os
+import time
+
+import numpy as np
+
+from app.services.audio_decoder import SAMPLE_RATE
+
+# Stage costs, overridable with STUB_* environment variables
+WHISPER_RTF = float(os.getenv("STUB_WHISPER_RTF", 0.1))  # seconds per second of audio
+WHISPER_BATCH_DISCOUNT = float(os.getenv("STUB_WHISPER_BATCH_DISCOUNT", 0.5))  # batched segments cost this share
+BERT_BATCH_MS = float(os.getenv("STUB_BERT_BATCH_MS", 15))
+BERT_TEXT_MS = float(os.getenv("STUB_BERT_TEXT_MS", 1))
+GPT_TOKEN_MS = float(os.getenv("STUB_GPT_TOKEN_MS", 20))
+TTS_CHAR_MS = float(os.getenv("STUB_TTS_CHAR_MS", 2))
+
+STUB_REPLY = "Sure, I can help with that. Here is a short answer from the stub model."
+
+
+class StubWhisperModel:
+    """Answers model.transcribe like openai-whisper after WHISPER_RTF x duration"""
+
+    def transcribe(self, audio, **kwargs):
+        if isinstance(audio, str):
+            seconds = 3.0
+        else:
+            seconds = len(audio) / SAMPLE_RATE
+        time.sleep(seconds * WHISPER_RTF)
+        return {"text": f" Stub transcript of {seconds:.1f} seconds of audio."}
+
+
+def stub_embed(texts: list) -> np.ndarray:
+    """Deterministic pseudo-embeddings after one batched forward pass worth of sleep"""
+    time.sleep((BERT_BATCH_MS + BERT_TEXT_MS * len(texts)) / 1000)
+    rows = []
+    for text in texts:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        rows.append(np.random.default_rng(seed).standard_normal(768).astype(np.float32))
+    return np.stack(rows)
+
+
+class StubTTS:
+    """gTTS replacement: TTS_CHAR_MS per character, a few bytes of MP3-like output"""
+
+    def __init__(self, text, lang="en", slow=False):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        # An ID3 header and one silent MPEG-1 layer III frame per 10
+        # characters, written as they are "synthesized" like gTTS parts
+        fp.write(b"ID3\x03\x00\x00\x00\x00\x00\x00")
+        for _ in range(max(1, len(self.text) // 10)):
+            time.sleep(10 * TTS_CHAR_MS / 1000)
+            fp.write(b"\xff\xfb\x90\x64" + bytes(413))
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            self.write_to_fp(f)
+
+
+def install(main):
+    """Replace the models of the services in app.main with the stubs above"""
+    import app.services.tts_service as tts_module
+    from app.services.intent_engine import CentroidIntentClassifier, load_examples
+
+    whisper_service = main.whisper_service
+    if whisper_service.processes > 0:
+        raise SystemExit("Stub models need WHISPER_PROCESSES=0")
+
+    def load_whisper():
+        whisper_service.model = StubWhisperModel()
+
+    def decode_batch(segments):
+        seconds = sum(len(segment) for segment in segments) / SAMPLE_RATE
+        time.sleep(seconds * WHISPER_RTF * WHISPER_BATCH_DISCOUNT)
+        return [f"Stub transcript of {len(segment) / SAMPLE_RATE:.1f} seconds of audio." for segment in segments]
+
+    whisper_service._load_model = load_whisper
+    whisper_service._decode_batch_sync = decode_batch
+
+    bert_service = main.bert_service
+
+    def load_bert():
+        bert_service.tokenizer = bert_service.model = "stub"
+        if bert_service.engine in ("hybrid", "embedding"):
+            bert_service.centroid_classifier = CentroidIntentClassifier.from_examples(stub_embed, load_examples())
+
+    bert_service._load_model = load_bert
+    bert_service._embed = stub_embed
+
+    gpt_service = main.gpt_service
+
+    def load_gpt():
+        gpt_service.local_model = "stub"
+
+    def stream_reply(user_input, intent, emit):
+        for index, word in enumerate(STUB_REPLY.split(" ")):
+            time.sleep(GPT_TOKEN_MS / 1000)
+            emit(word if index == 0 else " " + word)
+
+    def generate_reply(user_input, intent):
+        time.sleep(len(STUB_REPLY.split(" ")) * GPT_TOKEN_MS / 1000)
+        return STUB_REPLY
+
+    gpt_service._initialize = load_gpt
+    gpt_service.warmup = lambda: None
+    gpt_service._stream_response_sync = stream_reply
+    gpt_service._generate_response_sync = generate_reply
+
+    tts_module.gTTS = StubTTS
+    main.tts_service.backend = tts_module.GTTSBackend()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Run the API server with the stand-in models of stub_models.py, for load
+testing without model weights or network access. It runs in a temporary
+working directory so stub audio never lands in the real generated_audio/
+cache (or the response cache).
+
+Usage:
+    python benchmarks/stub_server.py --port 8000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import common  # noqa: F401  (sets up sys.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    os.environ["WHISPER_PROCESSES"] = "0"
+    workdir = tempfile.mkdtemp(prefix="voice-assistant-stub-")
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import uvicorn
+    import app.main as main_module
+    import stub_models
+
+    stub_models.install(main_module)
+    print(f"Serving with stub models from {workdir}")
+    uvicorn.run(main_module.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
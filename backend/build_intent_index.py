@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Precompute the intent centroid index for the configured BERT model so the
+server loads it at startup instead of embedding the examples on each boot.
+An index that is already up to date is kept; --rebuild builds it anyway.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rebuild", action="store_true", help="Build the index even if it is up to date")
+    args = parser.parse_args()
+
+    from app.services.bert_service import BertService
+    from app.services.intent_engine import index_path
+
+    service = BertService()
+    # Only the engines that use the index build it (whatever INTENT_ENGINE says)
+    service.engine = "hybrid"
+    path = index_path(service.index_name)
+    if args.rebuild:
+        path.unlink(missing_ok=True)
+
+    # Loading BERT loads the index, or builds and saves it if missing or stale
+    service.load()
+    print(f"{len(service.centroid_classifier.intents)} intent centroids in {path}")
@@ -19,14 +19,18 @@ if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
     
+    # Auto-reload restarts the server, and reloads every model, on each
+    # source change; enable it for development only
+    reload = os.getenv("RELOAD", "false").lower() == "true"
+    
     print(f"Starting Voice Assistant API server on {host}:{port}")
-    print("Make sure all models are loaded before making requests...")
+    print("Models load in the background; GET /health reports when each is ready")
     
     uvicorn.run(
         "app.main:app",
         host=host,
         port=port,
-        reload=True,
+        reload=reload,
         log_level="info"
     )
 
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Pre-fork server for the Voice Assistant API
+
+Every model is loaded once in this (parent) process, then WORKERS worker
+processes are forked, each running app.main:app on the same listening
+socket. Model weights are allocated before the fork, so the workers share
+those pages copy-on-write instead of holding one copy each; inference only
+reads the weights, so the pages stay shared.
+
+The parent prints the memory of itself and each worker (RSS, and PSS,
+which splits shared pages between the processes using them) once the
+workers are up, every PREFORK_REPORT_INTERVAL_S seconds and on SIGUSR1.
+Workers that exit are restarted. A worker that exits within
+PREFORK_MIN_UPTIME_S of starting is restarted after an exponential
+backoff, and after PREFORK_MAX_FAST_FAILURES such exits in a row the
+server shuts down instead of re-forking a worker that cannot start.
+
+Note that /metrics and /health describe the worker that answers the request.
+
+Usage:
+    WORKERS=4 python serve_prefork.py
+"""
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# The fast tokenizers' thread pool does not survive a fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+# Whisper worker processes would be started in the parent and be unusable
+# in the forked workers; the workers are the parallelism here
+if int(os.getenv("WHISPER_PROCESSES", 0)) > 0:
+    print("WHISPER_PROCESSES is ignored in pre-fork mode")
+    os.environ["WHISPER_PROCESSES"] = "0"
+
+
+def read_memory(pid: int) -> dict:
+    """Memory of a process in MB, from /proc/<pid>/smaps_rollup (Linux)"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return {}
+    return {
+        "rss_mb": fields.get("Rss", 0),
+        "pss_mb": fields.get("Pss", 0),
+        "shared_mb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_mb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def print_memory_report(workers: dict):
+    """Print RSS/PSS per process; the PSS total is the real footprint"""
+    columns = ("rss_mb", "pss_mb", "shared_mb", "private_mb")
+    print(f"{'process':<10}{'pid':>8}" + "".join(f"{col:>12}" for col in columns))
+    processes = [("parent", os.getpid())] + [
+        (f"worker {index}", pid) for pid, index in sorted(workers.items(), key=lambda item: item[1])
+    ]
+    total_rss = total_pss = 0
+    for name, pid in processes:
+        memory = read_memory(pid)
+        if not memory:
+            print(f"{name:<10}{pid:>8}{'n/a':>12}")
+            continue
+        total_rss += memory["rss_mb"]
+        total_pss += memory["pss_mb"]
+        print(f"{name:<10}{pid:>8}" + "".join(f"{memory[col]:>12.1f}" for col in columns))
+    print(f"Total: {total_pss:.1f} MB PSS (sum of RSS would suggest {total_rss:.1f} MB)")
+
+
+def run_worker(sock: socket.socket, torch_threads: int):
+    """Serve the app on the inherited socket (runs in the forked child)"""
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1):
+        signal.signal(signum, signal.SIG_DFL)
+
+    import torch
+    # Forked workers would otherwise all sample the same random sequence
+    torch.seed()
+    torch.set_num_threads(torch_threads)
+
+    from app.main import app
+    config = uvicorn.Config(app, log_level=os.getenv("LOG_LEVEL", "info"))
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    if not hasattr(os, "fork"):
+        raise SystemExit("Pre-fork mode needs os.fork (Linux or macOS); use run.py instead")
+
+    port = int(os.getenv("PORT", 8000))
+    host = os.getenv("HOST", "0.0.0.0")
+    worker_count = max(1, int(os.getenv("WORKERS", 2)))
+    # Split the cores between workers instead of every worker using all of them
+    torch_threads = int(os.getenv("TORCH_THREADS_PER_WORKER", 0)) or max(1, (os.cpu_count() or 1) // worker_count)
+    report_interval = float(os.getenv("PREFORK_REPORT_INTERVAL_S", 0))
+    min_uptime = float(os.getenv("PREFORK_MIN_UPTIME_S", 10))
+    max_fast_failures = int(os.getenv("PREFORK_MAX_FAST_FAILURES", 5))
+
+    # Every worker has its own in-memory audio store, so an audio URL
+    # answered by another worker than the reply's would be a 404
+    if worker_count > 1 and os.getenv("TTS_DELIVERY", "disk").strip().lower() == "memory":
+        print("TTS_DELIVERY=memory is not shared between workers; using disk delivery")
+        os.environ["TTS_DELIVERY"] = "disk"
+
+    from app.main import models, preload_names
+
+    start = time.perf_counter()
+    models.load_in_process(preload_names())
+    print(f"Models loaded in {time.perf_counter() - start:.1f}s")
+    print_memory_report({})
+
+    # Objects created so far are never collected; without this the garbage
+    # collector writes to their headers and un-shares their pages
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    workers = {}  # pid -> worker index
+    started_at = {}  # worker index -> time.monotonic() of its last fork
+    fast_failures = {}  # worker index -> exits within min_uptime in a row
+    restarts = {}  # worker index -> time.monotonic() to fork it again
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(sock, torch_threads)
+            except BaseException as e:
+                print(f"Worker {index} failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = index
+        started_at[index] = time.monotonic()
+
+    for index in range(worker_count):
+        spawn(index)
+    print(f"Serving on {host}:{port} with {worker_count} workers ({torch_threads} torch threads each)")
+
+    stopping = False
+    report_requested = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def request_report(signum, frame):
+        nonlocal report_requested
+        report_requested = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGUSR1, request_report)
+
+    # First report once the workers have started and warmed up their models
+    next_report = time.monotonic() + 10
+    exit_code = 0
+    while workers or (restarts and not stopping):
+        for index, due in list(restarts.items()):
+            if stopping:
+                break
+            if time.monotonic() >= due:
+                del restarts[index]
+                spawn(index)
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            if restarts and not stopping:
+                time.sleep(0.5)
+                continue
+            break
+        if pid == 0:
+            if report_requested or (next_report and time.monotonic() >= next_report):
+                report_requested = False
+                next_report = time.monotonic() + report_interval if report_interval > 0 else None
+                print_memory_report(workers)
+            time.sleep(0.5)
+            continue
+
+        index = workers.pop(pid)
+        if stopping:
+            continue
+        if time.monotonic() - started_at[index] < min_uptime:
+            fast_failures[index] = fast_failures.get(index, 0) + 1
+        else:
+            fast_failures[index] = 0
+        failures = fast_failures[index]
+        if max_fast_failures > 0 and failures >= max_fast_failures:
+            print(f"Worker {index} (pid {pid}) exited with status {status} {failures} times in a row "
+                  f"within {min_uptime:g}s of starting; shutting down")
+            exit_code = 1
+            stop(None, None)
+            continue
+        # Back off 1, 2, 4, ... seconds (at most 60) while it keeps failing fast
+        delay = min(60, 2 ** (failures - 1)) if failures else 0
+        print(f"Worker {index} (pid {pid}) exited with status {status}; restarting" + (f" in {delay}s" if delay else ""))
+        restarts[index] = time.monotonic() + delay
+
+    sock.close()
+    if exit_code:
+        sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
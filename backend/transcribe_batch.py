@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Transcribe many audio files from the command line with batched Whisper
+decoding, writing one NDJSON line per file ({"file", "text"}) to stdout or
+--output as files complete.
+
+With --url the files are sent to a running server's batch endpoint
+instead of loading Whisper here (add --downstream for intent, response
+and TTS as well).
+
+Usage:
+    python transcribe_batch.py recordings/*.wav > transcripts.ndjson
+    python transcribe_batch.py --url http://localhost:8000 --downstream recordings/*.wav
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+async def transcribe_local(paths: list, output):
+    from app.services.audio_decoder import decode_audio
+    from app.services.vad import VoiceActivityDetector
+    from app.services.whisper_service import WhisperService
+
+    service = WhisperService()
+    service.load()
+    vad = VoiceActivityDetector()
+
+    recordings = [vad.segments(decode_audio(Path(path).read_bytes())) for path in paths]
+    async for index, text in service.transcribe_many(recordings):
+        output.write(json.dumps({"file": paths[index], "text": text}) + "\n")
+        output.flush()
+
+
+async def transcribe_remote(paths: list, url: str, downstream: bool, output):
+    import httpx
+
+    files = [("files", (Path(path).name, Path(path).read_bytes())) for path in paths]
+    async with httpx.AsyncClient(timeout=None) as client:
+        async with client.stream(
+            "POST",
+            f"{url.rstrip('/')}/api/voice/transcribe/batch",
+            params={"downstream": str(downstream).lower()},
+            files=files
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise SystemExit(f"Server returned {response.status_code}: {response.text}")
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                if "index" in result:
+                    result = {"file": paths[result.pop("index")], **result}
+                    result.pop("filename", None)
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="Audio files (WAV, WebM, MP3, ...)")
+    parser.add_argument("--output", "-o", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--url", help="Send the files to this server instead of transcribing locally")
+    parser.add_argument("--downstream", action="store_true", help="With --url, also return intent, response and TTS")
+    args = parser.parse_args()
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.url:
+            asyncio.run(transcribe_remote(args.files, args.url, args.downstream, output))
+        else:
+            asyncio.run(transcribe_local(args.files, output))
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,16 @@ class VoiceAssistant {
         this.lastUserMessage = null;
         // Backend API URL - defaults to port 8000, can be overridden
         this.apiBaseUrl = window.API_BASE_URL || 'http://localhost:8000';
+        // Stream audio over a WebSocket while recording (falls back to upload)
+        this.useStreaming = window.STREAMING_TRANSCRIPTION !== false && 'WebSocket' in window;
+        this.socket = null;
+        this.audioContext = null;
+        this.audioSource = null;
+        this.audioProcessor = null;
+        this.partialMessage = null;
+        // Sentence audio segments queued for playback while a reply streams
+        this.audioQueue = [];
+        this.audioPlaying = false;
         
         this.initializeElements();
         this.setupEventListeners();
@@ -31,6 +41,8 @@ class VoiceAssistant {
     setupEventListeners() {
         this.recordBtn.addEventListener('click', () => this.toggleRecording());
         this.sendTextBtn.addEventListener('click', () => this.sendTextMessage());
+        this.audioPlayer.addEventListener('ended', () => this.playNextSegment());
+        this.audioPlayer.addEventListener('error', () => this.playNextSegment());
         this.textInput.addEventListener('keypress', (e) => {
             if (e.key === 'Enter') {
                 this.sendTextMessage();
@@ -57,6 +69,16 @@ class VoiceAssistant {
     }
 
     async startRecording() {
+        if (this.useStreaming) {
+            try {
+                await this.startStreaming();
+                return;
+            } catch (error) {
+                console.warn('Streaming unavailable, falling back to upload:', error);
+                this.stopStreaming();
+            }
+        }
+
         try {
             const stream = await navigator.mediaDevices.getUserMedia({ 
                 audio: {
@@ -95,6 +117,10 @@ class VoiceAssistant {
     }
 
     stopRecording() {
+        if (this.socket && this.isRecording) {
+            this.finishStreaming();
+            return;
+        }
         if (this.mediaRecorder && this.isRecording) {
             this.mediaRecorder.stop();
             this.isRecording = false;
@@ -102,6 +128,154 @@ class VoiceAssistant {
         }
     }
 
+    async startStreaming() {
+        await this.checkBackendConnection();
+
+        const stream = await navigator.mediaDevices.getUserMedia({
+            audio: {
+                channelCount: 1,
+                echoCancellation: true,
+                noiseSuppression: true
+            }
+        });
+        // Set before connecting so stopStreaming() releases the microphone
+        // if the connection fails
+        this.mediaStream = stream;
+
+        const wsUrl = this.apiBaseUrl.replace(/^http/, 'ws') + '/api/voice/stream?format=pcm16';
+        const socket = new WebSocket(wsUrl);
+        socket.binaryType = 'arraybuffer';
+        await new Promise((resolve, reject) => {
+            socket.onopen = resolve;
+            socket.onerror = () => reject(new Error('WebSocket connection failed'));
+        });
+
+        this.socket = socket;
+        this.loadingId = null;
+        socket.onmessage = (event) => this.handleStreamMessage(JSON.parse(event.data));
+        socket.onclose = () => {
+            this.removeLoadingMessage(this.loadingId);
+            this.stopStreaming();
+        };
+
+        // Capture raw samples and send them as 16 kHz mono int16 PCM
+        this.audioContext = new (window.AudioContext || window.webkitAudioContext)();
+        this.audioSource = this.audioContext.createMediaStreamSource(stream);
+        this.audioProcessor = this.audioContext.createScriptProcessor(4096, 1, 1);
+        this.audioProcessor.onaudioprocess = (event) => {
+            if (this.socket && this.socket.readyState === WebSocket.OPEN && this.isRecording) {
+                const samples = event.inputBuffer.getChannelData(0);
+                this.socket.send(this.toPcm16(samples, this.audioContext.sampleRate));
+            }
+        };
+        this.audioSource.connect(this.audioProcessor);
+        this.audioProcessor.connect(this.audioContext.destination);
+
+        this.isRecording = true;
+        this.updateRecordingUI(true);
+    }
+
+    toPcm16(samples, inputRate) {
+        // Downsample by averaging, then convert float [-1, 1] to int16
+        const ratio = inputRate / 16000;
+        const length = Math.floor(samples.length / ratio);
+        const pcm = new Int16Array(length);
+        for (let i = 0; i < length; i++) {
+            const start = Math.floor(i * ratio);
+            const end = Math.min(samples.length, Math.floor((i + 1) * ratio));
+            let sum = 0;
+            for (let j = start; j < end; j++) {
+                sum += samples[j];
+            }
+            const value = Math.max(-1, Math.min(1, sum / Math.max(1, end - start)));
+            pcm[i] = value < 0 ? value * 0x8000 : value * 0x7fff;
+        }
+        return pcm.buffer;
+    }
+
+    finishStreaming() {
+        // Stop capturing and ask the server for the final transcript
+        this.isRecording = false;
+        this.updateRecordingUI(false);
+        this.releaseAudioCapture();
+        if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+            this.socket.send(JSON.stringify({ event: 'end' }));
+            if (!this.loadingId) {
+                this.loadingId = this.showLoadingMessage();
+            }
+        }
+    }
+
+    releaseAudioCapture() {
+        if (this.audioProcessor) {
+            this.audioProcessor.disconnect();
+            this.audioProcessor = null;
+        }
+        if (this.audioSource) {
+            this.audioSource.disconnect();
+            this.audioSource = null;
+        }
+        if (this.audioContext) {
+            this.audioContext.close();
+            this.audioContext = null;
+        }
+        if (this.mediaStream) {
+            this.mediaStream.getTracks().forEach(track => track.stop());
+            this.mediaStream = null;
+        }
+    }
+
+    stopStreaming() {
+        this.releaseAudioCapture();
+        if (this.socket) {
+            if (this.socket.readyState === WebSocket.OPEN) {
+                this.socket.close();
+            }
+            this.socket = null;
+        }
+        if (this.isRecording) {
+            this.isRecording = false;
+            this.updateRecordingUI(false);
+        }
+    }
+
+    handleStreamMessage(message) {
+        if (message.type === 'partial') {
+            this.showPartialTranscript(message.text);
+        } else if (message.type === 'final') {
+            // The server detected the end of speech or we asked it to stop
+            if (this.isRecording) {
+                this.finishStreaming();
+            }
+            this.showPartialTranscript(message.text);
+            this.partialMessage = null;
+            this.lastUserMessage = message.text;
+        } else if (message.type === 'response') {
+            this.removeLoadingMessage(this.loadingId);
+            this.loadingId = null;
+            this.handleResponse(message);
+        } else if (message.type === 'error') {
+            this.removeLoadingMessage(this.loadingId);
+            this.loadingId = null;
+            if (this.partialMessage) {
+                this.partialMessage.remove();
+                this.partialMessage = null;
+            }
+            this.lastUserMessage = null;
+            this.addMessage('assistant', `Sorry, I encountered an error processing your voice: ${message.detail}. Please try again.`);
+        }
+    }
+
+    showPartialTranscript(text) {
+        if (!text) return;
+        if (!this.partialMessage) {
+            this.addMessage('user', text);
+            this.partialMessage = this.conversation.lastElementChild;
+        } else {
+            this.partialMessage.querySelector('.message-text').textContent = text;
+        }
+    }
+
     async processRecording() {
         try {
             const audioBlob = new Blob(this.audioChunks, { type: 'audio/webm;codecs=opus' });
@@ -189,7 +363,8 @@ class VoiceAssistant {
             // First check if backend is reachable
             await this.checkBackendConnection();
 
-            const response = await fetch(`${this.apiBaseUrl}/api/text/process`, {
+            // Stream the reply so text shows up as it is generated
+            const response = await fetch(`${this.apiBaseUrl}/api/text/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -209,7 +384,7 @@ class VoiceAssistant {
                 throw new Error(errorMessage);
             }
 
-            const data = await response.json();
+            const data = await this.readEventStream(response, loadingId);
             this.handleResponse(data);
 
         } catch (error) {
@@ -228,6 +403,58 @@ class VoiceAssistant {
         }
     }
 
+    async readEventStream(response, loadingId) {
+        // Parse server-sent events, showing tokens in the loading message
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let streamedText = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let eventData = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        eventName = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        eventData += line.slice(5).trim();
+                    }
+                });
+                const payload = eventData ? JSON.parse(eventData) : {};
+
+                if (eventName === 'token') {
+                    streamedText += payload.text;
+                    this.updateLoadingText(loadingId, streamedText);
+                } else if (eventName === 'audio') {
+                    this.enqueueAudioSegment(payload.url);
+                } else if (eventName === 'done') {
+                    return payload;
+                } else if (eventName === 'error') {
+                    throw new Error(payload.detail || 'Streaming failed');
+                }
+            }
+        }
+        throw new Error('Response stream ended unexpectedly');
+    }
+
+    updateLoadingText(loadingId, text) {
+        const loadingMsg = document.getElementById(loadingId);
+        if (!loadingMsg) return;
+        const textDiv = loadingMsg.querySelector('.message-text');
+        textDiv.classList.remove('loading-text');
+        textDiv.textContent = text;
+        this.conversation.scrollTop = this.conversation.scrollHeight;
+    }
+
     async checkBackendConnection() {
         try {
             const response = await fetch(`${this.apiBaseUrl}/health`, {
@@ -337,7 +564,7 @@ class VoiceAssistant {
             const playBtn = document.createElement('button');
             playBtn.className = 'action-btn';
             playBtn.innerHTML = '🔊 Play Audio';
-            playBtn.onclick = () => this.playAudio(audioUrl);
+            playBtn.onclick = () => this.replayAudio(audioUrl);
             
             actionsDiv.appendChild(playBtn);
             contentDiv.appendChild(actionsDiv);
@@ -423,11 +650,38 @@ class VoiceAssistant {
         }
     }
 
+    enqueueAudioSegment(audioUrl) {
+        // Start speaking the first sentence while later ones are synthesized
+        this.audioQueue.push(audioUrl);
+        if (!this.audioPlaying) {
+            this.playNextSegment();
+        }
+    }
+
+    replayAudio(audioUrl) {
+        // Go through the queue so streamed segments wait for the replay to end
+        this.audioQueue = [audioUrl];
+        this.playNextSegment();
+    }
+
+    playNextSegment() {
+        const next = this.audioQueue.shift();
+        if (!next) {
+            this.audioPlaying = false;
+            return;
+        }
+        this.audioPlaying = true;
+        this.playAudio(next);
+    }
+
     playAudio(audioUrl) {
         const fullUrl = `${this.apiBaseUrl}${audioUrl}`;
         this.audioPlayer.src = fullUrl;
         this.audioPlayer.play().catch(error => {
             console.error('Error playing audio:', error);
+            // e.g. autoplay blocked: drop the queued segments
+            this.audioQueue = [];
+            this.audioPlaying = false;
         });
     }
 
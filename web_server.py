@@ -2,16 +2,45 @@
 """
 Simple HTTP server for the web frontend
 Runs on port 3000 by default, connects to backend API on port 8000
+
+WEB_SERVER_MODE=threaded (default) serves every client on its own thread
+and WEB_SERVER_MODE=asyncio on one event loop, both from assets kept in
+memory, with precomputed gzip (and brotli, if the brotli package is
+installed) variants, ETag/Cache-Control headers and 304 responses.
+WEB_SERVER_MODE=simple is the single-threaded SimpleHTTPRequestHandler
+server, which rereads files for each request.
 """
+import asyncio
+import email.message
+import gzip
+import hashlib
+import http
 import http.server
+import mimetypes
 import socketserver
 import os
+import threading
 from pathlib import Path
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION = "gzip and brotli" if brotli is not None else "gzip"
+
 # Get the project root directory
 BASE_DIR = Path(__file__).parent
 WEB_DIR = BASE_DIR / "web"
 
+# Text assets worth compressing
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".svg", ".txt", ".map"}
+# index.html is always revalidated (a 304 when unchanged); other assets
+# are reused for this long before the browser revalidates them
+STATIC_MAX_AGE = int(os.getenv("WEB_STATIC_MAX_AGE_S", 300))
+# Reload an asset when its file changes (one stat per request)
+RELOAD = os.getenv("WEB_RELOAD", "false").lower() == "true"
+
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=str(WEB_DIR), **kwargs)
@@ -49,9 +78,230 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         if not self.path.startswith('/static/'):
             print(f"📄 {self.path}")
 
+
+class Asset:
+    """A file's bytes, its compressed variants and validators, in memory"""
+    
+    def __init__(self, path: Path):
+        data = path.read_bytes()
+        self.path = path
+        self.mtime = path.stat().st_mtime_ns
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or path.suffix in (".js", ".json", ".svg"):
+            content_type += "; charset=utf-8"
+        self.content_type = content_type
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        
+        # encoding -> (body, ETag); each variant needs its own strong ETag
+        self.variants = {"identity": (data, f'"{digest}"')}
+        if path.suffix in COMPRESSIBLE:
+            compressed = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(data, quality=11)
+            for encoding, body in compressed.items():
+                if len(body) < len(data):
+                    self.variants[encoding] = (body, f'"{digest}-{encoding}"')
+        
+        if path.name == "index.html":
+            self.cache_control = "no-cache"
+        else:
+            self.cache_control = f"public, max-age={STATIC_MAX_AGE}"
+    
+    def negotiate(self, accept_encoding: str) -> str:
+        """The smallest variant the client accepts"""
+        accepted = set()
+        for part in accept_encoding.split(","):
+            coding, _, params = part.partition(";")
+            quality = params.strip().replace(" ", "").removeprefix("q=")
+            try:
+                if quality and float(quality) == 0:
+                    continue
+            except ValueError:
+                continue
+            accepted.add(coding.strip().lower())
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return "identity"
+    
+    def matches(self, if_none_match: str) -> bool:
+        """If-None-Match names any variant (the content is the same)"""
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return any(etag in tags for _, etag in self.variants.values())
+
+
+class AssetStore:
+    """Every file under WEB_DIR, loaded once at startup"""
+    
+    def __init__(self, root: Path):
+        self.root = root.resolve()
+        self._assets = {}
+        self._lock = threading.Lock()
+        for path in sorted(self.root.rglob("*")):
+            if path.is_file() and not path.name.startswith("."):
+                self._assets["/" + path.relative_to(self.root).as_posix()] = Asset(path)
+        # The root serves the page template
+        self._assets["/"] = self._assets.get("/templates/index.html")
+    
+    def __len__(self):
+        return len({id(asset) for asset in self._assets.values() if asset is not None})
+    
+    def get(self, url_path: str):
+        asset = self._assets.get(url_path)
+        if asset is not None and RELOAD:
+            try:
+                if asset.path.stat().st_mtime_ns != asset.mtime:
+                    fresh = Asset(asset.path)
+                    with self._lock:
+                        for key, value in self._assets.items():
+                            if value is asset:
+                                self._assets[key] = fresh
+                    asset = fresh
+            except FileNotFoundError:
+                return None
+        return asset
+    
+    def respond(self, method: str, url_path: str, headers):
+        """(status, response headers, body) for a request; headers is a case-insensitive mapping"""
+        cors = [
+            ("Access-Control-Allow-Origin", "*"),
+            ("Access-Control-Allow-Methods", "GET, POST, OPTIONS"),
+            ("Access-Control-Allow-Headers", "Content-Type"),
+        ]
+        if method == "OPTIONS":
+            return 204, cors, b""
+        if method not in ("GET", "HEAD"):
+            return 405, cors + [("Allow", "GET, HEAD, OPTIONS")], b""
+        
+        asset = self.get(url_path.split('?')[0] or '/')
+        if asset is None:
+            return 404, cors + [("Content-Type", "text/plain; charset=utf-8")], b"Not found"
+        
+        encoding = asset.negotiate(headers.get("Accept-Encoding", ""))
+        body, etag = asset.variants[encoding]
+        response_headers = cors + [
+            ("ETag", etag),
+            ("Cache-Control", asset.cache_control),
+            ("Vary", "Accept-Encoding"),
+        ]
+        if asset.matches(headers.get("If-None-Match", "")):
+            return 304, response_headers, b""
+        response_headers.append(("Content-Type", asset.content_type))
+        if encoding != "identity":
+            response_headers.append(("Content-Encoding", encoding))
+        return 200, response_headers, body
+
+
+class AssetRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the AssetStore; HTTP/1.1 so browsers keep connections open"""
+    
+    protocol_version = "HTTP/1.1"
+    server_version = "VoiceAssistantWeb"
+    # Headers and body go out in separate writes; without TCP_NODELAY the
+    # body waits for the client's delayed ACK on a kept-alive connection
+    disable_nagle_algorithm = True
+    assets = None
+    
+    def do_GET(self):
+        self._serve()
+    
+    do_HEAD = do_OPTIONS = do_POST = do_GET
+    
+    def _serve(self):
+        status, headers, body = self.assets.respond(self.command, self.path, self.headers)
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        if status == 405:
+            # The request body was not read
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        if not self.path.startswith('/static/'):
+            print(f"📄 {self.path}")
+
+
+class AsyncAssetServer:
+    """
+    The AssetStore on one asyncio event loop: no thread per connection, so
+    thousands of idle keep-alive connections cost little. Requests are
+    parsed minimally (request line and headers; bodies are not accepted).
+    """
+    
+    def __init__(self, port: int, assets: AssetStore):
+        self.port = port
+        self.assets = assets
+        # Connections idle this long between requests are closed
+        self.keepalive_timeout = float(os.getenv("WEB_KEEPALIVE_TIMEOUT_S", 15))
+    
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), self.keepalive_timeout)
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    break
+                method, target, version = parts
+                headers = email.message.Message()
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), self.keepalive_timeout)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip()] = value.strip()
+                
+                connection = headers.get("Connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                status, response_headers, body = self.assets.respond(method, target, headers)
+                if status == 405:
+                    keep_alive = False
+                if not target.startswith('/static/'):
+                    print(f"📄 {target}")
+                
+                lines = [f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}"]
+                lines.extend(f"{name}: {value}" for name, value in response_headers)
+                if status != 304:
+                    lines.append(f"Content-Length: {len(body)}")
+                lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+                head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+                writer.write(head if method == "HEAD" else head + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+    
+    async def serve_forever(self):
+        server = await asyncio.start_server(self.handle, port=self.port, reuse_address=True)
+        async with server:
+            await server.serve_forever()
+
+
+def make_server(port: int, mode: str):
+    if mode == "simple":
+        return socketserver.TCPServer(("", port), CustomHTTPRequestHandler)
+    if mode == "threaded":
+        AssetRequestHandler.assets = AssetStore(WEB_DIR)
+        server = http.server.ThreadingHTTPServer(("", port), AssetRequestHandler)
+        server.daemon_threads = True
+        return server
+    raise Exception(f"Unknown WEB_SERVER_MODE: {mode} (use threaded, asyncio or simple)")
+
+
 if __name__ == "__main__":
     PORT = int(os.getenv("WEB_PORT", 3000))
     BACKEND_PORT = int(os.getenv("BACKEND_PORT", 8000))
+    MODE = os.getenv("WEB_SERVER_MODE", "threaded").lower()
     
     if not WEB_DIR.exists():
         print(f"❌ Error: Web directory not found at {WEB_DIR}")
@@ -62,9 +312,23 @@ if __name__ == "__main__":
     print(f"🔌 Backend API should be running on http://localhost:{BACKEND_PORT}")
     print(f"📱 Open your browser: http://localhost:{PORT}")
     print("=" * 60)
-    print("\nPress Ctrl+C to stop the server\n")
     
-    with socketserver.TCPServer(("", PORT), CustomHTTPRequestHandler) as httpd:
+    if MODE == "asyncio":
+        assets = AssetStore(WEB_DIR)
+        print(f"⚡ Serving {len(assets)} assets from memory ({COMPRESSION}) on an event loop")
+        print("\nPress Ctrl+C to stop the server\n")
+        try:
+            asyncio.run(AsyncAssetServer(PORT, assets).serve_forever())
+        except KeyboardInterrupt:
+            print("\n\n👋 Server stopped")
+        exit(0)
+    
+    with make_server(PORT, MODE) as httpd:
+        if MODE == "threaded":
+            print(f"⚡ Serving {len(AssetRequestHandler.assets)} assets from memory ({COMPRESSION})")
+        else:
+            print("🐢 Serving files from disk on a single thread")
+        print("\nPress Ctrl+C to stop the server\n")
         try:
             httpd.serve_forever()
         except KeyboardInterrupt: